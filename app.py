@@ -5,20 +5,64 @@
 Streamlit application for financial simulation of SAS France & SARL Senegal
 """
 
+import time
+import uuid
+
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
-from config.parameters import DEFAULT_PARAMS
-from model.simulation import SimulationFinanciere
+from config.parameters import DEFAULT_PARAMS, DEFAULT_SCENARIO2_PARAMS, DEFAULT_TREASURY_PARAMS, SPECIFICATIONS, SimulationParams
+from model.comparison import compare_scenarios
+from model.goal_seek import METRIQUES, goal_seek
+from model.treasury import simulate_treasury
+from model.aggregation import (
+    GRANULARITES, aggregate, cumulative, headline_indicators, to_dataframe, trailing_twelve_months
+)
+from model.analysis import iter_sensitivity, iter_point_mort_roi
+from model.surrogate import INDICATEURS_CLES
+from visualization.plots import figure_analyse_sensibilite, figure_point_mort_roi
+from utils.background import synchroniser_taches, annuler_taches
+from utils.computations import (
+    analyse_point_mort_adaptative,
+    analyse_point_mort_roi,
+    analyse_sensibilite,
+    ajuster_substitut,
+    image_analyse,
+    image_comparaison,
+    image_simulation,
+    image_tresorerie,
+    indicateurs_exacts,
+    iter_indicateurs_exacts,
+    magasin_resultats,
+    simuler
+)
+from utils.metrics import metriques
+from utils.monitoring import demarrer_surveillance
+from utils.resources import gestionnaire_ressources, estimer_taille
+from utils.scenario_library import INDICATEURS, ScenarioLibrary
 from visualization.streamlit_plots import (
     streamlit_evolution_ca_resultats,
+    streamlit_evolution_effectifs_couts,
     streamlit_repartition_benefices,
     streamlit_comparaison_scenarios,
     streamlit_repartition_couts,
-    streamlit_repartition_couts_pourcentage
+    streamlit_repartition_couts_pourcentage,
+    streamlit_tresorerie
 )
+from visualization.interactive_plots import (
+    interactive_evolution_ca_resultats,
+    interactive_repartition_benefices,
+    interactive_repartition_couts,
+    interactive_analyse_sensibilite,
+    interactive_comparaison_scenarios,
+    interactive_point_mort_roi,
+    interactive_point_mort_adaptatif,
+    interactive_tresorerie
+)
+
+
+debut_rerun = time.perf_counter()
 
 
 st.set_page_config(
@@ -43,7 +87,9 @@ with st.expander("Instructions d'utilisation", expanded=True):
     4. **Explorez les résultats** dans les différents onglets:
        - **Résultats**: Tableaux de données et métriques clés
        - **Visualisations**: Graphiques d'analyse des résultats
-       - **Comparaison**: Comparaison entre les deux scénarios
+       - **Comparaison**: Comparaison et classement d'autant de scénarios que souhaité
+       - **Objectif**: Valeur d'un paramètre qui atteint un objectif (par exemple le TJM donnant 25 % de marge en année 2)
+       - **Bibliothèque**: Recherche parmi les scénarios enregistrés selon leurs indicateurs
     5. **Téléchargez les données** au format CSV pour une analyse plus approfondie
 
     Vous pouvez à tout moment réinitialiser les paramètres en cliquant sur le bouton "Réinitialiser les paramètres" dans la barre latérale.
@@ -57,8 +103,18 @@ if 'params' not in st.session_state:
 st.sidebar.title("Paramètres de simulation")
 
 
+# Widget bounds of every sidebar parameter, also used to bound goal-seek solutions
+bornes_widgets = {}
+
+
+def relancer():
+    """Rerun the script (st.experimental_rerun was renamed st.rerun)"""
+    (getattr(st, 'rerun', None) or st.experimental_rerun)()
+
+
 def param_widget(label, key, min_value=None, max_value=None, step=None, format=None, help=None):
     value = st.session_state.params[key]
+    bornes_widgets[key] = (min_value, max_value)
 
 
     if isinstance(value, bool):
@@ -126,19 +182,55 @@ with st.sidebar.expander("Paramètres de frais fixes", expanded=False):
     st.session_state.params['frais_fixes_annee3'] = param_widget("Frais fixes mensuels année 3 (€)", 'frais_fixes_annee3', min_value=0, max_value=20000, help="Frais fixes mensuels pour la troisième année")
 
 
-if st.sidebar.button("Réinitialiser les paramètres"):
-    st.session_state.params = DEFAULT_PARAMS.copy()
-    st.experimental_rerun()
+if 'params_tresorerie' not in st.session_state:
+    st.session_state.params_tresorerie = DEFAULT_TREASURY_PARAMS.copy()
 
 
-simulation = SimulationFinanciere(st.session_state.params)
+with st.sidebar.expander("Paramètres de trésorerie", expanded=False):
+    params_tresorerie = st.session_state.params_tresorerie
+    params_tresorerie['delai_paiement_clients_jours'] = st.number_input("Délai de paiement des clients (jours)", min_value=0, max_value=180, value=params_tresorerie['delai_paiement_clients_jours'], step=15, key='delai_paiement_clients_jours', help="Délai entre la facturation et l'encaissement du chiffre d'affaires par la SAS")
+    params_tresorerie['delai_paiement_sarl_jours'] = st.number_input("Délai de paiement SAS → SARL (jours)", min_value=0, max_value=180, value=params_tresorerie['delai_paiement_sarl_jours'], step=15, key='delai_paiement_sarl_jours', help="Délai de règlement du transfert de la SAS vers la SARL")
+    params_tresorerie['delai_paiement_salaires_jours'] = st.number_input("Décalage de paiement des salaires (jours)", min_value=0, max_value=60, value=params_tresorerie['delai_paiement_salaires_jours'], step=5, key='delai_paiement_salaires_jours', help="Décalage entre le mois travaillé et le versement des salaires et charges")
+    params_tresorerie['delai_paiement_fournisseurs_jours'] = st.number_input("Délai de paiement des fournisseurs (jours)", min_value=0, max_value=120, value=params_tresorerie['delai_paiement_fournisseurs_jours'], step=15, key='delai_paiement_fournisseurs_jours', help="Délai de règlement des frais fixes")
+    params_tresorerie['delai_paiement_impots_mois'] = st.number_input("Paiement de l'IS après la clôture (mois)", min_value=0, max_value=12, value=params_tresorerie['delai_paiement_impots_mois'], step=1, key='delai_paiement_impots_mois', help="Nombre de mois entre la clôture de l'exercice et le paiement de l'impôt sur les sociétés")
+    params_tresorerie['tresorerie_initiale_sas'] = st.number_input("Trésorerie initiale SAS (€)", min_value=0, value=params_tresorerie['tresorerie_initiale_sas'], step=1000, key='tresorerie_initiale_sas')
+    params_tresorerie['tresorerie_initiale_sarl'] = st.number_input("Trésorerie initiale SARL (€)", min_value=0, value=params_tresorerie['tresorerie_initiale_sarl'], step=1000, key='tresorerie_initiale_sarl')
 
 
-if 'scenario2_params' not in st.session_state:
-    st.session_state.scenario2_params = DEFAULT_PARAMS.copy()
+moteur_graphique = st.sidebar.radio(
+    "Type de graphiques",
+    ["Interactifs (navigateur)", "Images (matplotlib)"],
+    help="Les graphiques interactifs sont rendus dans le navigateur (survol et zoom sans recalcul côté serveur)"
+)
+graphiques_interactifs = moteur_graphique == "Interactifs (navigateur)"
+
+
+apercu_instantane = st.sidebar.checkbox(
+    "Aperçu instantané des indicateurs", value=True,
+    help="Estime les indicateurs clés dès qu'un paramètre change, avec un modèle approché, pendant que la simulation exacte les confirme en arrière-plan"
+)
 
-    st.session_state.scenario2_params['salaire_dev'] = 1500   # +50%
-    st.session_state.scenario2_params['salaire_lead'] = 2000  # +33%
+
+with st.sidebar.expander("Ressources du serveur", expanded=False):
+    rapport_ressources = gestionnaire_ressources.rapport()
+    st.metric("Cache utilisé",
+              f"{rapport_ressources['utilise_octets'] / 1024 ** 2:.1f} / {rapport_ressources['budget_octets'] / 1024 ** 2:.0f} Mo")
+    if rapport_ressources['rss'] is not None:
+        st.metric("Mémoire du processus", f"{rapport_ressources['rss'] / 1024 ** 2:.0f} Mo")
+    consultations_cache = rapport_ressources['succes'] + rapport_ressources['echecs']
+    st.caption(f"{rapport_ressources['nb_entrees']} entrées en cache, {rapport_ressources['evictions']} évictions"
+               + (f", {rapport_ressources['succes'] / consultations_cache:.0%} de succès" if consultations_cache else ""))
+
+
+if st.sidebar.button("Réinitialiser les paramètres"):
+    st.session_state.params = DEFAULT_PARAMS.copy()
+    for cle in DEFAULT_PARAMS:
+        st.session_state.pop(cle, None)
+    relancer()
+
+
+if 'scenario2_params' not in st.session_state:
+    st.session_state.scenario2_params = DEFAULT_SCENARIO2_PARAMS.copy()
 
 
 with st.sidebar.expander("Paramètres du scénario 2", expanded=False):
@@ -171,144 +263,585 @@ with st.sidebar.expander("Paramètres du scénario 2", expanded=False):
 
     if st.button("Copier les paramètres du scénario 1"):
         st.session_state.scenario2_params = st.session_state.params.copy()
-        st.experimental_rerun()
+        for cle in st.session_state.params:
+            st.session_state.pop(f"s2_{cle}", None)
+        relancer()
+
+PARAMS_VARIANTES = ['tjm_dev', 'taux_occupation_dev', 'salaire_dev', 'salaire_lead', 'ajout_dev_par_trimestre', 'marge_securite']
 
-simulation2 = SimulationFinanciere(st.session_state.scenario2_params)
+
+@st.cache_resource
+def surveiller_processus():
+    """Readiness status file and metrics endpoint of the process (started once)"""
+    return demarrer_surveillance()
+
+
+surveiller_processus()
+
+
+@st.cache_resource
+def ouvrir_bibliotheque_scenarios():
+    """Persistent scenario library shared by all sessions of the process"""
+    return ScenarioLibrary()
+
+
+bibliotheque = ouvrir_bibliotheque_scenarios()
+
+
+def charger_scenario(nom, cle_params, prefixe_widgets):
+    """Load a saved scenario into the session parameters and reset the matching widgets"""
+    params = bibliotheque.charger(nom)
+    if params is None:
+        return
+    st.session_state[cle_params] = params
+    for cle in params:
+        st.session_state.pop(prefixe_widgets + cle, None)
+
+
+def appliquer_valeur(cle, valeur):
+    """Set a parameter of scenario 1 to a solved value and reset its widget"""
+    st.session_state.params[cle] = type(DEFAULT_PARAMS[cle])(valeur)
+    st.session_state.pop(cle, None)
+
+
+with st.sidebar.expander("Bibliothèque de scénarios", expanded=False):
+    nom_scenario = st.text_input("Nom du scénario", key="nom_scenario_bibliotheque")
+    if st.button("Enregistrer le scénario 1", disabled=not nom_scenario.strip()):
+        bibliotheque.enregistrer(nom_scenario.strip(), st.session_state.params)
+        st.success(f"Scénario « {nom_scenario.strip()} » enregistré")
+
+    noms_bibliotheque = bibliotheque.noms()
+    if noms_bibliotheque:
+        scenario_choisi = st.selectbox("Scénario enregistré", noms_bibliotheque)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("Charger en scénario 1", on_click=charger_scenario, args=(scenario_choisi, 'params', ''))
+        with col2:
+            st.button("Charger en scénario 2", on_click=charger_scenario, args=(scenario_choisi, 'scenario2_params', 's2_'))
+    st.caption(f"{len(noms_bibliotheque)} scénarios enregistrés")
+
+
+def resultat_analyse(nom, params, calcul_synchrone):
+    """
+    Latest result of a heavy analysis, from its background task when it matches the parameters
+
+    Returns:
+        tuple: (result, possibly partial, progress between 0 and 1, finished flag)
+    """
+    tache = taches_analyses.get(nom)
+    if tache is not None and tache.params == params and tache.erreur is None:
+        resultat, avancement, termine = tache.etat()
+        if termine and not magasin_resultats.contient(nom, params):
+            magasin_resultats.put(nom, params, resultat)
+        if termine or tache.en_cours:
+            return resultat, avancement, termine
+
+    return calcul_synchrone(params), 1.0, True
+
+
+# Seconds between two refreshes of a section waiting for a background computation
+INTERVALLE_ACTUALISATION = 0.5
+
+LIBELLES_INDICATEURS = {
+    'Resultat_Total': "Résultat net total",
+    'Taux_Marge_Moyen': "Taux de marge moyen",
+    'Effectif_Final': "Effectif final",
+    'Delai_Retour': "Délai de retour",
+}
+AIDES_INDICATEURS = {
+    'Delai_Retour': "Trimestres nécessaires pour que le résultat net consolidé cumulé devienne durablement positif",
+}
+
+
+def formater_indicateur(indicateur, valeur):
+    """Display text of a headline indicator"""
+    if indicateur == 'Resultat_Total':
+        return f"{valeur:,.0f} €"
+    if indicateur == 'Taux_Marge_Moyen':
+        return f"{valeur:.1%}"
+    if indicateur == 'Effectif_Final':
+        return f"{valeur:.0f}"
+    return "Non atteint" if np.isnan(valeur) else "Immédiat" if valeur == 0 else f"{valeur:.1f} trimestres"
+
+
+def formater_ecart(indicateur, ecart):
+    """Display text of the error bound of an estimated indicator"""
+    if not np.isfinite(ecart):
+        return "incertain"
+    if indicateur == 'Resultat_Total':
+        return f"± {ecart:,.0f} €"
+    if indicateur == 'Taux_Marge_Moyen':
+        return f"± {ecart * 100:.2f} point"
+    if indicateur == 'Effectif_Final':
+        return f"± {ecart:.1f}"
+    return f"± {ecart:.2f} trimestre"
+
+
+def afficher_indicateurs(indicateurs, ecarts=None):
+    """Display the headline indicators, as estimates within their error bounds when ecarts is given"""
+    for colonne, indicateur in zip(st.columns(len(INDICATEURS_CLES)), INDICATEURS_CLES):
+        with colonne:
+            if ecarts is None:
+                st.metric(LIBELLES_INDICATEURS[indicateur], formater_indicateur(indicateur, indicateurs[indicateur]),
+                          help=AIDES_INDICATEURS.get(indicateur))
+            else:
+                st.metric(LIBELLES_INDICATEURS[indicateur], "≈ " + formater_indicateur(indicateur, indicateurs[indicateur]),
+                          help=f"Estimation du modèle approché, à {formater_ecart(indicateur, ecarts[indicateur])} près")
+
+
+def afficher_apercu(params):
+    """
+    Headline indicators of the sidebar parameters, estimated at once by the surrogate of
+    the session, then replaced by the exact values of the background simulation
+
+    Returns:
+        bool: True while the exact values are being computed
+    """
+    try:
+        SimulationParams.from_dict(params)
+    except (ValueError, TypeError):
+        return False
+
+    st.subheader("Aperçu des paramètres courants")
+    if simuler.en_cache(params):
+        afficher_indicateurs(indicateurs_exacts(params))
+        st.caption("Valeurs exactes de la simulation")
+        return False
+
+    cle_apercu = ('session', st.session_state.id_session, 'apercu')
+    apercu = gestionnaire_ressources.obtenir(cle_apercu) or {'substitut': None, 'taches': {}}
+    apercu['substitut'] = ajuster_substitut(params, apercu['substitut'])
+    synchroniser_taches(apercu['taches'], {'indicateurs': iter_indicateurs_exacts}, params)
+    gestionnaire_ressources.ajouter(cle_apercu, apercu, categorie='session',
+                                    liberer=lambda apercu: annuler_taches(apercu['taches']))
+
+    substitut = apercu['substitut']
+    tache = apercu['taches']['indicateurs']
+    exacts, _, confirme = tache.etat()
+    if confirme:
+        afficher_indicateurs(exacts)
+        st.caption("Valeurs exactes de la simulation")
+    else:
+        afficher_indicateurs(substitut.predire(params), substitut.erreurs)
+        st.caption(f"Estimations d'un modèle approché ajusté sur {substitut.nb_simulations} simulations "
+                   f"en {substitut.duree_ajustement * 1000:.0f} ms"
+                   + (", confirmation en cours..." if tache.erreur is None else ""))
+    return not confirme and tache.erreur is None
+
+
+def afficher_image(construire_image):
+    """Display the cached PNG image of a matplotlib chart, rendered on the first display"""
+    with metriques.chronometrer('rendu_graphique_secondes'):
+        st.image(construire_image())
+
+
+def afficher_graphique(graphique, **options):
+    """Display an Altair chart (rendered by the browser, the server only serializes it)"""
+    with metriques.chronometrer('rendu_graphique_secondes'):
+        st.altair_chart(graphique, **options)
+
+
+def afficher_en_attente(afficher, *args):
+    """
+    Display a section that may wait for a background computation
+
+    While afficher returns True (result pending), only this section is rerun every
+    INTERVALLE_ACTUALISATION seconds, as a fragment, and the whole page once the
+    result arrives. Where fragments are unavailable, an "Actualiser" button reruns it.
+    """
+    fragment = getattr(st, 'fragment', None)
+    if fragment is None:
+        if afficher(*args):
+            st.button("Actualiser", key=f"actualiser_{afficher.__name__}")
+        return
+
+    cle = f"en_attente_{afficher.__name__}"
+
+    @fragment(run_every=INTERVALLE_ACTUALISATION if st.session_state.get(cle) else None)
+    def section():
+        en_attente = afficher(*args)
+        if en_attente != st.session_state.get(cle, False):
+            # Start or stop the polling of the fragment
+            st.session_state[cle] = en_attente
+            relancer()
+
+    section()
+
+
+
+def afficher_sensibilite(simulation):
+    """Sensitivity analysis of the simulated parameters, True while it is computed in the background"""
+    sensibilite, avancement, termine = resultat_analyse(
+        'sensibilite', st.session_state.params_simules, analyse_sensibilite)
+    if not termine:
+        st.progress(avancement, text="Analyse de sensibilité en cours en arrière-plan...")
+
+    if graphiques_interactifs:
+        if sensibilite:
+            afficher_graphique(interactive_analyse_sensibilite(simulation, sensibilite), use_container_width=True)
+    elif termine:
+        afficher_image(lambda: image_analyse(figure_analyse_sensibilite, simulation, sensibilite))
+    return not termine
+
+
+def afficher_point_mort(simulation):
+    """Break-even and ROI analysis of the simulated parameters, True while it is computed in the background"""
+    grille, avancement, termine = resultat_analyse(
+        'point_mort_roi', st.session_state.params_simules, analyse_point_mort_roi)
+    if not termine:
+        st.progress(avancement, text="Analyse du point mort et du ROI en cours en arrière-plan...")
+
+    raffinement = st.checkbox(
+        "Frontière de rentabilité haute précision (raffinement adaptatif)",
+        help="Raffine uniquement les zones proches du point mort: précision d'une grille 1024 x 1024 en quelques milliers de calculs"
+    )
+    adaptatif = analyse_point_mort_adaptative(st.session_state.params_simules) if raffinement else None
+
+    if graphiques_interactifs:
+        if grille:
+            afficher_graphique(interactive_point_mort_roi(simulation, grille), use_container_width=True)
+        if adaptatif:
+            afficher_graphique(interactive_point_mort_adaptatif(simulation, adaptatif), use_container_width=True)
+    elif termine:
+        afficher_image(lambda: image_analyse(figure_point_mort_roi, simulation, grille,
+                                             frontiere=adaptatif['frontiere'] if adaptatif else None))
+    return not termine
+
+
+if 'id_session' not in st.session_state:
+    st.session_state.id_session = uuid.uuid4().hex
+cle_taches = ('session', st.session_state.id_session, 'analyses')
+taches_analyses = synchroniser_taches(
+    gestionnaire_ressources.obtenir(cle_taches) or {},
+    {nom: generateur for nom, generateur in (('sensibilite', iter_sensitivity), ('point_mort_roi', iter_point_mort_roi))
+     if not magasin_resultats.contient(nom, st.session_state.params)},
+    st.session_state.params
+)
+gestionnaire_ressources.ajouter(
+    cle_taches, taches_analyses, categorie='session', liberer=annuler_taches,
+    taille=sum(estimer_taille(tache.resultat) for tache in taches_analyses.values())
+)
+
+
+if apercu_instantane:
+    afficher_en_attente(afficher_apercu, st.session_state.params)
 
 
 if st.button("Exécuter la simulation"):
+    try:
+        SimulationParams.from_dict(st.session_state.params)
+        SimulationParams.from_dict(st.session_state.scenario2_params)
+    except (ValueError, TypeError) as e:
+        st.error(f"Paramètres invalides: {e}")
+    else:
+        st.session_state.params_simules = st.session_state.params.copy()
+        st.session_state.scenario2_params_simules = st.session_state.scenario2_params.copy()
+
+
+if 'params_simules' in st.session_state:
     with st.spinner("Calcul des résultats en cours..."):
-        simulation.run_simulation()
-        simulation2.run_simulation()
+        simulation = simuler(st.session_state.params_simules)
 
 
-        tab1, tab2, tab3 = st.tabs(["Résultats", "Visualisations", "Comparaison"])
+    vue = st.radio("Vue", ["Résultats", "Visualisations", "Comparaison", "Objectif", "Bibliothèque"], horizontal=True, label_visibility="collapsed")
 
-        with tab1:
-            st.subheader("Résultats annuels")
-            st.dataframe(simulation.resultats_annuels)
+    if vue == "Résultats":
+        st.subheader("Résultats annuels")
+        st.dataframe(simulation.resultats_annuels)
 
 
-            csv_annuels = simulation.resultats_annuels.to_csv(index=True)
-            st.download_button(
-                label="Télécharger les résultats annuels (CSV)",
-                data=csv_annuels,
-                file_name="resultats_annuels.csv",
-                mime="text/csv",
-            )
+        csv_annuels = simulation.resultats_annuels.to_csv(index=True)
+        st.download_button(
+            label="Télécharger les résultats annuels (CSV)",
+            data=csv_annuels,
+            file_name="resultats_annuels.csv",
+            mime="text/csv",
+        )
 
-            st.subheader("Résultats trimestriels")
-            st.dataframe(simulation.resultats)
+        st.subheader("Résultats trimestriels")
+        st.dataframe(simulation.resultats)
 
 
-            csv_trimestriels = simulation.resultats.to_csv(index=True)
-            st.download_button(
-                label="Télécharger les résultats trimestriels (CSV)",
-                data=csv_trimestriels,
-                file_name="resultats_trimestriels.csv",
-                mime="text/csv",
-            )
+        csv_trimestriels = simulation.resultats.to_csv(index=True)
+        st.download_button(
+            label="Télécharger les résultats trimestriels (CSV)",
+            data=csv_trimestriels,
+            file_name="resultats_trimestriels.csv",
+            mime="text/csv",
+        )
 
 
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Résultat net total", f"{simulation.resultats_annuels['Resultat_Net_Consolide'].sum():,.0f} €")
-            with col2:
-                st.metric("Taux de marge moyen", f"{simulation.resultats_annuels['Taux_Marge_Nette'].mean():.1%}")
-            with col3:
-                st.metric("Effectif final", f"{simulation.resultats['Nb_Developpeurs'].iloc[-1] + simulation.resultats['Nb_Lead'].iloc[-1] + simulation.resultats['Nb_CDP'].iloc[-1] + simulation.resultats['Nb_RH'].iloc[-1]}")
+        st.subheader("Autres agrégations")
+        vue_agregation = st.selectbox("Agrégation", ["Semestrielle", "12 mois glissants", "Cumulée"])
+        if vue_agregation == "Semestrielle":
+            semestres = np.arange(1, len(simulation.resultats) // 2 + 1)
+            st.dataframe(to_dataframe(aggregate(simulation.resultats, 'semestriel'),
+                                      [f"A{(s - 1) // 2 + 1} S{(s - 1) % 2 + 1}" for s in semestres], 'Semestre'))
+        else:
+            agregation = trailing_twelve_months(simulation.resultats) if vue_agregation == "12 mois glissants" else cumulative(simulation.resultats)
+            st.dataframe(to_dataframe(agregation, [f"A{a} T{t}" for a, t in zip(simulation.resultats['Annee'], simulation.resultats['Trimestre'])], 'Trimestre'))
+
 
-        with tab2:
+        afficher_indicateurs(headline_indicators(simulation.resultats))
 
-            viz_tab1, viz_tab2, viz_tab3, viz_tab4, viz_tab5, viz_tab6 = st.tabs([
-                "Évolution CA et résultats",
-                "Répartition bénéfices",
-                "Répartition des coûts",
-                "Analyse sensibilité",
-                "Évolution effectifs",
-                "Point mort et ROI"
-            ])
+    elif vue == "Visualisations":
 
-            with viz_tab1:
-                st.subheader("Évolution trimestrielle du CA et des résultats")
-                fig_ca = streamlit_evolution_ca_resultats(simulation)
-                st.pyplot(fig_ca)
+        vue_graphique = st.selectbox("Graphique", [
+            "Évolution CA et résultats",
+            "Répartition bénéfices",
+            "Répartition des coûts",
+            "Analyse sensibilité",
+            "Évolution effectifs",
+            "Point mort et ROI",
+            "Trésorerie"
+        ])
 
-            with viz_tab2:
-                st.subheader("Répartition des bénéfices entre SAS et SARL")
-                fig_benef = streamlit_repartition_benefices(simulation)
-                st.pyplot(fig_benef)
+        if vue_graphique == "Évolution CA et résultats":
+            st.subheader("Évolution trimestrielle du CA et des résultats")
+            if graphiques_interactifs:
+                afficher_graphique(interactive_evolution_ca_resultats(simulation), use_container_width=True)
+            else:
+                afficher_image(lambda: image_simulation(streamlit_evolution_ca_resultats, simulation))
 
-            with viz_tab3:
-                st.subheader("Répartition des coûts par rapport au chiffre d'affaires")
+        elif vue_graphique == "Répartition bénéfices":
+            st.subheader("Répartition des bénéfices entre SAS et SARL")
+            if graphiques_interactifs:
+                afficher_graphique(interactive_repartition_benefices(simulation), use_container_width=True)
+            else:
+                afficher_image(lambda: image_simulation(streamlit_repartition_benefices, simulation))
 
+        elif vue_graphique == "Répartition des coûts":
+            st.subheader("Répartition des coûts par rapport au chiffre d'affaires")
 
-                view_type = st.radio(
-                    "Afficher les coûts en:",
-                    ["Valeurs absolues (€)", "Pourcentages (%)"],
-                    horizontal=True
-                )
 
+            view_type = st.radio(
+                "Afficher les coûts en:",
+                ["Valeurs absolues (€)", "Pourcentages (%)"],
+                horizontal=True
+            )
+
+            if graphiques_interactifs:
+                afficher_graphique(
+                    interactive_repartition_couts(simulation, pourcentage=view_type != "Valeurs absolues (€)"),
+                    use_container_width=True
+                )
+            else:
                 if view_type == "Valeurs absolues (€)":
-                    fig_couts = streamlit_repartition_couts(simulation)
+                    afficher_image(lambda: image_simulation(streamlit_repartition_couts, simulation))
                 else:
-                    fig_couts = streamlit_repartition_couts_pourcentage(simulation)
+                    afficher_image(lambda: image_simulation(streamlit_repartition_couts_pourcentage, simulation))
 
-                st.pyplot(fig_couts)
 
+            with st.expander("Comprendre ce graphique"):
+                st.markdown("""
+                Ce graphique montre comment le chiffre d'affaires est réparti entre les différentes catégories de coûts et le résultat net:
 
-                with st.expander("Comprendre ce graphique"):
-                    st.markdown("""
-                    Ce graphique montre comment le chiffre d'affaires est réparti entre les différentes catégories de coûts et le résultat net:
+                - **Salaires et charges**: Coûts salariaux incluant les charges patronales
+                - **Frais fixes**: Loyers, équipements, services, etc.
+                - **Marge de sécurité**: Marge ajoutée pour sécuriser les opérations de la SARL
+                - **Impôts Sénégal**: Impôts sur les sociétés payés au Sénégal
+                - **Impôts France**: Impôts sur les sociétés payés en France
+                - **Résultat net**: Bénéfice net après tous les coûts et impôts
 
-                    - **Salaires et charges**: Coûts salariaux incluant les charges patronales
-                    - **Frais fixes**: Loyers, équipements, services, etc.
-                    - **Marge de sécurité**: Marge ajoutée pour sécuriser les opérations de la SARL
-                    - **Impôts Sénégal**: Impôts sur les sociétés payés au Sénégal
-                    - **Impôts France**: Impôts sur les sociétés payés en France
-                    - **Résultat net**: Bénéfice net après tous les coûts et impôts
+                La ligne pointillée noire représente le chiffre d'affaires total.
+                La somme de toutes les aires correspond exactement au chiffre d'affaires.
+                """)
 
-                    La ligne pointillée noire représente le chiffre d'affaires total.
-                    La somme de toutes les aires correspond exactement au chiffre d'affaires.
-                    """)
+        elif vue_graphique == "Analyse sensibilité":
+            st.subheader("Analyse de sensibilité des principaux paramètres")
+            afficher_en_attente(afficher_sensibilite, simulation)
 
-            with viz_tab4:
-                st.subheader("Analyse de sensibilité des principaux paramètres")
-                with st.spinner("Génération de l'analyse de sensibilité..."):
-                    fig_sens = plt.figure(figsize=(10, 12))
-                    simulation.plot_analyse_sensibilite()
-                    st.pyplot(fig_sens)
+        elif vue_graphique == "Évolution effectifs":
+            st.subheader("Évolution des effectifs et des coûts moyens")
+            afficher_image(lambda: image_simulation(streamlit_evolution_effectifs_couts, simulation))
 
-            with viz_tab5:
-                st.subheader("Évolution des effectifs et des coûts moyens")
-                fig_eff = plt.figure(figsize=(10, 6))
-                simulation.plot_evolution_effectifs_couts()
-                st.pyplot(fig_eff)
+        elif vue_graphique == "Point mort et ROI":
+            st.subheader("Analyse du point mort et du ROI")
+            afficher_en_attente(afficher_point_mort, simulation)
 
-            with viz_tab6:
-                st.subheader("Analyse du point mort et du ROI")
-                with st.spinner("Génération de l'analyse du point mort et du ROI..."):
-                    fig_roi = plt.figure(figsize=(12, 6))
-                    simulation.plot_point_mort_roi()
-                    st.pyplot(fig_roi)
+        elif vue_graphique == "Trésorerie":
+            st.subheader("Trésorerie mensuelle de la SAS et de la SARL")
+            tresorerie = simulate_treasury(simulation.resultats, st.session_state.params_tresorerie)
 
-        with tab3:
-            st.subheader("Comparaison des scénarios")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Trésorerie minimale consolidée", f"{tresorerie['Tresorerie_Min_Consolidee']:,.0f} €")
+            with col2:
+                st.metric("Besoin de financement", f"{tresorerie['Besoin_Financement']:,.0f} €",
+                          help="Apports nécessaires pour que ni la SAS ni la SARL n'aient une trésorerie négative")
+            with col3:
+                point_mort = tresorerie['Mois_Point_Mort_Tresorerie']
+                st.metric("Point mort de trésorerie", "Non atteint" if np.isnan(point_mort) else "Immédiat" if point_mort == 0 else f"{point_mort:.1f} mois",
+                          help="Mois nécessaires pour que la trésorerie consolidée redevienne durablement supérieure à son niveau initial")
 
+            if graphiques_interactifs:
+                afficher_graphique(interactive_tresorerie(tresorerie), use_container_width=True)
+            else:
+                afficher_image(lambda: image_tresorerie(streamlit_tresorerie, simulation, st.session_state.params_tresorerie, tresorerie))
 
-            st.markdown("**Scénario 1:** Paramètres définis dans l'interface")
-            st.markdown("**Scénario 2:** Salaires plus élevés (Développeur: 1500€, Lead: 2000€)")
+    elif vue == "Comparaison":
+        st.subheader("Comparaison des scénarios")
 
 
-            fig_comp = streamlit_comparaison_scenarios(simulation, simulation2)
-            st.pyplot(fig_comp)
+        st.markdown("**Scénario 1:** Paramètres définis dans l'interface")
+        st.markdown("**Scénario 2:** Paramètres personnalisés dans la barre latérale")
 
 
-            comparaison = pd.DataFrame({
-                'Scénario 1': [simulation.resultats_annuels['Resultat_Net_Consolide'].sum(),
-                              simulation.resultats_annuels['Taux_Marge_Nette'].mean()],
-                'Scénario 2': [simulation2.resultats_annuels['Resultat_Net_Consolide'].sum(),
-                              simulation2.resultats_annuels['Taux_Marge_Nette'].mean()]
-            }, index=['Résultat total sur 3 ans', 'Taux de marge moyen'])
+        st.markdown("Ajoutez d'autres variantes du scénario 1 (une ligne par scénario, les cellules vides reprennent la valeur du scénario 1):")
+        variantes = st.data_editor(
+            pd.DataFrame({'Nom': pd.Series(dtype=str), **{cle: pd.Series(dtype=float) for cle in PARAMS_VARIANTES}}),
+            num_rows="dynamic",
+            key="variantes_scenarios"
+        )
 
-            st.dataframe(comparaison)
+        with st.expander("Générer une série de variantes"):
+            serie_active = st.checkbox("Ajouter une série de variantes à la comparaison")
+            param_serie = st.selectbox("Paramètre varié", PARAMS_VARIANTES)
+            col1, col2, col3 = st.columns(3)
+            valeur_base = float(st.session_state.params_simules[param_serie])
+            with col1:
+                debut_serie = st.number_input("De", value=valeur_base * 0.8)
+            with col2:
+                fin_serie = st.number_input("À", value=valeur_base * 1.2)
+            with col3:
+                nb_serie = st.number_input("Nombre de variantes", min_value=2, max_value=100, value=10)
+
+
+        params_scenarios = [st.session_state.params_simules, st.session_state.scenario2_params_simules]
+        noms_scenarios = ["Scénario 1", "Scénario 2"]
+
+        for i, ligne in enumerate(variantes.to_dict('records')):
+            params_variante = st.session_state.params_simules.copy()
+            params_variante.update({cle: ligne[cle] for cle in PARAMS_VARIANTES if pd.notna(ligne.get(cle))})
+            params_scenarios.append(params_variante)
+            noms_scenarios.append(ligne['Nom'] if isinstance(ligne.get('Nom'), str) and ligne['Nom'] else f"Variante {i + 1}")
+
+        for nom in st.multiselect("Scénarios de la bibliothèque", bibliotheque.noms()):
+            params_bibliotheque = bibliotheque.charger(nom)
+            if params_bibliotheque is not None:
+                params_scenarios.append(params_bibliotheque)
+                noms_scenarios.append(nom)
+
+        if serie_active:
+            for valeur in np.linspace(debut_serie, fin_serie, int(nb_serie)):
+                params_scenarios.append({**st.session_state.params_simules, param_serie: valeur})
+                noms_scenarios.append(f"{param_serie} = {valeur:g}")
+
+        try:
+            comparaison = compare_scenarios(params_scenarios, noms_scenarios)
+        except ValueError as e:
+            st.error(f"Comparaison impossible: {e}")
+            comparaison = None
+
+        if comparaison is not None:
+            if graphiques_interactifs:
+                afficher_graphique(interactive_comparaison_scenarios(comparaison))
+            else:
+                afficher_image(lambda: image_comparaison(streamlit_comparaison_scenarios, params_scenarios, noms_scenarios, comparaison))
+
+
+            st.subheader("Classement des scénarios")
+            st.dataframe(comparaison['classement'].style.format({
+                'Resultat_Total': '{:,.0f} €',
+                'CA_Total': '{:,.0f} €',
+                'Taux_Marge_Moyen': '{:.1%}',
+                'Part_SARL': '{:.1%}',
+                'Effectif_Final': '{:g}'
+            }))
+
+    elif vue == "Objectif":
+        st.subheader("Recherche de la valeur d'un paramètre pour atteindre un objectif")
+
+
+        granularites = {"Annuelle": 'annuel', "Semestrielle": 'semestriel', "Trimestrielle": 'trimestriel',
+                        "Horizon complet": 'total'}
+        col1, col2 = st.columns(2)
+        with col1:
+            metrique_objectif = st.selectbox("Indicateur visé", METRIQUES, index=METRIQUES.index('Taux_Marge_Nette'))
+            granularite_objectif = granularites[st.selectbox("Période", list(granularites))]
+            if granularite_objectif == 'total':
+                periode_objectif = None
+            else:
+                nb_periodes = st.session_state.params_simules['nb_annees'] * 4 // GRANULARITES[granularite_objectif]
+                periode_objectif = st.number_input("Numéro de la période", min_value=1, max_value=nb_periodes, value=min(2, nb_periodes))
+        with col2:
+            parametres_ajustables = [cle for cle in SPECIFICATIONS if cle != 'nb_annees']
+            parametre_objectif = st.selectbox("Paramètre à ajuster", parametres_ajustables,
+                                              index=parametres_ajustables.index('tjm_dev'))
+            cibles_texte = st.text_input("Valeur(s) visée(s)", "0.4",
+                                         help="Séparez plusieurs valeurs par des points-virgules; les taux s'expriment en décimal (0.25 pour 25 %)")
+            entier_objectif = st.checkbox("Solution entière", value=isinstance(DEFAULT_PARAMS[parametre_objectif], int))
+
+        try:
+            cibles = [float(valeur.replace(',', '.')) for valeur in cibles_texte.split(';') if valeur.strip()]
+        except ValueError:
+            cibles = []
+            st.error("Les valeurs visées doivent être des nombres séparés par des points-virgules")
+
+        if cibles:
+            debut_objectif = time.perf_counter()
+            solution = goal_seek(st.session_state.params_simules, parametre_objectif, metrique_objectif, cibles,
+                                 granularite_objectif, periode_objectif, bornes=bornes_widgets.get(parametre_objectif),
+                                 entier=entier_objectif)
+            st.caption(f"Résolu en {(time.perf_counter() - debut_objectif) * 1000:.0f} ms "
+                       f"({solution['evaluations']} évaluations vectorisées du modèle)")
+
+            if len(cibles) == 1:
+                if solution['atteint'][0]:
+                    valeur_solution = float(solution['valeur'][0])
+                    st.metric(parametre_objectif, f"{valeur_solution:,.4g}",
+                              delta=f"{valeur_solution - st.session_state.params_simules[parametre_objectif]:+,.4g} par rapport au scénario 1")
+                    valeur_appliquee = valeur_solution
+                    if isinstance(DEFAULT_PARAMS[parametre_objectif], int) and not valeur_solution.is_integer():
+                        # The sidebar holds integers: the first integer on the target's side, not a truncation
+                        solution_entiere = goal_seek(st.session_state.params_simules, parametre_objectif, metrique_objectif,
+                                                     cibles[0], granularite_objectif, periode_objectif,
+                                                     bornes=bornes_widgets.get(parametre_objectif), entier=True)
+                        valeur_appliquee = float(solution_entiere['valeur']) if solution_entiere['atteint'] else None
+                    st.button("Appliquer au scénario 1" if valeur_appliquee in (None, valeur_solution)
+                              else f"Appliquer au scénario 1 (valeur entière: {valeur_appliquee:,.0f})",
+                              on_click=appliquer_valeur, args=(parametre_objectif, valeur_appliquee),
+                              disabled=valeur_appliquee is None,
+                              help="Reporte la valeur dans la barre latérale; relancez ensuite la simulation")
+                else:
+                    st.warning("Objectif inatteignable dans les bornes du paramètre (celles de la barre latérale)")
+            else:
+                st.dataframe(pd.DataFrame({
+                    'Valeur visée': cibles,
+                    parametre_objectif: solution['valeur'],
+                    'Valeur obtenue': solution['metrique'],
+                    'Atteint': solution['atteint']
+                }))
+
+    elif vue == "Bibliothèque":
+        st.subheader("Recherche dans la bibliothèque de scénarios")
+
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            resultat_min = st.number_input("Résultat total minimum (€)", value=0, step=100000)
+        with col2:
+            marge_min = st.slider("Taux de marge moyen minimum", min_value=-100, max_value=100, value=0, format="%d%%")
+        with col3:
+            tri_bibliotheque = st.selectbox("Trier par", INDICATEURS)
+
+        debut_recherche = time.perf_counter()
+        scenarios_trouves = bibliotheque.rechercher(
+            {'Resultat_Total': resultat_min, 'Taux_Marge_Moyen': marge_min / 100},
+            tri=tri_bibliotheque, limite=1000
+        )
+        st.caption(f"{len(scenarios_trouves)} scénarios sur {len(bibliotheque)} "
+                   f"({(time.perf_counter() - debut_recherche) * 1000:.0f} ms, 1000 au plus)")
+        st.dataframe(scenarios_trouves.style.format({
+            'Resultat_Total': '{:,.0f} €',
+            'CA_Total': '{:,.0f} €',
+            'Taux_Marge_Moyen': '{:.1%}',
+            'Part_SARL': '{:.1%}',
+            'Effectif_Final': '{:g}'
+        }))
+
+        if not len(bibliotheque):
+            st.info("Enregistrez des scénarios depuis la bibliothèque de la barre latérale pour les retrouver ici.")
+
+
+metriques.observer('rerun_secondes', time.perf_counter() - debut_rerun)
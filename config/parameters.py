@@ -5,6 +5,20 @@
 Configuration and default parameters for the simulation
 """
 
+import difflib
+import functools
+import hashlib
+import json
+import math
+import re
+from collections.abc import Mapping
+
+import numpy as np
+
+
+# Bump whenever a change of the calculation alters results, to invalidate stored results
+MODEL_VERSION = '2'
+
 
 DEFAULT_PARAMS = {
 
@@ -38,4 +52,305 @@ DEFAULT_PARAMS = {
     'frais_fixes_annee1': 1000,
     'frais_fixes_annee2': 1500,
     'frais_fixes_annee3': 2000,
-}
\ No newline at end of file
+}
+
+
+# Second scenario of the application on start: higher salaries (+50% developers, +33% leads)
+DEFAULT_SCENARIO2_PARAMS = {**DEFAULT_PARAMS, 'salaire_dev': 1500, 'salaire_lead': 2000}
+
+
+# Payment terms and opening cash of the treasury layer (model/treasury.py)
+DEFAULT_TREASURY_PARAMS = {
+    'delai_paiement_clients_jours': 60,
+    'delai_paiement_sarl_jours': 30,
+    'delai_paiement_salaires_jours': 0,
+    'delai_paiement_fournisseurs_jours': 30,
+    'delai_paiement_impots_mois': 4,
+    'tresorerie_initiale_sas': 0,
+    'tresorerie_initiale_sarl': 0,
+}
+
+
+# Fixed parity of the CFA franc (XOF per euro)
+PARITE_EUR_XOF = 655.957
+
+# Exchange rate and salary indexation of the multi-currency layer (model/currency.py)
+DEFAULT_CURRENCY_PARAMS = {
+    'taux_eur_xof': PARITE_EUR_XOF,          # XOF per euro: scalar, path (nb_trimestres,) or paths (n, nb_trimestres)
+    'inflation_senegal': 0.02,               # Annual inflation rate, per scenario and/or per quarter
+    'repercussion_inflation_salaires': 1.0,  # Share of inflation passed on to salaries
+    'indexation_salaires': 'annuelle',       # 'aucune', 'annuelle' or 'trimestrielle'
+}
+
+
+# Annual corporate tax rules of each country (model/taxes.py), in euros. They follow the
+# rules in force when written: check them against the current tax law before relying on them
+DEFAULT_TAX_RULES = {
+    'france': {
+        'tranches': ((42500, 0.15),),             # Reduced rate of small companies
+        'plafond_report': 1000000,                # Losses offset 1 M€ of profit each year...
+        'part_au_dela_plafond': 0.5,              # ... plus half of the profit above it
+        'duree_report': None,                     # Losses carried forward without limit
+    },
+    'senegal': {
+        'duree_report': 3,                        # Losses carried forward for three years
+        'taux_minimum': 0.005,                    # Minimum tax: 0.5% of the turnover,
+        'minimum_forfaitaire': 500000 / PARITE_EUR_XOF,  # at least 500,000 XOF
+        'plafond_minimum': 5000000 / PARITE_EUR_XOF,     # and at most 5,000,000 XOF
+    },
+}
+
+
+def _valeur_canonique(valeur):
+    """Normalizes a parameter value so that equivalent values hash identically"""
+    if hasattr(valeur, 'item'):
+        valeur = valeur.item()
+    if isinstance(valeur, float) and valeur.is_integer():
+        return int(valeur)
+    return valeur
+
+
+def params_hash(params):
+    """
+    Stable content hash of a parameter set
+
+    Key order, numpy scalar types and integral floats (300.0 vs 300) do not change the hash.
+
+    Args:
+        params (dict): Simulation parameters
+
+    Returns:
+        str: Hexadecimal SHA-256 digest
+    """
+    if isinstance(params, SimulationParams):
+        return params.cle
+
+    return _calculer_hash({cle: _valeur_canonique(valeur) for cle, valeur in params.items()})
+
+
+def _calculer_hash(canonique):
+    """SHA-256 digest of the JSON form of canonical parameter values"""
+    return hashlib.sha256(json.dumps(canonique, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# Parameter name -> (minimum, maximum, integer), checked when a SimulationParams is built.
+# The monthly fixed costs of each year ('frais_fixes_anneeN') are checked separately.
+SPECIFICATIONS = {
+    'nb_annees': (1, None, True),
+    'taux_is_france': (0, 1, False),
+    'taux_is_senegal': (0, 1, False),
+    'taux_charges_patronales': (0, None, False),
+    'marge_securite': (0, None, False),
+    'tjm_dev': (0, None, False),
+    'tjm_lead': (0, None, False),
+    'tjm_cdp': (0, None, False),
+    'taux_occupation_dev': (0, 1, False),
+    'taux_occupation_lead': (0, 1, False),
+    'taux_occupation_cdp': (0, 1, False),
+    'jours_facturable_mois': (0, 31, False),
+    'salaire_dev': (0, None, False),
+    'salaire_lead': (0, None, False),
+    'salaire_cdp': (0, None, False),
+    'salaire_rh': (0, None, False),
+    'effectif_dev_initial': (0, None, False),
+    'ajout_dev_par_trimestre': (0, None, False),
+    'trimestre_ajout_support': (1, None, True),
+}
+
+_FRAIS_FIXES = re.compile(r'frais_fixes_annee([1-9][0-9]*)$')
+
+
+@functools.lru_cache(maxsize=None)
+def _annee_frais_fixes(nom):
+    """Year of a 'frais_fixes_anneeN' parameter name, or None for any other name"""
+    correspondance = _FRAIS_FIXES.match(nom)
+    return int(correspondance.group(1)) if correspondance else None
+
+
+@functools.lru_cache(maxsize=None)
+def _noms_parametres(nb_annees_frais_fixes):
+    """Parameter names, in DEFAULT_PARAMS order, for a number of years of fixed costs"""
+    return tuple(SPECIFICATIONS) + tuple(f'frais_fixes_annee{annee}' for annee in range(1, nb_annees_frais_fixes + 1))
+
+
+def _verifier(nom, valeur, minimum=0, maximum=None, entier=False):
+    """Validates one parameter value and returns it as a plain Python number"""
+    if hasattr(valeur, 'item'):
+        valeur = valeur.item()
+    if isinstance(valeur, bool) or not isinstance(valeur, (int, float)):
+        raise TypeError(f"Le paramètre '{nom}' doit être un nombre, pas {type(valeur).__name__}")
+    if not math.isfinite(valeur):
+        raise ValueError(f"Le paramètre '{nom}' doit être fini")
+    if entier and valeur != int(valeur):
+        raise ValueError(f"Le paramètre '{nom}' doit être entier ({valeur})")
+    if minimum is not None and valeur < minimum or maximum is not None and valeur > maximum:
+        raise ValueError(f"Le paramètre '{nom}' doit être compris entre {minimum} et {maximum if maximum is not None else '+∞'} ({valeur})")
+    return valeur
+
+
+class SimulationParams(Mapping):
+    """
+    Immutable, validated set of simulation parameters.
+
+    Values are checked once, at construction, so that a typo or a missing
+    'frais_fixes_anneeN' fails immediately instead of deep inside the calculation.
+    They are kept in one tuple and exposed as read-only attributes (params.tjm_dev)
+    for the hot paths. The object is also a read-only mapping with the keys of
+    DEFAULT_PARAMS, so it can be used wherever a parameters dict is expected. Its
+    content hash is computed once and reused as cache key.
+    """
+
+    __slots__ = ('_valeurs', '_cle')
+
+    def __init__(self, **valeurs):
+        """
+        Build and validate a parameter set
+
+        Args:
+            **valeurs: Every parameter of DEFAULT_PARAMS, with one 'frais_fixes_anneeN'
+                per simulated year at least
+
+        Raises:
+            ValueError: Missing, unknown or out-of-range parameter
+            TypeError: Non-numeric parameter
+        """
+        manquants = [nom for nom in SPECIFICATIONS if nom not in valeurs]
+        if manquants:
+            raise ValueError(f"Paramètres manquants: {manquants}")
+
+        frais_fixes = {}
+        for nom, valeur in valeurs.items():
+            if _annee_frais_fixes(nom):
+                frais_fixes[_annee_frais_fixes(nom)] = _verifier(nom, valeur)
+            elif nom not in SPECIFICATIONS:
+                proches = difflib.get_close_matches(nom, list(SPECIFICATIONS) + ['frais_fixes_annee1'], n=1)
+                raise ValueError(f"Paramètre inconnu: '{nom}'" + (f" (vouliez-vous dire '{proches[0]}' ?)" if proches else ""))
+
+        nb_annees = _verifier('nb_annees', valeurs['nb_annees'], *SPECIFICATIONS['nb_annees'])
+        annees_attendues = range(1, max(nb_annees, len(frais_fixes)) + 1)
+        if sorted(frais_fixes) != list(annees_attendues):
+            manquants = [f'frais_fixes_annee{annee}' for annee in annees_attendues if annee not in frais_fixes]
+            raise ValueError(f"Frais fixes manquants pour une simulation sur {nb_annees} ans: {manquants}")
+
+        object.__setattr__(self, '_valeurs', tuple(
+            [_verifier(nom, valeurs[nom], *SPECIFICATIONS[nom]) for nom in SPECIFICATIONS]
+            + [frais_fixes[annee] for annee in annees_attendues]))
+        object.__setattr__(self, '_cle', None)
+
+    @classmethod
+    def from_dict(cls, params):
+        """
+        Build a parameter set from a dict (or return it unchanged if it already is one)
+
+        Returns:
+            SimulationParams: Validated parameters
+        """
+        return params if isinstance(params, cls) else cls(**params)
+
+    @property
+    def frais_fixes(self):
+        """Monthly fixed costs of each year"""
+        return self._valeurs[len(SPECIFICATIONS):]
+
+    def to_dict(self):
+        """Mutable dict copy of the parameters, with the keys of DEFAULT_PARAMS"""
+        return dict(zip(self, self._valeurs))
+
+    def replace(self, **changements):
+        """
+        Copy of the parameter set with some values changed; only those are validated
+
+        Returns:
+            SimulationParams: New parameter set
+        """
+        valeurs = list(self._valeurs)
+        for nom, valeur in changements.items():
+            index = _INDEX.get(nom)
+            if index is None and _annee_frais_fixes(nom) is not None:
+                index = len(SPECIFICATIONS) + _annee_frais_fixes(nom) - 1
+            if nom == 'nb_annees' or index is None or index >= len(valeurs):
+                return SimulationParams(**{**self.to_dict(), **changements})
+            valeurs[index] = _verifier(nom, valeur, *SPECIFICATIONS.get(nom, (0, None, False)))
+
+        nouveau = object.__new__(SimulationParams)
+        object.__setattr__(nouveau, '_valeurs', tuple(valeurs))
+        object.__setattr__(nouveau, '_cle', None)
+        return nouveau
+
+    def copy(self):
+        """Parameter sets are immutable: the copy is the object itself (see replace and to_dict)"""
+        return self
+
+    @property
+    def cle(self):
+        """Stable content hash of the parameters, identical to params_hash of the equivalent dict"""
+        if self._cle is None:
+            object.__setattr__(self, '_cle', _calculer_hash({
+                nom: int(valeur) if isinstance(valeur, float) and valeur.is_integer() else valeur
+                for nom, valeur in zip(self, self._valeurs)
+            }))
+        return self._cle
+
+    def __getitem__(self, cle):
+        index = _INDEX.get(cle)
+        if index is None and isinstance(cle, str) and _annee_frais_fixes(cle) is not None:
+            index = len(SPECIFICATIONS) + _annee_frais_fixes(cle) - 1
+        if index is None or index >= len(self._valeurs):
+            raise KeyError(cle)
+        return self._valeurs[index]
+
+    def __iter__(self):
+        return iter(_noms_parametres(len(self._valeurs) - len(SPECIFICATIONS)))
+
+    def __len__(self):
+        return len(self._valeurs)
+
+    def __eq__(self, autre):
+        if isinstance(autre, SimulationParams):
+            return self.cle == autre.cle
+        return Mapping.__eq__(self, autre)
+
+    def __hash__(self):
+        return hash(self.cle)
+
+    def __setattr__(self, nom, valeur):
+        raise AttributeError("SimulationParams est immuable, utilisez replace()")
+
+    def __delattr__(self, nom):
+        raise AttributeError("SimulationParams est immuable")
+
+    def __reduce__(self):
+        return SimulationParams.from_dict, (self.to_dict(),)
+
+    def __repr__(self):
+        return f"SimulationParams({', '.join(f'{cle}={valeur!r}' for cle, valeur in self.items())})"
+
+
+_INDEX = {nom: index for index, nom in enumerate(SPECIFICATIONS)}
+for _nom, _index in _INDEX.items():
+    setattr(SimulationParams, _nom, property(lambda self, _index=_index: self._valeurs[_index], doc=f"Parameter '{_nom}'"))
+
+
+def params_array(params_list):
+    """
+    Array form of many parameter sets, for the vectorized batch engine
+
+    Args:
+        params_list (list): Parameter sets or dicts sharing the same 'nb_annees'
+
+    Returns:
+        numpy.ndarray: Structured array of shape (n,) with one float field per parameter
+    """
+    params_list = [SimulationParams.from_dict(params) for params in params_list]
+    if not params_list:
+        raise ValueError("Au moins un scénario est nécessaire")
+    if any(params.nb_annees != params_list[0].nb_annees for params in params_list):
+        raise ValueError("Les scénarios d'un même lot doivent avoir le même nombre d'années")
+
+    noms = [nom for nom in SPECIFICATIONS if nom != 'nb_annees']
+    noms += [f'frais_fixes_annee{annee}' for annee in range(1, params_list[0].nb_annees + 1)]
+    tableau = np.empty(len(params_list), dtype=[(nom, float) for nom in noms])
+    for nom in noms:
+        tableau[nom] = [params[nom] for params in params_list]
+
+    return tableau
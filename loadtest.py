@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+
+
+"""
+Load-testing harness simulating concurrent sessions of the Streamlit application
+
+Sessions are driven in-process with Streamlit's AppTest, so they share the module-level
+caches exactly like the sessions of one server process. AppTest is not thread-safe:
+script reruns are serialized by a lock, as they would compete for the single core of
+the production container anyway. Measured latencies therefore include queueing time.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.resources import memoire_processus
+
+
+_VERROU_APPTEST = threading.Lock()
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+VUES = ["Résultats", "Visualisations", "Comparaison"]
+GRAPHIQUES = [
+    "Évolution CA et résultats",
+    "Répartition bénéfices",
+    "Répartition des coûts",
+    "Analyse sensibilité",
+    "Évolution effectifs",
+    "Point mort et ROI",
+    "Trésorerie"
+]
+
+SCRIPTS = {
+    # Typical exploration: run, browse every view, tweak a parameter and run again
+    'exploration': [
+        'executer', 'vue:Résultats', 'vue:Visualisations', 'graphique:Répartition des coûts', 'couts',
+        'graphique:Analyse sensibilité', 'parametre', 'executer', 'graphique:Point mort et ROI', 'vue:Comparaison'
+    ],
+    # Slider-heavy session: many parameter changes, few runs
+    'reglages': ['parametre', 'parametre', 'executer', 'vue:Résultats', 'parametre', 'parametre', 'executer'],
+    # Chart-heavy session on one parameter set
+    'graphiques': ['executer', 'vue:Visualisations'] + [f'graphique:{g}' for g in GRAPHIQUES] + ['couts'],
+}
+
+
+def _widget(elements, label):
+    """Find a widget of an AppTest element list by label"""
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"Widget introuvable: {label}")
+
+
+def appliquer_etape(at, etape, rng):
+    """
+    Apply one interaction step to an AppTest session and rerun the script
+
+    Args:
+        at (streamlit.testing.v1.AppTest): Simulated session
+        etape (str): Step name, optionally followed by ':<value>'
+        rng (random.Random): Random generator of the session
+    """
+    nom, _, valeur = etape.partition(':')
+
+    with _VERROU_APPTEST:
+        _appliquer(at, nom, valeur, rng)
+
+
+def _appliquer(at, nom, valeur, rng):
+    """Apply one interaction step (caller holds the AppTest lock)"""
+    if nom == 'executer':
+        _widget(at.button, "Exécuter la simulation").click().run()
+    elif nom == 'vue':
+        _widget(at.radio, "Vue").set_value(valeur or rng.choice(VUES)).run()
+    elif nom == 'graphique':
+        if not any(s.label == "Graphique" for s in at.selectbox):
+            _widget(at.radio, "Vue").set_value("Visualisations").run()
+        _widget(at.selectbox, "Graphique").set_value(valeur or rng.choice(GRAPHIQUES)).run()
+    elif nom == 'couts':
+        if not any(r.label == "Afficher les coûts en:" for r in at.radio):
+            _appliquer(at, 'graphique', "Répartition des coûts", rng)
+        radio = _widget(at.radio, "Afficher les coûts en:")
+        radio.set_value([o for o in radio.options if o != radio.value][0]).run()
+    elif nom == 'parametre':
+        if rng.random() < 0.5:
+            at.number_input(key='tjm_dev').set_value(rng.randrange(250, 401, 5)).run()
+        else:
+            at.slider(key='taux_occupation_dev').set_value(float(rng.randrange(60, 100, 5))).run()
+    else:
+        raise ValueError(f"Étape inconnue: {nom}")
+
+
+def executer_session(numero, script, iterations, graine, timeout):
+    """
+    Drive one simulated session through its interaction script
+
+    Args:
+        numero (int): Session number
+        script (list): Interaction steps
+        iterations (int): Number of passes over the script
+        graine (int): Random seed of the run
+        timeout (float): Maximum duration of one script rerun in seconds
+
+    Returns:
+        list: (step, duration in seconds, error message or None) tuples
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(graine + numero)
+    mesures = []
+
+    debut = time.perf_counter()
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    with _VERROU_APPTEST:
+        at.run()
+    mesures.append(('chargement', time.perf_counter() - debut, None))
+
+    for _ in range(iterations):
+        for etape in script:
+            debut = time.perf_counter()
+            erreur = None
+            try:
+                appliquer_etape(at, etape, rng)
+                if at.exception:
+                    erreur = at.exception[0].value
+            except Exception as e:
+                erreur = f"{type(e).__name__}: {e}"
+            mesures.append((etape.partition(':')[0], time.perf_counter() - debut, erreur))
+
+    return mesures
+
+
+def percentile(valeurs_triees, p):
+    """Nearest-rank percentile of a sorted list"""
+    if not valeurs_triees:
+        return float('nan')
+    rang = max(0, min(len(valeurs_triees) - 1, int(round(p / 100 * len(valeurs_triees) + 0.5)) - 1))
+    return valeurs_triees[rang]
+
+
+def statistiques(durees):
+    """Latency summary of a list of durations in seconds"""
+    durees = sorted(durees)
+    return {
+        'nombre': len(durees),
+        'moyenne_ms': 1000 * sum(durees) / len(durees) if durees else float('nan'),
+        'p50_ms': 1000 * percentile(durees, 50),
+        'p90_ms': 1000 * percentile(durees, 90),
+        'p99_ms': 1000 * percentile(durees, 99),
+        'max_ms': 1000 * durees[-1] if durees else float('nan'),
+    }
+
+
+def lancer_test_charge(nb_sessions, script='exploration', iterations=1, graine=0, timeout=120, montee_en_charge=0.0):
+    """
+    Run nb_sessions concurrent simulated sessions in-process and measure the server cost
+
+    All sessions share the process, hence the module-level caches, exactly like the
+    sessions of one Streamlit server.
+
+    Args:
+        nb_sessions (int): Number of concurrent sessions
+        script (str, optional): Name of the interaction script (see SCRIPTS)
+        iterations (int, optional): Passes over the script per session
+        graine (int, optional): Random seed
+        timeout (float, optional): Maximum duration of one script rerun in seconds
+        montee_en_charge (float, optional): Delay in seconds between two session starts
+
+    Returns:
+        dict: Latency percentiles overall and per step, throughput, CPU and memory usage
+    """
+    etapes = SCRIPTS[script]
+    usage_debut = resource.getrusage(resource.RUSAGE_SELF)
+    memoire_debut = memoire_processus()
+    debut = time.perf_counter()
+
+    def session(numero):
+        time.sleep(numero * montee_en_charge)
+        return executer_session(numero, etapes, iterations, graine, timeout)
+
+    with ThreadPoolExecutor(max_workers=nb_sessions) as executeur:
+        resultats = list(executeur.map(session, range(nb_sessions)))
+
+    duree = time.perf_counter() - debut
+    usage_fin = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (usage_fin.ru_utime - usage_debut.ru_utime) + (usage_fin.ru_stime - usage_debut.ru_stime)
+
+    mesures = [mesure for session_mesures in resultats for mesure in session_mesures]
+    interactions = [m for m in mesures if m[0] != 'chargement']
+    erreurs = [m for m in mesures if m[2] is not None]
+    par_etape = {}
+    for etape, duree_etape, _ in mesures:
+        par_etape.setdefault(etape, []).append(duree_etape)
+
+    return {
+        'sessions': nb_sessions,
+        'script': script,
+        'iterations': iterations,
+        'duree_s': duree,
+        'interactions': len(interactions),
+        'debit_interactions_s': len(interactions) / duree if duree > 0 else float('nan'),
+        'latence': statistiques([m[1] for m in interactions]),
+        'latence_par_etape': {etape: statistiques(durees) for etape, durees in par_etape.items()},
+        'erreurs': len(erreurs),
+        'exemples_erreurs': sorted({str(m[2]) for m in erreurs})[:5],
+        'cpu_s': cpu,
+        'utilisation_cpu': cpu / duree if duree > 0 else float('nan'),
+        'rss_debut_octets': memoire_debut['rss'],
+        'rss_pic_octets': memoire_processus()['rss_pic'],
+        'threads_actifs': threading.active_count(),
+    }
+
+
+def afficher_rapport(rapport):
+    """Print a human-readable load-test report"""
+    print(f"Sessions: {rapport['sessions']} | script: {rapport['script']} | itérations: {rapport['iterations']}")
+    print(f"Durée: {rapport['duree_s']:.1f} s | interactions: {rapport['interactions']} "
+          f"| débit: {rapport['debit_interactions_s']:.2f} interactions/s")
+    latence = rapport['latence']
+    print(f"Latence: p50 {latence['p50_ms']:.0f} ms | p90 {latence['p90_ms']:.0f} ms "
+          f"| p99 {latence['p99_ms']:.0f} ms | max {latence['max_ms']:.0f} ms")
+    print(f"CPU: {rapport['cpu_s']:.1f} s ({rapport['utilisation_cpu']:.0%} d'un cœur)")
+    if rapport['rss_pic_octets'] is not None:
+        print(f"Mémoire: pic RSS {rapport['rss_pic_octets'] / 1024 ** 2:.0f} Mo")
+    print("-" * 50)
+    for etape, stats in sorted(rapport['latence_par_etape'].items()):
+        print(f"{etape:<12} n={stats['nombre']:<5} p50 {stats['p50_ms']:>7.0f} ms   p90 {stats['p90_ms']:>7.0f} ms   "
+              f"p99 {stats['p99_ms']:>7.0f} ms")
+    if rapport['erreurs']:
+        print(f"❌ {rapport['erreurs']} erreurs, par exemple: {rapport['exemples_erreurs']}")
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Test de charge de l'application Streamlit (sessions simulées avec AppTest)")
+    parser.add_argument('-n', '--sessions', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Nombre(s) de sessions concurrentes à tester")
+    parser.add_argument('-s', '--script', choices=sorted(SCRIPTS), default='exploration',
+                        help="Scénario d'interaction des sessions")
+    parser.add_argument('-i', '--iterations', type=int, default=1, help="Passages du scénario par session")
+    parser.add_argument('--graine', type=int, default=0, help="Graine aléatoire")
+    parser.add_argument('--timeout', type=float, default=120, help="Durée maximale d'une exécution du script (s)")
+    parser.add_argument('--montee', type=float, default=0.0, help="Délai entre deux démarrages de session (s)")
+    parser.add_argument('--json', help="Fichier où écrire les rapports au format JSON")
+    parser.add_argument('--p90-max-ms', type=float,
+                        help="Échoue (code 1) si la latence p90 dépasse ce seuil, pour détecter les régressions")
+    args = parser.parse_args()
+
+    rapports = []
+    for nb_sessions in args.sessions:
+        rapport = lancer_test_charge(nb_sessions, args.script, args.iterations, args.graine, args.timeout, args.montee)
+        afficher_rapport(rapport)
+        print()
+        rapports.append(rapport)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rapports, f, indent=2, ensure_ascii=False)
+
+    if args.p90_max_ms is not None and any(r['latence']['p90_ms'] > args.p90_max_ms for r in rapports):
+        print(f"❌ Latence p90 supérieure à {args.p90_max_ms:.0f} ms")
+        sys.exit(1)
+    if any(r['erreurs'] for r in rapports):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
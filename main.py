@@ -5,22 +5,33 @@
 Main script for the financial simulation of SAS France & SARL Senegal
 """
 
-from model.simulation import SimulationFinanciere
-from config.parameters import DEFAULT_PARAMS
+import argparse
+import json
 
-def main():
-    """Main function to run the simulation and its visualizations"""
+import numpy as np
+
+from model.simulation import SimulationFinanciere
+from model.comparison import compare_scenarios
+from model.goal_seek import METRIQUES, goal_seek
+from config.parameters import DEFAULT_PARAMS, DEFAULT_SCENARIO2_PARAMS, SPECIFICATIONS
+from utils.result_store import ResultStore
+from utils.scenario_library import ScenarioLibrary
+from visualization.report import FORMATS, GRAPHIQUES, exporter_rapport
+
+def executer_simulation():
+    """Run the simulation of the two reference scenarios and their visualizations"""
     print("Simulation financière SAS France & SARL Sénégal")
     print("-" * 50)
 
 
-    scenario1 = SimulationFinanciere()
+    store = ResultStore()
+    scenario1 = SimulationFinanciere(store=store)
 
 
     params_scenario2 = DEFAULT_PARAMS.copy()
     params_scenario2['salaire_dev'] = 1500
     params_scenario2['salaire_lead'] = 2000
-    scenario2 = SimulationFinanciere(params_scenario2)
+    scenario2 = SimulationFinanciere(params_scenario2, store=store)
 
 
     print("Exécution du scénario 1...")
@@ -37,14 +48,8 @@ def main():
 
 
     print("\nComparaison des scénarios:")
-    from pandas import DataFrame
-    comparaison = DataFrame({
-        'Scénario 1': [scenario1.resultats_annuels['Resultat_Net_Consolide'].sum(),
-                      scenario1.resultats_annuels['Taux_Marge_Nette'].mean()],
-        'Scénario 2': [scenario2.resultats_annuels['Resultat_Net_Consolide'].sum(),
-                      scenario2.resultats_annuels['Taux_Marge_Nette'].mean()]
-    }, index=['Résultat total sur 3 ans', 'Taux de marge moyen'])
-    print(comparaison)
+    comparaison = compare_scenarios([scenario1.params, scenario2.params], ['Scénario 1', 'Scénario 2'])
+    print(comparaison['classement'])
 
 
     print("\nGénération des visualisations...")
@@ -53,5 +58,99 @@ def main():
     print("\nSimulation terminée avec succès!")
 
 
+def chercher_objectif(args):
+    """Solve for the parameter value reaching each target and print the solutions"""
+    params = DEFAULT_PARAMS.copy()
+    for affectation in args.params or []:
+        cle, _, valeur = affectation.partition('=')
+        params[cle] = int(valeur) if SPECIFICATIONS.get(cle, (0, None, False))[2] else float(valeur)
+
+    solution = goal_seek(params, args.parametre, args.metrique, args.cibles, args.granularite, args.periode,
+                         bornes=(args.min, args.max), entier=args.entier or None)
+    periode = "horizon complet" if args.granularite == 'total' else f"{args.granularite}, période {args.periode or 'finale'}"
+    print(f"{args.parametre} pour {args.metrique} ({periode}), {solution['evaluations']} évaluations:")
+    for cible, valeur, obtenue in zip(args.cibles, np.atleast_1d(solution['valeur']), np.atleast_1d(solution['metrique'])):
+        if np.isnan(valeur):
+            print(f"  {cible:>14,.4g} -> inatteignable dans les bornes")
+        else:
+            print(f"  {cible:>14,.4g} -> {args.parametre} = {valeur:,.6g} (obtenu: {obtenue:,.6g})")
+
+
+def exporter(args):
+    """Export the charts of the chosen scenarios as a report"""
+    scenarios = {}
+    if args.fichier:
+        with open(args.fichier) as f:
+            scenarios.update(json.load(f))
+    if args.scenarios:
+        bibliotheque = ScenarioLibrary()
+        for nom in args.scenarios:
+            params = bibliotheque.charger(nom)
+            if params is None:
+                raise SystemExit(f"Scénario absent de la bibliothèque: {nom}")
+            scenarios[nom] = params
+    if not scenarios:
+        scenarios = {'Scénario 1': DEFAULT_PARAMS, 'Scénario 2': DEFAULT_SCENARIO2_PARAMS}
+
+    cibles = None
+    if args.cible:
+        cibles = {}
+        for cible in args.cible:
+            graphique, *options = cible.split(':')
+            cibles[graphique] = dict(zip(['dpi', 'format'], options))
+
+    def afficher_avancement(fait, total):
+        print(f"\r{fait}/{total} graphiques rendus", end='', flush=True)
+
+    try:
+        rapport = exporter_rapport(scenarios, args.dossier, cibles, args.dpi, args.format, args.archive,
+                                   args.processus, afficher_avancement)
+    except ValueError as e:
+        raise SystemExit(f"Rapport impossible: {e}")
+    print(f"\n{len(scenarios)} scénarios: {rapport['rendus']} graphiques rendus, {rapport['ignores']} inchangés "
+          f"en {rapport['duree']:.1f} s dans {args.dossier}" + (f", archive {rapport['archive']}" if rapport['archive'] else ""))
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Simulation financière SAS France & SARL Sénégal")
+    commandes = parser.add_subparsers(dest='commande')
+    commandes.add_parser('simulation', help="Simule les deux scénarios de référence et génère les graphiques (par défaut)")
+
+    objectif = commandes.add_parser('objectif', help="Cherche la valeur d'un paramètre qui atteint un objectif",
+                                    description="Exemple: python main.py objectif tjm_dev Taux_Marge_Nette 0.25 --periode 2")
+    objectif.add_argument('parametre', choices=[cle for cle in SPECIFICATIONS if cle != 'nb_annees'],
+                          help="Paramètre à ajuster")
+    objectif.add_argument('metrique', choices=METRIQUES, help="Indicateur visé")
+    objectif.add_argument('cibles', type=float, nargs='+', help="Valeur(s) visée(s), taux en décimal")
+    objectif.add_argument('-g', '--granularite', choices=['annuel', 'semestriel', 'trimestriel', 'total'], default='annuel',
+                          help="Période de l'indicateur ('total': tout l'horizon)")
+    objectif.add_argument('-p', '--periode', type=int, help="Numéro de la période (la dernière par défaut)")
+    objectif.add_argument('--min', type=float, help="Borne basse de la recherche")
+    objectif.add_argument('--max', type=float, help="Borne haute de la recherche")
+    objectif.add_argument('--entier', action='store_true', help="Cherche une solution entière")
+    objectif.add_argument('--params', nargs='*', metavar='CLE=VALEUR', help="Paramètres modifiés par rapport aux valeurs par défaut")
+
+    rapport = commandes.add_parser('rapport', help="Exporte les graphiques de plusieurs scénarios (rendu parallèle et incrémental)",
+                                   description="Exemple: python main.py rapport --fichier scenarios.json --archive rapport.pdf")
+    rapport.add_argument('scenarios', nargs='*', help="Scénarios de la bibliothèque à inclure")
+    rapport.add_argument('--fichier', help="Fichier JSON {nom: {paramètre: valeur}} de scénarios (valeurs par défaut pour les paramètres absents)")
+    rapport.add_argument('-o', '--dossier', default='rapport', help="Dossier des graphiques, réutilisé d'un export à l'autre")
+    rapport.add_argument('--archive', help="Archive .zip ou PDF multipage .pdf du rapport")
+    rapport.add_argument('--dpi', type=int, default=300, help="Résolution des graphiques")
+    rapport.add_argument('--format', choices=FORMATS, default='png', help="Format des graphiques")
+    rapport.add_argument('--cible', action='append', metavar='GRAPHIQUE[:DPI[:FORMAT]]',
+                         help=f"Graphique à exporter, avec sa résolution et son format (tous par défaut): {', '.join(GRAPHIQUES)}")
+    rapport.add_argument('--processus', type=int, help="Processus de rendu (nombre de processeurs par défaut)")
+    args = parser.parse_args()
+
+    if args.commande == 'objectif':
+        chercher_objectif(args)
+    elif args.commande == 'rapport':
+        exporter(args)
+    else:
+        executer_simulation()
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+
+"""
+Vectorized aggregation of quarterly results (annual, semester, trailing 12 months, cumulative)
+
+Every function works on a dict of arrays of shape (..., nb_trimestres), so one
+scenario (shape (nb_trimestres,)) and a whole batch (shape (n, nb_trimestres), as
+returned by simulate_batch) are aggregated by the same code, without any loop over
+scenarios or periods.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Flow metrics, summed over the aggregated quarters
+FLUX = [
+    'CA_SAS', 'Transfert_SARL', 'Cout_Salaires', 'Frais_Fixes',
+    'Marge_Securite', 'IS_Senegal', 'Resultat_Net_SARL',
+    'IS_France', 'Resultat_Net_SAS', 'Resultat_Net_Consolide'
+]
+
+# Headcounts, taken at the end of the aggregated quarters
+EFFECTIFS = ['Nb_Developpeurs', 'Nb_Lead', 'Nb_CDP', 'Nb_RH']
+
+# Ratio -> (numerator, denominator) flows
+_DEFINITIONS_RATIOS = {
+    'Taux_Marge_Nette': ('Resultat_Net_Consolide', 'CA_SAS'),
+    'Part_SARL': ('Resultat_Net_SARL', 'Resultat_Net_Consolide'),
+    'Part_SAS': ('Resultat_Net_SAS', 'Resultat_Net_Consolide'),
+    'Ratio_SAS_SARL': ('Resultat_Net_SAS', 'Resultat_Net_SARL'),
+}
+
+# Number of quarters per period of each granularity
+GRANULARITES = {'trimestriel': 1, 'semestriel': 2, 'annuel': 4}
+
+
+def required_columns(colonnes=None):
+    """
+    Quarterly flow and headcount columns needed to compute metrics
+
+    Args:
+        colonnes (list, optional): Metrics, ratios included (all by default)
+
+    Returns:
+        set: Flow and headcount column names, ratios replaced by their flows
+    """
+    necessaires = set(FLUX + EFFECTIFS) if colonnes is None else set(colonnes)
+    for ratio, (numerateur, denominateur) in _DEFINITIONS_RATIOS.items():
+        if ratio in necessaires:
+            necessaires |= {numerateur, denominateur}
+    return necessaires & set(FLUX + EFFECTIFS)
+
+
+def to_arrays(resultats, colonnes=None):
+    """
+    Float arrays of the flow and headcount metrics of quarterly results
+
+    Columns broadcast across a batch (constant for every scenario, as returned by
+    simulate_batch) are reduced to one row, so that they are aggregated only once.
+
+    Args:
+        resultats (pandas.DataFrame or dict): Quarterly results of one scenario, or
+            dict of arrays of shape (..., nb_trimestres)
+        colonnes (list, optional): Metrics needed, ratios included (all by default)
+
+    Returns:
+        dict: Metric name -> numpy.ndarray of shape (..., nb_trimestres)
+    """
+    necessaires = required_columns(colonnes)
+    valeurs = {}
+    for colonne in FLUX + EFFECTIFS:
+        if colonne in necessaires and colonne in resultats:
+            valeur = np.asarray(resultats[colonne], dtype=float)
+            if valeur.ndim > 1 and valeur.strides[0] == 0:
+                valeur = valeur[:1]
+            valeurs[colonne] = valeur
+    return valeurs
+
+
+def _elargir(vue, resultats):
+    """Broadcasts the aggregated arrays back to the batch shape of the results (without copy)"""
+    forme = np.broadcast_shapes(*(np.shape(resultats[colonne])[:-1] for colonne in FLUX + EFFECTIFS
+                                  if colonne in resultats))
+    return {colonne: np.broadcast_to(valeur, forme + valeur.shape[-1:]) for colonne, valeur in vue.items()}
+
+
+def _sommer_periodes(valeur, taille):
+    """Sums of consecutive groups of quarters, added in order (faster than a reduction over a tiny axis)"""
+    periodes = valeur.reshape(valeur.shape[:-1] + (-1, taille))
+    somme = periodes[..., 0]
+    for i in range(1, taille):
+        somme = somme + periodes[..., i]
+    return somme
+
+
+def compute_ratios(flux):
+    """
+    Ratios of aggregated flows
+
+    Divisions by zero give inf or NaN, as the pandas division of calculate_annual_results.
+
+    Args:
+        flux (dict): Aggregated flow arrays
+
+    Returns:
+        dict: 'Taux_Marge_Nette', 'Part_SARL', 'Part_SAS' and 'Ratio_SAS_SARL' arrays
+            (those whose flows are available)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {ratio: flux[numerateur] / flux[denominateur]
+                for ratio, (numerateur, denominateur) in _DEFINITIONS_RATIOS.items()
+                if numerateur in flux and denominateur in flux}
+
+
+def aggregate(resultats, granularite='annuel', colonnes=None):
+    """
+    Aggregates quarterly results into consecutive periods by reshaping
+
+    Args:
+        resultats (pandas.DataFrame or dict): Quarterly results (see to_arrays)
+        granularite (str, optional): 'trimestriel', 'semestriel' or 'annuel'
+        colonnes (list, optional): Metrics to aggregate, all by default
+
+    Returns:
+        dict: Metric name -> numpy.ndarray of shape (..., nb_periodes), ratios included
+    """
+    if granularite not in GRANULARITES:
+        raise ValueError(f"Granularité inconnue: {granularite} (choix: {list(GRANULARITES)})")
+
+    valeurs = to_arrays(resultats, colonnes)
+    taille = GRANULARITES[granularite]
+    agrege = {}
+    for colonne, valeur in valeurs.items():
+        agrege[colonne] = valeur[..., taille - 1::taille] if colonne in EFFECTIFS else _sommer_periodes(valeur, taille)
+    agrege.update(compute_ratios(agrege))
+
+    return _elargir(agrege, resultats)
+
+
+def trailing_twelve_months(resultats, colonnes=None):
+    """
+    Trailing 12-month view: flows summed over the last four quarters, at every quarter
+
+    The first three quarters have no complete window and are NaN.
+
+    Args:
+        resultats (pandas.DataFrame or dict): Quarterly results (see to_arrays)
+        colonnes (list, optional): Metrics to compute, all by default
+
+    Returns:
+        dict: Metric name -> numpy.ndarray of shape (..., nb_trimestres), ratios included
+    """
+    valeurs = to_arrays(resultats, colonnes)
+    glissant = {}
+    for colonne, valeur in valeurs.items():
+        if colonne in EFFECTIFS:
+            glissant[colonne] = valeur
+            continue
+        somme = np.full(valeur.shape, np.nan)
+        somme[..., 3:] = valeur[..., :-3] + valeur[..., 1:-2] + valeur[..., 2:-1] + valeur[..., 3:]
+        glissant[colonne] = somme
+    glissant.update(compute_ratios(glissant))
+
+    return _elargir(glissant, resultats)
+
+
+def cumulative(resultats, colonnes=None):
+    """
+    Cumulative view: flows summed since the first quarter, at every quarter
+
+    Args:
+        resultats (pandas.DataFrame or dict): Quarterly results (see to_arrays)
+        colonnes (list, optional): Metrics to compute, all by default
+
+    Returns:
+        dict: Metric name -> numpy.ndarray of shape (..., nb_trimestres), ratios included
+    """
+    valeurs = to_arrays(resultats, colonnes)
+    cumule = {colonne: valeur if colonne in EFFECTIFS else np.cumsum(valeur, axis=-1) for colonne, valeur in valeurs.items()}
+    cumule.update(compute_ratios(cumule))
+
+    return _elargir(cumule, resultats)
+
+
+def payback_period(resultats, colonne='Resultat_Net_Consolide'):
+    """
+    Payback period: time until the cumulative result turns non-negative for good
+
+    The crossing is linearly interpolated within its quarter.
+
+    Args:
+        resultats (pandas.DataFrame or dict): Quarterly results (see to_arrays)
+        colonne (str, optional): Flow whose cumulative sum is tested
+
+    Returns:
+        numpy.ndarray or float: Number of quarters of shape (...), 0 when the cumulative
+            result is never negative, NaN when it is still negative at the end
+    """
+    valeur = np.asarray(resultats[colonne], dtype=float)
+    cumule = np.cumsum(valeur, axis=-1)
+    nb_trimestres = valeur.shape[-1]
+
+    negatif = cumule < 0
+    dernier_negatif = nb_trimestres - 1 - np.argmax(negatif[..., ::-1], axis=-1)
+    jamais_negatif = ~negatif.any(axis=-1)
+    suivant = np.minimum(dernier_negatif + 1, nb_trimestres - 1)
+
+    cumule_negatif = np.take_along_axis(cumule, dernier_negatif[..., None], axis=-1)[..., 0]
+    flux_suivant = np.take_along_axis(valeur, suivant[..., None], axis=-1)[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retour = dernier_negatif + 1 - cumule_negatif / flux_suivant
+    retour = np.where(jamais_negatif, 0.0, np.where(dernier_negatif == nb_trimestres - 1, np.nan, retour))
+
+    return retour[()] if retour.ndim == 0 else retour
+
+
+def headline_indicators(resultats):
+    """
+    Headline indicators of quarterly results
+
+    Args:
+        resultats (pandas.DataFrame or dict): Quarterly results of one scenario, or dict of
+            arrays of shape (..., nb_trimestres), with at least the consolidated net result,
+            the revenue and the headcounts
+
+    Returns:
+        dict: 'Resultat_Total' (total consolidated net result), 'CA_Total' (total revenue),
+            'Taux_Marge_Moyen' (mean of the annual net margin rates), 'Delai_Retour' (payback
+            period in quarters, see payback_period), 'Effectif_Final' (headcount of the last
+            quarter) and, when the SARL result is available, 'Part_SARL' (its share of the
+            total consolidated net result)
+    """
+    colonnes = ['Resultat_Net_Consolide', 'CA_SAS', 'Taux_Marge_Nette']
+    annuel = aggregate(resultats, 'annuel', colonnes + (['Resultat_Net_SARL'] if 'Resultat_Net_SARL' in resultats else []))
+    indicateurs = {
+        'Resultat_Total': annuel['Resultat_Net_Consolide'].sum(axis=-1),
+        'CA_Total': annuel['CA_SAS'].sum(axis=-1),
+        'Taux_Marge_Moyen': annuel['Taux_Marge_Nette'].mean(axis=-1),
+        'Delai_Retour': payback_period(resultats),
+        'Effectif_Final': sum(np.asarray(resultats[colonne], dtype=float)[..., -1] for colonne in EFFECTIFS),
+    }
+    if 'Resultat_Net_SARL' in annuel:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            indicateurs['Part_SARL'] = annuel['Resultat_Net_SARL'].sum(axis=-1) / indicateurs['Resultat_Total']
+    return indicateurs
+
+
+def to_dataframe(agrege, index, nom_index):
+    """
+    DataFrame of an aggregated view of one scenario
+
+    Args:
+        agrege (dict): Aggregated arrays of shape (nb_periodes,)
+        index (array-like): Period labels
+        nom_index (str): Name of the index
+
+    Returns:
+        pandas.DataFrame: One row per period, headcounts as integers when integral
+    """
+    colonnes = {}
+    for colonne, valeur in agrege.items():
+        if colonne in EFFECTIFS and np.all(np.isfinite(valeur)) and np.all(valeur == np.round(valeur)):
+            valeur = valeur.astype(int)
+        colonnes[colonne] = valeur
+    return pd.DataFrame(colonnes, index=pd.Index(index, name=nom_index))
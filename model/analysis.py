@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+
+
+"""
+Analysis computations (sensitivity, break-even and ROI) shared by all chart backends
+
+The sweeps over prices, salaries and rates are evaluated with the linear
+decomposition of the simulation (model/linear.py), under the corporate tax
+rules of the simulation analysed.
+"""
+
+import numpy as np
+
+from config.parameters import SimulationParams, params_hash
+from model.linear import decomposable, simulate_linear
+from model.taxes import normalize_tax_regime
+
+
+SENSITIVITY_PARAMS = {
+    'salaire_dev': [800, 900, 1000, 1100, 1200, 1300, 1400, 1500],
+    'tjm_dev': [250, 275, 300, 325, 350, 375, 400],
+    'taux_occupation_dev': [0.70, 0.75, 0.80, 0.85, 0.90, 0.95]
+}
+
+SENSITIVITY_LABELS = {
+    'salaire_dev': 'Salaire mensuel développeur (€)',
+    'tjm_dev': 'Tarif journalier développeur (€)',
+    'taux_occupation_dev': 'Taux d\'occupation développeur'
+}
+
+
+def _type_stocke(type_resultat, fiscalite):
+    """Result type of an analysis in the persistent store, apart for annual tax rules (as SimulationFinanciere)"""
+    regime = normalize_tax_regime(fiscalite)
+    return type_resultat if not any(regime.values()) else f"{type_resultat}/{params_hash(regime)[:16]}"
+
+
+def iter_sensitivity(params, params_to_analyze=None, fiscalite=None):
+    """
+    Runs the sensitivity analysis point by point, yielding the partial results
+
+    Args:
+        params (dict): Base simulation parameters
+        params_to_analyze (dict, optional): Tested values per parameter name
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Yields:
+        tuple: (partial sensitivity dict, fraction of points computed)
+    """
+    params = SimulationParams.from_dict(params)
+    params_to_analyze = params_to_analyze or SENSITIVITY_PARAMS
+    nb_points = sum(len(values) for values in params_to_analyze.values())
+
+    sensibilite = {}
+    nb_calcules = 0
+    for param, values in params_to_analyze.items():
+        base_value = params[param]
+        base_index = values.index(base_value) if base_value in values else -1
+        donnees = {'valeurs': [], 'resultats': [], 'base_index': -1}
+        sensibilite[param] = donnees
+
+        for value, resultat in zip(values, _iter_resultats_totaux(params, param, values, fiscalite)):
+            donnees['valeurs'].append(value)
+            donnees['resultats'].append(resultat)
+            if len(donnees['valeurs']) == base_index + 1:
+                donnees['base_index'] = base_index
+
+            nb_calcules += 1
+            yield sensibilite, nb_calcules / nb_points
+
+
+def _iter_resultats_totaux(params, param, values, fiscalite=None):
+    """Total consolidated net result for each value of one parameter, in order"""
+    overrides = {param: np.asarray(values, dtype=float)}
+    if decomposable(overrides):
+        yield from simulate_linear(params, overrides, 'total', ['Resultat_Net_Consolide'],
+                                   fiscalite=fiscalite)['Resultat_Net_Consolide'][:, 0].tolist()
+        return
+
+    # Structural parameters change the headcount trajectory: one simulation per value
+    from model.simulation import SimulationFinanciere
+
+    for value in values:
+        sim = SimulationFinanciere(params.replace(**{param: value}), fiscalite=fiscalite)
+        sim.run_simulation()
+        yield sim.resultats['Resultat_Net_Consolide'].sum()
+
+
+def compute_sensitivity(params, params_to_analyze=None, store=None, fiscalite=None):
+    """
+    Computes the total consolidated net result for each tested value of the main parameters
+
+    Args:
+        params (dict): Base simulation parameters
+        params_to_analyze (dict, optional): Tested values per parameter name
+        store (ResultStore, optional): Persistent store of the default analysis
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Returns:
+        dict: For each parameter, a dict with 'valeurs', 'resultats' and 'base_index'
+    """
+    store = store if params_to_analyze is None else None
+    type_resultat = _type_stocke('sensibilite', fiscalite)
+    if store is not None:
+        sensibilite = store.get(type_resultat, params)
+        if sensibilite is not None:
+            return sensibilite
+
+    sensibilite = {}
+    for sensibilite, _ in iter_sensitivity(params, params_to_analyze, fiscalite):
+        pass
+
+    if store is not None:
+        store.put(type_resultat, params, sensibilite)
+
+    return sensibilite
+
+
+def iter_point_mort_roi(params, tjm_values=None, occupation_values=None, fiscalite=None):
+    """
+    Computes the year 1 break-even and ROI grids row by row, yielding the partial grids
+
+    Rows (occupation rates) not computed yet are filled with NaN.
+
+    Args:
+        params (dict): Base simulation parameters
+        tjm_values (numpy.ndarray, optional): Tested developer TJM values
+        occupation_values (numpy.ndarray, optional): Tested developer occupation rates
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Yields:
+        tuple: (partial grid dict, fraction of rows computed)
+    """
+    params = SimulationParams.from_dict(params)
+    tjm_values = np.linspace(200, 400, 20) if tjm_values is None else tjm_values
+    occupation_values = np.linspace(0.5, 1.0, 10) if occupation_values is None else occupation_values
+
+    point_mort_matrix = np.full((len(occupation_values), len(tjm_values)), np.nan)
+    roi_matrix = np.full((len(occupation_values), len(tjm_values)), np.nan)
+    grille = {
+        'tjm_values': tjm_values,
+        'occupation_values': occupation_values,
+        'point_mort_matrix': point_mort_matrix,
+        'roi_matrix': roi_matrix
+    }
+
+    for i, taux_occupation in enumerate(occupation_values):
+        resultat_annuel, roi_matrix[i] = _evaluer_point_mort(
+            params, np.asarray(tjm_values, dtype=float), np.full(len(tjm_values), float(taux_occupation)), 1, fiscalite)
+        point_mort_matrix[i] = resultat_annuel > 0
+
+        yield grille, (i + 1) / len(occupation_values)
+
+
+def compute_point_mort_roi(params, tjm_values=None, occupation_values=None, store=None, fiscalite=None):
+    """
+    Computes the year 1 break-even and ROI grids over developer TJM and occupation rate
+
+    Args:
+        params (dict): Base simulation parameters
+        tjm_values (numpy.ndarray, optional): Tested developer TJM values
+        occupation_values (numpy.ndarray, optional): Tested developer occupation rates
+        store (ResultStore, optional): Persistent store of the default grid
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Returns:
+        dict: 'tjm_values', 'occupation_values', 'point_mort_matrix' and 'roi_matrix'
+    """
+    store = store if tjm_values is None and occupation_values is None else None
+    type_resultat = _type_stocke('point_mort_roi', fiscalite)
+    if store is not None:
+        grille = store.get(type_resultat, params)
+        if grille is not None:
+            return grille
+
+    grille = {}
+    for grille, _ in iter_point_mort_roi(params, tjm_values, occupation_values, fiscalite):
+        pass
+
+    if store is not None:
+        store.put(type_resultat, params, grille)
+
+    return grille
+
+
+def _evaluer_point_mort(params, tjm_values, occupation_values, annee, fiscalite=None):
+    """Vectorized annual consolidated result and ROI for (TJM, occupation) pairs"""
+    annuel = simulate_linear(params, {'tjm_dev': tjm_values, 'taux_occupation_dev': occupation_values}, 'annuel',
+                             ['Resultat_Net_Consolide', 'Transfert_SARL'], fiscalite=fiscalite)
+    resultat = annuel['Resultat_Net_Consolide'][:, annee - 1]
+    transfert = annuel['Transfert_SARL'][:, annee - 1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roi = np.where(transfert > 0, resultat / transfert, 0.0)
+
+    return resultat, roi
+
+
+def _coins(i, j, taille):
+    """Lattice coordinates of the four corners of a cell"""
+    return [(i, j), (i + taille, j), (i, j + taille), (i + taille, j + taille)]
+
+
+def compute_point_mort_roi_adaptive(params, tjm_range=(200, 400), occupation_range=(0.5, 1.0),
+                                    grille_initiale=8, profondeur_max=7, profondeur_surface=2,
+                                    tolerance_roi=0.2, annee=1, fiscalite=None):
+    """
+    Computes the break-even frontier and ROI surface by adaptive refinement
+
+    A coarse grid of cells is evaluated first. Cells whose corners straddle the
+    profit/loss boundary are split in four down to profondeur_max, cells whose
+    corner ROI spread exceeds tolerance_roi (as a fraction of the ROI range of the
+    coarse grid) only down to profondeur_surface.
+    With the defaults, the frontier has the precision of a 1024 x 1024 uniform
+    grid for a few thousand evaluations. A loss pocket smaller than a coarse cell
+    and not crossing any corner would be missed; the model is monotonic in TJM
+    and occupation, so this cannot happen with the standard parameters.
+
+    Args:
+        params (dict): Base simulation parameters
+        tjm_range (tuple, optional): Developer TJM bounds
+        occupation_range (tuple, optional): Developer occupation rate bounds
+        grille_initiale (int, optional): Number of coarse cells per side
+        profondeur_max (int, optional): Refinement depth of frontier cells
+        profondeur_surface (int, optional): Refinement depth of high-gradient cells
+        tolerance_roi (float, optional): Relative corner ROI spread above which a cell is refined
+        annee (int, optional): Year of the analysis
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Returns:
+        dict: 'frontiere' (k, 2) array of (TJM, occupation) points sorted by occupation,
+            'cellules' (m, 4) array of leaf cells (tjm_min, tjm_max, occupation_min,
+            occupation_max), 'roi' and 'part_rentable' per leaf cell (mean over the corners),
+            'points' (p, 2), 'resultats' and 'roi_points' for every evaluated point,
+            and 'nb_evaluations'
+    """
+    cote = grille_initiale * 2 ** profondeur_max
+    pas_tjm = (tjm_range[1] - tjm_range[0]) / cote
+    pas_occupation = (occupation_range[1] - occupation_range[0]) / cote
+    valeurs = {}
+
+    def evaluer(cellules):
+        nouveaux = sorted({coin for cellule in cellules for coin in _coins(*cellule)} - valeurs.keys())
+        if not nouveaux:
+            return
+        noeuds = np.array(nouveaux)
+        resultat, roi = _evaluer_point_mort(
+            params,
+            tjm_range[0] + noeuds[:, 0] * pas_tjm,
+            occupation_range[0] + noeuds[:, 1] * pas_occupation,
+            annee,
+            fiscalite
+        )
+        valeurs.update(zip(nouveaux, zip(resultat.tolist(), roi.tolist())))
+
+
+    taille = 2 ** profondeur_max
+    cellules = [(i * taille, j * taille, taille) for i in range(grille_initiale) for j in range(grille_initiale)]
+    evaluer(cellules)
+    roi_initiaux = [roi for _, roi in valeurs.values()]
+    seuil_roi = tolerance_roi * (max(roi_initiaux) - min(roi_initiaux))
+
+    feuilles = []
+    for profondeur in range(profondeur_max + 1):
+        a_raffiner = []
+        for cellule in cellules:
+            coins = [valeurs[coin] for coin in _coins(*cellule)]
+            resultats_coins = [c[0] for c in coins]
+            roi_coins = [c[1] for c in coins]
+
+            frontiere = min(resultats_coins) <= 0 < max(resultats_coins)
+            gradient = profondeur < profondeur_surface and max(roi_coins) - min(roi_coins) > seuil_roi
+            if profondeur < profondeur_max and (frontiere or gradient):
+                a_raffiner.append(cellule)
+            else:
+                feuilles.append(cellule)
+
+        if not a_raffiner:
+            break
+
+        cellules = []
+        for i, j, taille in a_raffiner:
+            demi = taille // 2
+            cellules += [(i, j, demi), (i + demi, j, demi), (i, j + demi, demi), (i + demi, j + demi, demi)]
+        evaluer(cellules)
+
+
+    points_frontiere = {}
+    for i, j, taille in feuilles:
+        coins = _coins(i, j, taille)
+        for a, b in ((coins[0], coins[1]), (coins[2], coins[3]), (coins[0], coins[2]), (coins[1], coins[3])):
+            r_a, r_b = valeurs[a][0], valeurs[b][0]
+            if (r_a > 0) != (r_b > 0) and (a, b) not in points_frontiere:
+                s = r_a / (r_a - r_b)
+                points_frontiere[(a, b)] = (
+                    tjm_range[0] + (a[0] + s * (b[0] - a[0])) * pas_tjm,
+                    occupation_range[0] + (a[1] + s * (b[1] - a[1])) * pas_occupation
+                )
+    frontiere = np.array(sorted(points_frontiere.values(), key=lambda point: (point[1], point[0]))).reshape(-1, 2)
+
+
+    cellules_feuilles = np.array([
+        (tjm_range[0] + i * pas_tjm, tjm_range[0] + (i + taille) * pas_tjm,
+         occupation_range[0] + j * pas_occupation, occupation_range[0] + (j + taille) * pas_occupation)
+        for i, j, taille in feuilles
+    ])
+    coins_feuilles = np.array([[valeurs[coin] for coin in _coins(*cellule)] for cellule in feuilles])
+    noeuds = np.array(list(valeurs.keys()))
+    evaluations = np.array(list(valeurs.values()))
+
+    return {
+        'frontiere': frontiere,
+        'cellules': cellules_feuilles,
+        'roi': coins_feuilles[:, :, 1].mean(axis=1),
+        'part_rentable': (coins_feuilles[:, :, 0] > 0).mean(axis=1),
+        'points': np.column_stack([tjm_range[0] + noeuds[:, 0] * pas_tjm,
+                                   occupation_range[0] + noeuds[:, 1] * pas_occupation]),
+        'resultats': evaluations[:, 0],
+        'roi_points': evaluations[:, 1],
+        'nb_evaluations': len(valeurs)
+    }
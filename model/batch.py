@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+
+"""
+Vectorized calculation of quarterly results for a batch of scenarios
+"""
+
+import numpy as np
+
+from config.parameters import SimulationParams, params_array
+from model.taxes import compute_tax_results
+
+
+COLONNES_TRIMESTRIELLES = [
+    'Nb_Developpeurs', 'Nb_Lead', 'Nb_CDP', 'Nb_RH',
+    'CA_SAS', 'Transfert_SARL', 'Cout_Salaires', 'Frais_Fixes',
+    'Marge_Securite', 'IS_Senegal', 'Resultat_Net_SARL',
+    'IS_France', 'Resultat_Net_SAS', 'Resultat_Net_Consolide',
+    'Taux_Marge_Nette', 'Ratio_SAS_SARL'
+]
+
+# Error bounds of the compact (float32) mode against the float64 reference, for one
+# quarter. E is the activity scale CA_SAS + Transfert_SARL of the quarter. Validated on
+# 200,000 random scenarios, the observed errors are below 40 % of these bounds.
+# Headcounts are exact (integers up to 32,767). Annual sums keep the same bounds
+# with E summed over the year; sums over several years should accumulate in float64
+# (valeurs.sum(axis=-1, dtype=np.float64)).
+ERREURS_MODE_COMPACT = {
+    # Costs and SARL flows: relative error
+    'relative_couts': 1e-6,
+    # CA_SAS, IS_France, Resultat_Net_SAS and Resultat_Net_Consolide: absolute error / E
+    'absolue_resultats': 1e-6,
+    # Taux_Marge_Nette: absolute error / (E / CA_SAS)
+    'taux_marge_nette': 1e-6,
+    # Ratio_SAS_SARL: absolute error / (E / Resultat_Net_SARL)
+    'ratio_sas_sarl': 1e-6,
+}
+
+# Intermediate metrics that simulate_batch can adjust inside the formula chain, in chain order
+METRIQUES_AJUSTABLES = ['Nb_Developpeurs', 'CA_SAS', 'Cout_Salaires', 'Frais_Fixes']
+
+# Memory allowed for the intermediate arrays of one chunk of iter_simulate_batch
+BUDGET_LOT_DEFAUT_OCTETS = 64 * 1024 ** 2
+
+# Number of (n, nb_trimestres) arrays alive at the peak of simulate_batch
+_TABLEAUX_INTERMEDIAIRES = 24
+
+
+def batch_size(overrides):
+    """
+    Number of scenarios described by a dict of parameter overrides
+
+    Args:
+        overrides (dict): Parameter name -> scalar, (n,) or (n, nb_trimestres) values
+
+    Returns:
+        int: Number of scenarios (1 when no override is an array)
+    """
+    tailles = {np.shape(v)[0] for v in overrides.values() if np.ndim(v) > 0}
+    if len(tailles) > 1:
+        raise ValueError(f"Les surcharges de paramètres ont des tailles incompatibles: {sorted(tailles)}")
+    return tailles.pop() if tailles else 1
+
+
+def param_getter(params, overrides, dtype=np.float64):
+    """
+    Accessor of batched parameter values, shaped to broadcast against (n, nb_trimestres)
+
+    Args:
+        params (dict or SimulationParams): Base simulation parameters
+        overrides (dict): Parameter name -> scalar, (n,) or (n, nb_trimestres) values
+        dtype (numpy.dtype, optional): Computation dtype
+
+    Returns:
+        callable: Parameter name -> scalar, (n, 1) or (n, nb_trimestres) array
+    """
+    def p(nom):
+        valeur = np.asarray(overrides[nom] if nom in overrides else params[nom], dtype=dtype)
+        return valeur[:, None] if valeur.ndim == 1 else valeur
+
+    return p
+
+
+def compute_financial_results(p, nb_annees, ca_trimestriel, cout_trimestriel_salaires, ajustements=None,
+                              fiscalite=None):
+    """
+    Quarterly fixed costs, SAS/SARL flows, taxes and results from revenue and salary costs
+
+    The formulas are those of calculate_quarterly_results, shared by every engine
+    that computes revenue and salary costs its own way.
+
+    Args:
+        p (callable): Parameter accessor (see param_getter)
+        nb_annees (int): Number of simulated years
+        ca_trimestriel (numpy.ndarray): Quarterly revenue of shape (..., nb_trimestres)
+        cout_trimestriel_salaires (numpy.ndarray): Quarterly salary costs, employer charges included
+        ajustements (dict, optional): Adjustments of the metrics (see simulate_batch), only
+            'Frais_Fixes' is applied here
+        fiscalite (None, str or dict, optional): Corporate tax rules (see model.taxes.normalize_tax_regime),
+            flat quarterly rates by default
+
+    Returns:
+        dict: Column name -> array, for the columns of COLONNES_TRIMESTRIELLES from
+            'CA_SAS' to 'Ratio_SAS_SARL'
+    """
+    annees = np.arange(nb_annees * 4) // 4 + 1
+    frais_fixes_mensuel = sum(p(f'frais_fixes_annee{annee}') * (annees == annee)
+                              for annee in range(1, nb_annees + 1))
+    frais_fixes_trimestriel = frais_fixes_mensuel * 3
+    if ajustements and 'Frais_Fixes' in ajustements:
+        frais_fixes_trimestriel = ajustements['Frais_Fixes'](frais_fixes_trimestriel).astype(
+            frais_fixes_trimestriel.dtype, copy=False)
+
+
+    sous_total = cout_trimestriel_salaires + frais_fixes_trimestriel
+    marge_securite = sous_total * p('marge_securite')
+    transfert_sarl = sous_total + marge_securite
+
+
+    return {
+        'CA_SAS': ca_trimestriel, 'Transfert_SARL': transfert_sarl, 'Cout_Salaires': cout_trimestriel_salaires,
+        'Frais_Fixes': frais_fixes_trimestriel, 'Marge_Securite': marge_securite,
+        **compute_tax_results(ca_trimestriel, transfert_sarl, marge_securite, p, fiscalite),
+    }
+
+
+def simulate_batch(params, overrides=None, compact=False, colonnes=None, ajustements=None, fiscalite=None):
+    """
+    Calculates the quarterly results of many scenarios at once
+
+    Every parameter except 'nb_annees' can be overridden per scenario with an array
+    of shape (n,), or per scenario and per quarter with an array of shape
+    (n, nb_trimestres). The formulas are those of calculate_quarterly_results.
+
+    The compact mode computes in float32 and stores headcounts as small integers,
+    halving the memory and bandwidth of large sweeps. Its error against the float64
+    reference stays within the bounds of ERREURS_MODE_COMPACT.
+
+    Adjustments change intermediate metrics inside the formula chain, so that
+    everything computed from them follows (see model/events.py).
+
+    Annual tax rules (loss carry-forward, brackets, minimum tax) replace the flat
+    quarterly tax rates, at the cost of a scan over the years (see model/taxes.py).
+
+    Args:
+        params (dict or SimulationParams): Base simulation parameters
+        overrides (dict or numpy.ndarray, optional): Parameter name -> per-scenario values,
+            or a structured array of per-scenario parameters (see params_array)
+        compact (bool, optional): Compute in float32 with integer headcounts
+        colonnes (list, optional): Columns to return, all of COLONNES_TRIMESTRIELLES by default
+        ajustements (dict, optional): Metric name (from METRIQUES_AJUSTABLES) -> function
+            returning the adjusted values of the metric, of shape (n, nb_trimestres)
+        fiscalite (None, str or dict, optional): Corporate tax rules (see model.taxes.normalize_tax_regime),
+            flat quarterly rates by default
+
+    Returns:
+        dict: Column name -> numpy.ndarray of shape (n, nb_trimestres), plus 'Annee'
+            and 'Trimestre' of shape (nb_trimestres,)
+    """
+    if isinstance(overrides, np.ndarray):
+        overrides = {nom: overrides[nom] for nom in overrides.dtype.names}
+    overrides = overrides if overrides is not None else {}
+    if 'nb_annees' in overrides:
+        raise ValueError("'nb_annees' définit l'horizon et ne peut pas varier au sein d'un lot")
+    colonnes = COLONNES_TRIMESTRIELLES if colonnes is None else list(colonnes)
+    inconnues = set(colonnes) - set(COLONNES_TRIMESTRIELLES)
+    if inconnues:
+        raise ValueError(f"Colonnes inconnues: {sorted(inconnues)}")
+
+    n = batch_size(overrides)
+    nb_trimestres = params['nb_annees'] * 4
+    dtype = np.float32 if compact else np.float64
+    t = np.arange(nb_trimestres)
+    annees = t // 4 + 1
+
+    p = param_getter(params, overrides, dtype)
+
+    ajustements = ajustements or {}
+    inconnues = set(ajustements) - set(METRIQUES_AJUSTABLES)
+    if inconnues:
+        raise ValueError(f"Métriques non ajustables: {sorted(inconnues)} (ajustables: {METRIQUES_AJUSTABLES})")
+
+    nb_dev = p('effectif_dev_initial') + t.astype(dtype) * p('ajout_dev_par_trimestre')
+    if 'Nb_Developpeurs' in ajustements:
+        nb_dev = ajustements['Nb_Developpeurs'](nb_dev).astype(dtype, copy=False)
+    support = (t >= p('trimestre_ajout_support') - 1).astype(dtype)
+
+
+    jours = p('jours_facturable_mois')
+    ca_mensuel = (nb_dev * p('tjm_dev') * jours * p('taux_occupation_dev')
+                  + support * p('tjm_lead') * jours * p('taux_occupation_lead')
+                  + support * p('tjm_cdp') * jours * p('taux_occupation_cdp'))
+    ca_trimestriel = ca_mensuel * 3
+    if 'CA_SAS' in ajustements:
+        ca_trimestriel = ajustements['CA_SAS'](ca_trimestriel).astype(dtype, copy=False)
+
+
+    cout_mensuel_salaires = (nb_dev * p('salaire_dev') + support * p('salaire_lead')
+                             + support * p('salaire_cdp') + support * p('salaire_rh'))
+    cout_mensuel_charges = cout_mensuel_salaires * p('taux_charges_patronales')
+    cout_trimestriel_salaires = (cout_mensuel_salaires + cout_mensuel_charges) * 3
+    if 'Cout_Salaires' in ajustements:
+        cout_trimestriel_salaires = ajustements['Cout_Salaires'](cout_trimestriel_salaires).astype(dtype, copy=False)
+
+
+    financiers = compute_financial_results(p, params['nb_annees'], ca_trimestriel, cout_trimestriel_salaires,
+                                           ajustements, fiscalite)
+
+    if compact:
+        support = support.astype(np.int8)
+        if np.all(nb_dev == np.round(nb_dev)) and np.all(np.abs(nb_dev) <= np.iinfo(np.int16).max):
+            nb_dev = nb_dev.astype(np.int16)
+        annees = annees.astype(np.int8)
+
+    valeurs = {'Nb_Developpeurs': nb_dev, 'Nb_Lead': support, 'Nb_CDP': support, 'Nb_RH': support, **financiers}
+    # Adjustments drawn per scenario may describe the n scenarios without any override
+    forme = np.broadcast_shapes((n, nb_trimestres), *(np.shape(valeurs[nom]) for nom in colonnes))
+    resultats = {nom: np.broadcast_to(valeurs[nom], forme) for nom in colonnes}
+    resultats['Annee'] = annees
+    resultats['Trimestre'] = (t % 4 + 1).astype(annees.dtype)
+
+    return resultats
+
+
+def iter_simulate_batch(params, overrides, compact=False, colonnes=None, taille_lot=None,
+                        budget_octets=BUDGET_LOT_DEFAUT_OCTETS, fiscalite=None):
+    """
+    Simulates a large batch of scenarios chunk by chunk to bound peak memory
+
+    Without an explicit taille_lot, chunks are sized so that the intermediate arrays
+    of one chunk fit in budget_octets; the compact mode fits twice as many scenarios.
+
+    Args:
+        params (dict or SimulationParams): Base simulation parameters
+        overrides (dict or numpy.ndarray): Per-scenario values, as for simulate_batch
+        compact (bool, optional): Compute in float32 with integer headcounts
+        colonnes (list, optional): Columns to return
+        taille_lot (int, optional): Number of scenarios per chunk
+        budget_octets (int, optional): Memory budget of one chunk
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Yields:
+        tuple: (slice of the chunk's scenarios, simulate_batch results of the chunk)
+    """
+    if isinstance(overrides, np.ndarray):
+        overrides = {nom: overrides[nom] for nom in overrides.dtype.names}
+
+    n = batch_size(overrides)
+    if taille_lot is None:
+        octets_par_scenario = _TABLEAUX_INTERMEDIAIRES * params['nb_annees'] * 4 * (4 if compact else 8)
+        taille_lot = max(1, budget_octets // octets_par_scenario)
+
+    for debut in range(0, n, taille_lot):
+        lot = slice(debut, min(debut + taille_lot, n))
+        overrides_lot = {nom: valeur[lot] if np.ndim(valeur) > 0 else valeur for nom, valeur in overrides.items()}
+        yield lot, simulate_batch(params, overrides_lot, compact, colonnes, fiscalite=fiscalite)
+
+
+def sum_by_year(valeurs):
+    """
+    Sums quarterly values per year
+
+    Args:
+        valeurs (numpy.ndarray): Array of shape (..., nb_trimestres)
+
+    Returns:
+        numpy.ndarray: Array of shape (..., nb_annees)
+    """
+    return valeurs.reshape(valeurs.shape[:-1] + (-1, 4)).sum(axis=-1)
+
+
+def stack_params(params_list):
+    """
+    Turns a list of full parameter sets into base parameters and per-scenario overrides
+
+    Only the parameters that differ between scenarios become override arrays.
+
+    Args:
+        params_list (list): Parameter sets or dicts of the scenarios
+
+    Returns:
+        tuple: (base SimulationParams, overrides dict of arrays of shape (n,))
+    """
+    tableau = params_array(params_list)
+    base = SimulationParams.from_dict(params_list[0])
+
+    overrides = {nom: tableau[nom] for nom in tableau.dtype.names if np.any(tableau[nom] != tableau[nom][0])}
+    if not overrides:
+        nom = tableau.dtype.names[0]
+        overrides[nom] = tableau[nom]
+
+    return base, overrides
@@ -8,17 +8,25 @@ Calculation functions for the financial simulation
 import pandas as pd
 import numpy as np
 
-def calculate_quarterly_results(params):
+from config.parameters import SimulationParams
+from model.aggregation import aggregate, to_dataframe
+from model.taxes import compute_tax_results, normalize_tax_regime
+
+def calculate_quarterly_results(params, fiscalite=None):
     """
     Calculates quarterly financial results
 
     Args:
-        params (dict): Dictionary of simulation parameters
+        params (dict or SimulationParams): Simulation parameters
+        fiscalite (None, str or dict, optional): Corporate tax rules (see model.taxes.normalize_tax_regime),
+            flat quarterly rates by default
 
     Returns:
         pandas.DataFrame: DataFrame containing quarterly results
     """
-    nb_trimestres = params['nb_annees'] * 4
+    params = SimulationParams.from_dict(params)
+    regime = normalize_tax_regime(fiscalite)
+    nb_trimestres = params.nb_annees * 4
 
 
     colonnes = [
@@ -37,49 +45,49 @@ def calculate_quarterly_results(params):
         trimestre = t % 4 + 1
 
 
-        nb_dev = params['effectif_dev_initial'] + t * params['ajout_dev_par_trimestre']
-        nb_lead = 1 if t >= (params['trimestre_ajout_support'] - 1) else 0
-        nb_cdp = 1 if t >= (params['trimestre_ajout_support'] - 1) else 0
-        nb_rh = 1 if t >= (params['trimestre_ajout_support'] - 1) else 0
+        nb_dev = params.effectif_dev_initial + t * params.ajout_dev_par_trimestre
+        nb_lead = 1 if t >= (params.trimestre_ajout_support - 1) else 0
+        nb_cdp = 1 if t >= (params.trimestre_ajout_support - 1) else 0
+        nb_rh = 1 if t >= (params.trimestre_ajout_support - 1) else 0
 
 
-        ca_mensuel_dev = nb_dev * params['tjm_dev'] * params['jours_facturable_mois'] * params['taux_occupation_dev']
-        ca_mensuel_lead = nb_lead * params['tjm_lead'] * params['jours_facturable_mois'] * params['taux_occupation_lead']
-        ca_mensuel_cdp = nb_cdp * params['tjm_cdp'] * params['jours_facturable_mois'] * params['taux_occupation_cdp']
+        ca_mensuel_dev = nb_dev * params.tjm_dev * params.jours_facturable_mois * params.taux_occupation_dev
+        ca_mensuel_lead = nb_lead * params.tjm_lead * params.jours_facturable_mois * params.taux_occupation_lead
+        ca_mensuel_cdp = nb_cdp * params.tjm_cdp * params.jours_facturable_mois * params.taux_occupation_cdp
         ca_mensuel = ca_mensuel_dev + ca_mensuel_lead + ca_mensuel_cdp
         ca_trimestriel = ca_mensuel * 3
 
 
-        cout_mensuel_dev = nb_dev * params['salaire_dev']
-        cout_mensuel_lead = nb_lead * params['salaire_lead']
-        cout_mensuel_cdp = nb_cdp * params['salaire_cdp']
-        cout_mensuel_rh = nb_rh * params['salaire_rh']
+        cout_mensuel_dev = nb_dev * params.salaire_dev
+        cout_mensuel_lead = nb_lead * params.salaire_lead
+        cout_mensuel_cdp = nb_cdp * params.salaire_cdp
+        cout_mensuel_rh = nb_rh * params.salaire_rh
         cout_mensuel_salaires = cout_mensuel_dev + cout_mensuel_lead + cout_mensuel_cdp + cout_mensuel_rh
 
 
-        cout_mensuel_charges = cout_mensuel_salaires * params['taux_charges_patronales']
+        cout_mensuel_charges = cout_mensuel_salaires * params.taux_charges_patronales
         cout_mensuel_total_salaires = cout_mensuel_salaires + cout_mensuel_charges
         cout_trimestriel_salaires = cout_mensuel_total_salaires * 3
 
 
-        frais_fixes_mensuel = params[f'frais_fixes_annee{annee}']
+        frais_fixes_mensuel = params.frais_fixes[annee - 1]
         frais_fixes_trimestriel = frais_fixes_mensuel * 3
 
 
         sous_total = cout_trimestriel_salaires + frais_fixes_trimestriel
 
 
-        marge_securite = sous_total * params['marge_securite']
+        marge_securite = sous_total * params.marge_securite
         transfert_sarl = sous_total + marge_securite
 
 
         resultat_avant_is_sarl = marge_securite
-        is_senegal = resultat_avant_is_sarl * params['taux_is_senegal']
+        is_senegal = resultat_avant_is_sarl * params.taux_is_senegal
         resultat_net_sarl = resultat_avant_is_sarl - is_senegal
 
 
         resultat_avant_is_sas = ca_trimestriel - transfert_sarl
-        is_france = resultat_avant_is_sas * params['taux_is_france']
+        is_france = resultat_avant_is_sas * params.taux_is_france
         resultat_net_sas = resultat_avant_is_sas - is_france
 
 
@@ -96,6 +104,15 @@ def calculate_quarterly_results(params):
             taux_marge_nette, ratio_sas_sarl
         ]
 
+
+    if any(regime.values()):
+        # Annual tax rules: the tax of a quarter depends on its whole year and on the years before
+        impots = compute_tax_results(*(resultats[colonne].to_numpy(dtype=float)
+                                       for colonne in ('CA_SAS', 'Transfert_SARL', 'Marge_Securite')),
+                                     params.__getitem__, regime)
+        for colonne, valeurs in impots.items():
+            resultats[colonne] = valeurs
+
     return resultats
 
 def calculate_annual_results(resultats_trimestriels):
@@ -108,19 +125,12 @@ def calculate_annual_results(resultats_trimestriels):
     Returns:
         pandas.DataFrame: DataFrame of annual results
     """
-    resultats_annuels = resultats_trimestriels.groupby('Annee').agg({
-        'Nb_Developpeurs': 'last',
-        'CA_SAS': 'sum',
-        'Transfert_SARL': 'sum',
-        'Resultat_Net_SARL': 'sum',
-        'Resultat_Net_SAS': 'sum',
-        'Resultat_Net_Consolide': 'sum'
-    })
-
-
-    resultats_annuels['Taux_Marge_Nette'] = resultats_annuels['Resultat_Net_Consolide'] / resultats_annuels['CA_SAS']
-    resultats_annuels['Part_SARL'] = resultats_annuels['Resultat_Net_SARL'] / resultats_annuels['Resultat_Net_Consolide']
-    resultats_annuels['Part_SAS'] = resultats_annuels['Resultat_Net_SAS'] / resultats_annuels['Resultat_Net_Consolide']
-    resultats_annuels['Ratio_SAS_SARL'] = resultats_annuels['Resultat_Net_SAS'] / resultats_annuels['Resultat_Net_SARL']
+    annuel = aggregate(resultats_trimestriels, 'annuel')
+    colonnes = [
+        'Nb_Developpeurs', 'CA_SAS', 'Transfert_SARL', 'Resultat_Net_SARL', 'Resultat_Net_SAS',
+        'Resultat_Net_Consolide', 'Taux_Marge_Nette', 'Part_SARL', 'Part_SAS', 'Ratio_SAS_SARL'
+    ]
+    annees = np.asarray(resultats_trimestriels['Annee'], dtype=int)[3::4]
+    resultats_annuels = to_dataframe({colonne: annuel[colonne] for colonne in colonnes}, annees, 'Annee')
 
     return resultats_annuels
\ No newline at end of file
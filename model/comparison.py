@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+
+"""
+N-way comparison of simulation scenarios evaluated in one batched call
+"""
+
+import numpy as np
+import pandas as pd
+
+from model.aggregation import aggregate, headline_indicators
+from model.batch import simulate_batch, stack_params
+
+
+# Annual metrics of the compared scenarios
+COLONNES_ANNUELLES = [
+    'CA_SAS', 'Transfert_SARL', 'Resultat_Net_SARL', 'Resultat_Net_SAS', 'Resultat_Net_Consolide',
+    'Nb_Developpeurs', 'Taux_Marge_Nette', 'Part_SARL'
+]
+
+# Headline indicators of the ranking (see headline_indicators)
+INDICATEURS_CLASSEMENT = ['Resultat_Total', 'CA_Total', 'Taux_Marge_Moyen', 'Part_SARL', 'Effectif_Final']
+
+
+def compare_scenarios(params_list, noms=None, fiscalite=None):
+    """
+    Simulates and ranks any number of scenarios with a single vectorized evaluation
+
+    Args:
+        params_list (list): Full parameter dicts of the scenarios (same 'nb_annees')
+        noms (list, optional): Scenario names, 'Scénario 1', 'Scénario 2'... by default
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Returns:
+        dict: 'noms', 'annees', 'trimestriel' (quarterly arrays of shape (n, nb_trimestres)),
+            'annuel' (annual arrays of shape (n, nb_annees)) and 'classement'
+            (pandas.DataFrame of annual KPIs sorted by total consolidated net result)
+    """
+    noms = list(noms) if noms is not None else [f"Scénario {i + 1}" for i in range(len(params_list))]
+    if len(noms) != len(params_list):
+        raise ValueError("Il faut autant de noms que de scénarios")
+
+    base, overrides = stack_params(params_list)
+    trimestriel = simulate_batch(base, overrides, fiscalite=fiscalite)
+    annuel = aggregate(trimestriel, 'annuel', COLONNES_ANNUELLES)
+    indicateurs = headline_indicators(trimestriel)
+
+    classement = pd.DataFrame({indicateur: indicateurs[indicateur] for indicateur in INDICATEURS_CLASSEMENT},
+                              index=pd.Index(noms, name='Scenario')).sort_values('Resultat_Total', ascending=False)
+    classement.insert(0, 'Rang', np.arange(1, len(classement) + 1))
+
+    return {
+        'noms': noms,
+        'annees': np.arange(1, base['nb_annees'] + 1),
+        'trimestriel': trimestriel,
+        'annuel': annuel,
+        'classement': classement
+    }
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+
+"""
+Multi-currency layer: XOF costs of the SARL, EUR/XOF exchange rate paths and salary indexation
+
+The SARL pays its salaries and fixed costs in XOF while the model works in euros.
+XOF amounts are turned into per-quarter euro overrides of simulate_batch, so
+thousands of exchange rate and inflation paths of shape (n, nb_trimestres) are
+evaluated as one batch with plain broadcast operations.
+"""
+
+import numpy as np
+
+from config.parameters import DEFAULT_CURRENCY_PARAMS, PARITE_EUR_XOF, SimulationParams
+from model.batch import simulate_batch
+
+
+# Roles whose salary is paid by the SARL in XOF
+ROLES_SALAIRES = ['dev', 'lead', 'cdp', 'rh']
+
+# Indexation rule -> number of quarters between two salary revaluations (None: never)
+INDEXATIONS = {'aucune': None, 'annuelle': 4, 'trimestrielle': 1}
+
+
+def fx_paths(n, nb_trimestres, taux_initial=PARITE_EUR_XOF, volatilite=0.0, derive=0.0, graine=None):
+    """
+    Random EUR/XOF exchange rate paths (geometric Brownian motion, quarterly steps)
+
+    With zero volatility and drift the paths stay at the initial rate, as under the
+    fixed parity.
+
+    Args:
+        n (int): Number of paths
+        nb_trimestres (int): Number of quarters
+        taux_initial (float, optional): Rate of the first quarter (XOF per euro)
+        volatilite (float, optional): Annual volatility of the rate
+        derive (float, optional): Annual drift of the rate (positive: XOF depreciation)
+        graine (int, optional): Seed of the random generator
+
+    Returns:
+        numpy.ndarray: Rates of shape (n, nb_trimestres)
+    """
+    generateur = np.random.default_rng(graine)
+    pas = 0.25
+    chocs = generateur.standard_normal((n, nb_trimestres - 1)) * (volatilite * np.sqrt(pas))
+    log_rendements = (derive - volatilite ** 2 / 2) * pas + chocs
+    log_taux = np.concatenate([np.zeros((n, 1)), np.cumsum(log_rendements, axis=1)], axis=1)
+    return taux_initial * np.exp(log_taux)
+
+
+def inflation_paths(n, nb_trimestres, moyenne=DEFAULT_CURRENCY_PARAMS['inflation_senegal'], volatilite=0.01,
+                    graine=None):
+    """
+    Random annual inflation rates, drawn independently for every year
+
+    Args:
+        n (int): Number of paths
+        nb_trimestres (int): Number of quarters
+        moyenne (float, optional): Mean annual inflation rate
+        volatilite (float, optional): Standard deviation of the annual rate
+        graine (int, optional): Seed of the random generator
+
+    Returns:
+        numpy.ndarray: Annual rates of shape (n, nb_trimestres), constant within each year
+    """
+    generateur = np.random.default_rng(graine)
+    annuelles = moyenne + volatilite * generateur.standard_normal((n, -(-nb_trimestres // 4)))
+    return np.repeat(annuelles, 4, axis=1)[:, :nb_trimestres]
+
+
+def salary_index(inflation, nb_trimestres, indexation='annuelle', repercussion=1.0):
+    """
+    Salary index relative to the first quarter
+
+    Prices grow each quarter by (1 + inflation) ** (1/4). Salaries catch up with
+    repercussion times that growth at every revaluation: every quarter, at the start
+    of every year, or never.
+
+    Args:
+        inflation (float or numpy.ndarray): Annual inflation rate, scalar, (n,), or
+            (n, nb_trimestres) (or (1, nb_trimestres) when shared) for a rate varying over time
+        nb_trimestres (int): Number of quarters
+        indexation (str, optional): 'aucune', 'annuelle' or 'trimestrielle'
+        repercussion (float or numpy.ndarray, optional): Share of inflation passed on
+
+    Returns:
+        numpy.ndarray: Index of shape (..., nb_trimestres), 1 at the first quarter
+    """
+    if indexation not in INDEXATIONS:
+        raise ValueError(f"Indexation inconnue: {indexation} (choix: {list(INDEXATIONS)})")
+    inflation = np.asarray(inflation, dtype=float)
+    inflation = inflation[..., None] if inflation.ndim < 2 else inflation
+    repercussion = np.asarray(repercussion, dtype=float)
+    repercussion = repercussion[..., None] if repercussion.ndim == 1 else repercussion
+
+    periode = INDEXATIONS[indexation]
+    if periode is None:
+        return np.ones(np.broadcast_shapes(inflation.shape[:-1], np.shape(repercussion)[:-1]) + (nb_trimestres,))
+
+    croissance = np.broadcast_to((1 + repercussion * inflation) ** 0.25,
+                                 np.broadcast_shapes(inflation.shape[:-1], np.shape(repercussion)[:-1]) + (nb_trimestres,))
+    indice = np.ones(croissance.shape)
+    indice[..., 1:] = np.cumprod(croissance[..., :-1], axis=-1)
+    return indice[..., (np.arange(nb_trimestres) // periode) * periode]
+
+
+def currency_overrides(params, params_devises=None, salaires_xof=None, frais_fixes_xof=None):
+    """
+    Per-quarter euro values of the SARL's XOF salaries and fixed costs
+
+    Args:
+        params (dict or SimulationParams): Simulation parameters
+        params_devises (dict, optional): Values overriding DEFAULT_CURRENCY_PARAMS; the
+            rate 'taux_eur_xof' is a scalar, a path of shape (nb_trimestres,) or paths
+            of shape (n, nb_trimestres)
+        salaires_xof (dict, optional): Role -> monthly salary in XOF (scalar or (n,)), the euro
+            salaries of params at the fixed parity by default
+        frais_fixes_xof (list, optional): Monthly fixed costs in XOF (scalar or (n,)) of every year,
+            those of params at the fixed parity by default
+
+    Returns:
+        dict: Overrides of simulate_batch ('salaire_*' and 'frais_fixes_annee*')
+            of shape (..., nb_trimestres), with at least one scenario axis
+    """
+    params = SimulationParams.from_dict(params)
+    devises = {**DEFAULT_CURRENCY_PARAMS, **(params_devises or {})}
+    inconnus = set(devises) - set(DEFAULT_CURRENCY_PARAMS)
+    if inconnus:
+        raise ValueError(f"Paramètres de devises inconnus: {sorted(inconnus)}")
+
+    nb_trimestres = params.nb_annees * 4
+    if salaires_xof is None:
+        salaires_xof = {role: params[f'salaire_{role}'] * PARITE_EUR_XOF for role in ROLES_SALAIRES}
+    if frais_fixes_xof is None:
+        frais_fixes_xof = [frais * PARITE_EUR_XOF for frais in params.frais_fixes]
+    if len(frais_fixes_xof) != params.nb_annees:
+        raise ValueError(f"Il faut des frais fixes pour chacune des {params.nb_annees} années")
+
+    taux_change = np.asarray(devises['taux_eur_xof'], dtype=float)
+    if np.any(taux_change <= 0):
+        raise ValueError("Le taux de change EUR/XOF doit être strictement positif")
+    euros_par_xof = 1 / taux_change
+    salaires_par_xof = euros_par_xof * salary_index(devises['inflation_senegal'], nb_trimestres,
+                                                    devises['indexation_salaires'],
+                                                    devises['repercussion_inflation_salaires'])
+
+    def par_scenario(montant):
+        montant = np.asarray(montant, dtype=float)
+        return montant[..., None] if montant.ndim == 1 else montant
+
+    overrides = {f'salaire_{role}': par_scenario(salaire) * salaires_par_xof for role, salaire in salaires_xof.items()}
+    overrides.update({f'frais_fixes_annee{annee}': par_scenario(frais) * euros_par_xof
+                      for annee, frais in enumerate(frais_fixes_xof, start=1)})
+
+    # At least (1, nb_trimestres): simulate_batch reads 1-D overrides as per-scenario values
+    forme = np.broadcast_shapes((1, nb_trimestres), *(np.shape(valeur) for valeur in overrides.values()))
+    return {nom: np.broadcast_to(valeur, forme) for nom, valeur in overrides.items()}
+
+
+def simulate_currency(params, params_devises=None, salaires_xof=None, frais_fixes_xof=None, overrides=None,
+                      compact=False, fiscalite=None):
+    """
+    Calculates quarterly results with XOF costs, exchange rate paths and salary indexation
+
+    Revenue stays in euros; salaries and fixed costs are paid in XOF and converted at
+    each quarter's rate. Corporate tax in Senegal is proportional to the SARL margin,
+    so its euro value follows the same conversion (the amounts of annual tax rules are
+    in euros, see DEFAULT_TAX_RULES). With the fixed parity, no inflation and the
+    default XOF amounts, the results are those of the reference model.
+
+    Args:
+        params (dict or SimulationParams): Simulation parameters
+        params_devises (dict, optional): Values overriding DEFAULT_CURRENCY_PARAMS
+        salaires_xof (dict, optional): Role -> monthly salary in XOF
+        frais_fixes_xof (list, optional): Monthly fixed costs in XOF of every year
+        overrides (dict, optional): Other per-scenario parameters, as for simulate_batch
+        compact (bool, optional): Compute in float32 with integer headcounts
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Returns:
+        dict: simulate_batch results of shape (n, nb_trimestres), plus 'Taux_EUR_XOF'
+            and 'Indice_Salaires' of the scenarios
+    """
+    params = SimulationParams.from_dict(params)
+    devises = {**DEFAULT_CURRENCY_PARAMS, **(params_devises or {})}
+    overrides_devises = currency_overrides(params, devises, salaires_xof, frais_fixes_xof)
+
+    resultats = simulate_batch(params, {**(overrides or {}), **overrides_devises}, compact=compact,
+                               fiscalite=fiscalite)
+    forme = resultats['CA_SAS'].shape
+    resultats['Taux_EUR_XOF'] = np.broadcast_to(np.asarray(devises['taux_eur_xof'], dtype=float), forme)
+    resultats['Indice_Salaires'] = np.broadcast_to(
+        salary_index(devises['inflation_senegal'], forme[-1], devises['indexation_salaires'],
+                     devises['repercussion_inflation_salaires']), forme)
+    return resultats
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+
+"""
+Dated events and shocks on the quarterly timeline
+
+An event changes a parameter or an intermediate metric from a given quarter on,
+for instance the loss of a key client in Q6 (CA_SAS x 0.8), a TJM renegotiation
+(tjm_dev + 30), a hiring freeze (Nb_Developpeurs held), office move costs
+(Frais_Fixes + 15,000 in one quarter) or a tax rate change in year 3
+(taux_is_france + 0.03). A list of events is compiled into per-quarter adjustment
+arrays: parameter shocks become per-quarter overrides of simulate_batch, metric
+shocks are applied inside its formula chain, so that taxes and results follow.
+
+An event may also be random, with a probability of happening in every quarter.
+In Monte Carlo mode every scenario of the batch draws its own occurrences, and
+the adjustments become arrays of shape (n, nb_trimestres): thousands of event
+scenarios are evaluated as one batch, at about the cost of the plain runs.
+"""
+
+import numpy as np
+
+from config.parameters import SPECIFICATIONS, SimulationParams
+from model.batch import METRIQUES_AJUSTABLES, batch_size, param_getter, simulate_batch
+from model.kernel import simulate_fused
+
+
+TYPES_EVENEMENTS = ['additif', 'multiplicatif', 'gel']
+
+
+def _cibles_parametres(nb_annees):
+    """Parameters that events can shock"""
+    return [nom for nom in SPECIFICATIONS if nom != 'nb_annees'] + [
+        f'frais_fixes_annee{annee}' for annee in range(1, nb_annees + 1)]
+
+
+def normalize_event(evenement, nb_annees):
+    """
+    Checks an event and fills in its defaults
+
+    Args:
+        evenement (dict): Event with the keys
+            - 'cible': parameter name (except 'nb_annees') or metric of METRIQUES_AJUSTABLES
+            - 'type': 'additif' (adds 'valeur'), 'multiplicatif' (multiplies by 'valeur')
+              or 'gel' (holds the target at its value of the quarter before the event)
+            - 'valeur': amount or factor (not used by 'gel')
+            - 'trimestre' (1 by default) or 'annee': first quarter, or first quarter of
+              the year, when the event happens or may happen
+            - 'duree' (optional): quarters the effect lasts, until the end by default
+            - 'probabilite' (optional): probability of happening in every quarter from
+              'trimestre' on, the event being certain without it
+            - 'repetable' (optional): a random event may happen again after its first
+              occurrence, the effects of overlapping occurrences adding up
+            - 'nom' (optional): label of the event, '<cible> T<trimestre>' by default
+        nb_annees (int): Number of simulated years
+
+    Returns:
+        dict: Event with all its keys
+
+    Raises:
+        ValueError: Unknown target or type, or values out of range
+    """
+    inconnues = set(evenement) - {'cible', 'type', 'valeur', 'trimestre', 'annee', 'duree', 'probabilite',
+                                  'repetable', 'nom'}
+    if inconnues:
+        raise ValueError(f"Clés d'événement inconnues: {sorted(inconnues)}")
+    cible = evenement.get('cible')
+    if cible not in METRIQUES_AJUSTABLES and cible not in _cibles_parametres(nb_annees):
+        raise ValueError(f"Cible d'événement inconnue: {cible!r} (paramètre ou métrique parmi {METRIQUES_AJUSTABLES})")
+    type_evenement = evenement.get('type', 'additif')
+    if type_evenement not in TYPES_EVENEMENTS:
+        raise ValueError(f"Type d'événement inconnu: {type_evenement!r} (types: {TYPES_EVENEMENTS})")
+    if type_evenement != 'gel' and 'valeur' not in evenement:
+        raise ValueError(f"L'événement sur {cible} doit préciser sa valeur")
+
+    nb_trimestres = nb_annees * 4
+    if 'annee' in evenement and 'trimestre' in evenement:
+        raise ValueError("Un événement est daté par son trimestre ou par son année, pas les deux")
+    trimestre = (evenement['annee'] - 1) * 4 + 1 if 'annee' in evenement else evenement.get('trimestre', 1)
+    if not 1 <= trimestre <= nb_trimestres:
+        raise ValueError(f"L'événement sur {cible} doit commencer entre le trimestre 1 et le trimestre {nb_trimestres}")
+    duree = evenement.get('duree')
+    if duree is not None and duree < 1:
+        raise ValueError(f"La durée de l'événement sur {cible} doit être d'au moins un trimestre")
+    probabilite = evenement.get('probabilite')
+    if probabilite is not None and not 0 <= probabilite <= 1:
+        raise ValueError(f"La probabilité de l'événement sur {cible} doit être comprise entre 0 et 1")
+
+    return {
+        'cible': cible,
+        'type': type_evenement,
+        'valeur': float(evenement.get('valeur', 0.0)),
+        'trimestre': int(trimestre),
+        'duree': None if duree is None else int(duree),
+        'probabilite': None if probabilite is None else float(probabilite),
+        'repetable': bool(evenement.get('repetable', False)),
+        'nom': evenement.get('nom') or f"{cible} T{int(trimestre)}",
+    }
+
+
+def _tirer(evenement, nb_trimestres, n, generateur):
+    """
+    Quarters in which the effect of an event lasts
+
+    A certain event or a random event happening once is described by its first quarter:
+    drawing it from a geometric law costs one draw per scenario. A repeatable event draws
+    every quarter and counts its overlapping occurrences.
+
+    Returns:
+        tuple: (active occurrences, booleans or counts of shape (1 or n, nb_trimestres),
+            first quarter (1-based, 0 when it did not happen) of shape (1 or n,))
+    """
+    t = np.arange(nb_trimestres)
+    debut = evenement['trimestre'] - 1
+    probabilite = evenement['probabilite']
+
+    if evenement['repetable'] and probabilite is not None:
+        occurrences = (generateur.random((n, nb_trimestres)) < probabilite) & (t >= debut)
+        cumul = np.cumsum(occurrences, axis=1, dtype=np.int32)
+        actives = cumul.copy()
+        if evenement['duree'] is not None and evenement['duree'] < nb_trimestres:
+            actives[:, evenement['duree']:] -= cumul[:, :-evenement['duree']]
+        premieres = np.where(occurrences.any(axis=1), occurrences.argmax(axis=1) + 1, 0)
+        return actives, premieres
+
+    if probabilite is None:
+        debuts = np.array([debut])
+    elif probabilite == 0:
+        debuts = np.full(n, nb_trimestres)
+    else:
+        # Number of quarters until the first occurrence, nb_trimestres or more: never
+        debuts = debut + generateur.geometric(probabilite, n) - 1
+    fin = nb_trimestres if evenement['duree'] is None else debuts[:, None] + evenement['duree']
+    actives = (t >= debuts[:, None]) & (t < fin)
+    premieres = np.where(debuts < nb_trimestres, debuts + 1, 0)
+    return actives, premieres
+
+
+def compile_events(evenements, nb_annees, n=1, graine=None):
+    """
+    Compiles a list of events into per-quarter adjustment arrays
+
+    Certain events give arrays of shape (1, nb_trimestres), random events arrays of
+    shape (n, nb_trimestres) with independent draws for every scenario. Events without
+    a name on the same target and quarter are told apart by a suffix: ' (2)', ' (3)'...
+
+    Args:
+        evenements (list): Events (see normalize_event)
+        nb_annees (int): Number of simulated years
+        n (int, optional): Number of scenarios of the Monte Carlo draws
+        graine (int, optional): Seed of the random generator
+
+    Returns:
+        tuple: (target -> {'facteur': array or None, 'ajout': array or None, 'gel':
+            boolean array or None}, event name -> first quarter of the event (1-based,
+            0 when it did not happen) of shape (1 or n,))
+
+    Raises:
+        ValueError: Invalid event (see normalize_event), or two events with the same name
+    """
+    nb_trimestres = nb_annees * 4
+    noms = [evenement.get('nom') for evenement in evenements if evenement.get('nom')]
+    doublons = sorted({nom for nom in noms if noms.count(nom) > 1})
+    if doublons:
+        raise ValueError(f"Noms d'événements en double: {doublons}")
+
+    generateur = np.random.default_rng(graine)
+    ajustements, premieres = {}, {}
+    for evenement in evenements:
+        nomme = bool(evenement.get('nom'))
+        evenement = normalize_event(evenement, nb_annees)
+        nom, rang = evenement['nom'], 1
+        while not nomme and (nom in premieres or nom in noms):
+            rang += 1
+            nom = f"{evenement['nom']} ({rang})"
+        actives, premieres[nom] = _tirer(evenement, nb_trimestres, n, generateur)
+
+        ajustement = ajustements.setdefault(evenement['cible'], {'facteur': None, 'ajout': None, 'gel': None})
+        if evenement['type'] == 'multiplicatif':
+            facteur = (evenement['valeur'] ** actives if actives.dtype != bool
+                       else np.where(actives, evenement['valeur'], 1.0))
+            ajustement['facteur'] = facteur if ajustement['facteur'] is None else ajustement['facteur'] * facteur
+        elif evenement['type'] == 'additif':
+            ajout = evenement['valeur'] * actives
+            ajustement['ajout'] = ajout if ajustement['ajout'] is None else ajustement['ajout'] + ajout
+        else:
+            gel = actives > 0
+            ajustement['gel'] = gel if ajustement['gel'] is None else ajustement['gel'] | gel
+
+    return ajustements, premieres
+
+
+def apply_adjustment(valeurs, ajustement):
+    """
+    Applies compiled adjustments to per-quarter values
+
+    Held quarters take the value of the last quarter before them, then values are
+    multiplied by the factors and the additive shocks are added.
+
+    Args:
+        valeurs (numpy.ndarray): Values broadcastable to (n, nb_trimestres)
+        ajustement (dict): 'facteur', 'ajout' and 'gel' arrays (see compile_events)
+
+    Returns:
+        numpy.ndarray: Adjusted values
+    """
+    if ajustement['gel'] is not None:
+        forme = np.broadcast_shapes(np.shape(valeurs), ajustement['gel'].shape)
+        valeurs, gel = np.broadcast_to(valeurs, forme), np.broadcast_to(ajustement['gel'], forme)
+        t = np.arange(forme[-1])
+        # Last quarter that is not held (the first quarter itself when held from the start)
+        source = np.maximum.accumulate(np.where(gel, 0, t), axis=-1)
+        valeurs = np.take_along_axis(valeurs, source, axis=-1)
+    if ajustement['facteur'] is not None:
+        valeurs = valeurs * ajustement['facteur']
+    if ajustement['ajout'] is not None:
+        valeurs = valeurs + ajustement['ajout']
+    return valeurs
+
+
+def simulate_events(params, evenements, n=None, graine=None, overrides=None, colonnes=None, fiscalite=None):
+    """
+    Calculates quarterly results under dated and random events
+
+    Certain events are the same for every scenario; with random events, each of the
+    n scenarios draws its own occurrences (Monte Carlo). Shocked parameter values are
+    not checked against SPECIFICATIONS.
+
+    Args:
+        params (dict or SimulationParams): Base simulation parameters
+        evenements (list): Events (see normalize_event)
+        n (int, optional): Number of Monte Carlo scenarios, the size of overrides by default
+        graine (int, optional): Seed of the random draws
+        overrides (dict, optional): Other per-scenario parameters, as for simulate_batch
+        colonnes (list, optional): Columns to return, all of COLONNES_TRIMESTRIELLES by default
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Returns:
+        dict: simulate_batch results of shape (n, nb_trimestres), plus 'Evenements':
+            event name -> quarter (1-based) of its first occurrence in every scenario,
+            0 when it did not happen, of shape (n,)
+    """
+    params = SimulationParams.from_dict(params)
+    overrides = dict(overrides or {})
+    taille_overrides = batch_size(overrides)
+    n = n or taille_overrides
+    if taille_overrides not in (1, n):
+        raise ValueError(f"{n} scénarios demandés mais les surcharges en décrivent {taille_overrides}")
+
+    nb_trimestres = params.nb_annees * 4
+    ajustements, premieres = compile_events(evenements, params.nb_annees, n, graine)
+
+    # Parameter shocks become per-quarter overrides, shaped (n, nb_trimestres) so that
+    # their size matches the other overrides
+    p = param_getter(params, overrides)
+    for cible in [cible for cible in ajustements if cible not in METRIQUES_AJUSTABLES]:
+        valeurs = np.broadcast_to(p(cible), (n, nb_trimestres))
+        overrides[cible] = np.broadcast_to(apply_adjustment(valeurs, ajustements.pop(cible)), (n, nb_trimestres))
+
+    if ajustements:
+        fonctions = {metrique: (lambda valeurs, ajustement=ajustement: apply_adjustment(valeurs, ajustement))
+                     for metrique, ajustement in ajustements.items()}
+        resultats = simulate_batch(params, overrides, colonnes=colonnes, ajustements=fonctions,
+                                    fiscalite=fiscalite)
+    else:
+        # Only parameter shocks: the fused kernel reads per-quarter parameters directly
+        resultats = simulate_fused(params, overrides, colonnes=colonnes, fiscalite=fiscalite)
+
+    resultats = {nom: np.broadcast_to(valeurs, (n, nb_trimestres)) if np.ndim(valeurs) == 2 else valeurs
+                 for nom, valeurs in resultats.items()}
+    resultats['Evenements'] = {nom: np.broadcast_to(premieres_evenement, (n,))
+                               for nom, premieres_evenement in premieres.items()}
+    return resultats
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+
+"""
+Vectorized goal seek: the parameter value reaching a target on any output metric
+
+All targets and scenarios of a call are solved together: every iteration is one
+evaluation over the problems not yet converged, with the linear decomposition of
+model/linear.py when only prices, salaries and rates vary, with simulate_fused
+otherwise.
+"""
+
+import numpy as np
+
+from config.parameters import SPECIFICATIONS
+from model.aggregation import EFFECTIFS, FLUX, GRANULARITES, aggregate, compute_ratios, required_columns
+from model.batch import batch_size
+from model.kernel import simulate_fused
+from model.linear import decomposable, simulate_linear
+
+
+# Metrics that can be targeted, ratios of the aggregated flows included
+METRIQUES = FLUX + EFFECTIFS + ['Taux_Marge_Nette', 'Part_SARL', 'Part_SAS', 'Ratio_SAS_SARL']
+
+# Upper bound of the initial bracket of unbounded parameters, relative to their current value
+_FACTEUR_BORNE_HAUTE = 2
+
+# Doublings of the upper bound tried before giving up on a bracket
+_EXPANSIONS_MAX = 30
+
+
+def evaluate_metric(params, metrique, granularite='annuel', periode=None, overrides=None):
+    """
+    Value of one metric for one period, for a batch of scenarios
+
+    Args:
+        params (dict or SimulationParams): Base simulation parameters
+        metrique (str): Metric of METRIQUES
+        granularite (str, optional): 'trimestriel', 'semestriel', 'annuel' or 'total'
+            (the whole horizon)
+        periode (int, optional): 1-based period of the granularity, the last one by default
+        overrides (dict, optional): Per-scenario parameters, as for simulate_batch
+
+    Returns:
+        numpy.ndarray: Metric of shape (n,)
+    """
+    if metrique not in METRIQUES:
+        raise ValueError(f"Métrique inconnue: {metrique} (choix: {METRIQUES})")
+    if granularite != 'total' and granularite not in GRANULARITES:
+        raise ValueError(f"Granularité inconnue: {granularite} (choix: {list(GRANULARITES) + ['total']})")
+
+    if decomposable(overrides):
+        # Prices, salaries and rates only: one evaluation of the linear decomposition
+        valeurs = simulate_linear(params, overrides, granularite, [metrique])[metrique]
+    else:
+        colonnes = sorted(required_columns([metrique]))
+        resultats = simulate_fused(params, overrides, colonnes=colonnes)
+        if granularite == 'total':
+            totaux = {colonne: resultats[colonne][..., -1:] if colonne in EFFECTIFS else
+                      resultats[colonne].sum(axis=-1, keepdims=True) for colonne in colonnes}
+            totaux.update(compute_ratios(totaux))
+            valeurs = totaux[metrique]
+        else:
+            valeurs = aggregate(resultats, granularite, [metrique])[metrique]
+
+    if granularite == 'total':
+        return valeurs[:, 0]
+    nb_periodes = valeurs.shape[-1]
+    periode = nb_periodes if periode is None else periode
+    if not 1 <= periode <= nb_periodes:
+        raise ValueError(f"Période {periode} hors de l'horizon (1 à {nb_periodes})")
+    return valeurs[:, periode - 1]
+
+
+def goal_seek(params, parametre, metrique, cible, granularite='annuel', periode=None, bornes=None,
+              overrides=None, entier=None, tolerance=1e-9, iterations_max=100):
+    """
+    Solves for the value of one parameter at which a metric reaches a target
+
+    The root is bracketed, then refined with the Illinois variant of regula falsi
+    (secant steps that stay inside the bracket), vectorized over all problems:
+    targets of shape (m,) and per-scenario overrides of shape (n,) broadcast together.
+    Integer parameters are solved by bisection and give the first integer value, from
+    the lower to the upper bound, on the target's side. The metric need not be
+    monotonic, but only one crossing of the target inside the bracket is found.
+
+    For example, the developer TJM giving a 25 % net margin in year 2:
+    goal_seek(params, 'tjm_dev', 'Taux_Marge_Nette', 0.25, periode=2)
+
+    Args:
+        params (dict or SimulationParams): Base simulation parameters
+        parametre (str): Parameter to solve for (any but 'nb_annees')
+        metrique (str): Metric of METRIQUES
+        cible (float or array-like): Target value(s) of the metric
+        granularite (str, optional): 'trimestriel', 'semestriel', 'annuel' or 'total'
+        periode (int, optional): 1-based period of the granularity, the last one by default
+        bornes (tuple, optional): (lower, upper) bounds of the search, None for those
+            of SPECIFICATIONS; without any upper bound, the upper end of the search is
+            doubled until the target is bracketed
+        overrides (dict, optional): Other per-scenario parameters, as for simulate_batch
+        entier (bool, optional): Integer solution, as specified in SPECIFICATIONS by default
+        tolerance (float, optional): Relative tolerance on the parameter and on the metric
+        iterations_max (int, optional): Maximum number of refinement iterations
+
+    Returns:
+        dict: 'valeur' (solution, NaN where the target is not reachable in the bounds),
+            'atteint' (bool) and 'metrique' (metric at the solution), of the broadcast
+            shape of the targets and scenarios, plus 'evaluations' (number of batched
+            model evaluations)
+    """
+    if parametre == 'nb_annees' or (parametre not in SPECIFICATIONS and not parametre.startswith('frais_fixes_annee')):
+        raise ValueError(f"Paramètre non résoluble: {parametre}")
+    overrides = dict(overrides or {})
+    overrides.pop(parametre, None)
+    minimum, maximum, entier_spec = SPECIFICATIONS.get(parametre, (0, None, False))
+    entier = entier_spec if entier is None else entier
+
+    cible = np.asarray(cible, dtype=float)
+    forme = np.broadcast_shapes(cible.shape, (batch_size(overrides),) if overrides else ())
+    taille = int(np.prod(forme))
+    cible = np.broadcast_to(cible, forme).ravel()
+    overrides = {nom: np.broadcast_to(valeur, forme + np.shape(valeur)[1:]).reshape((taille,) + np.shape(valeur)[1:])
+                 if np.ndim(valeur) > 0 else valeur for nom, valeur in overrides.items()}
+    evaluations = 0
+
+    def ecart(valeurs, indices):
+        """Metric minus target for the problems of indices at the parameter values"""
+        nonlocal evaluations
+        evaluations += 1
+        surcharges = {nom: valeur[indices] if np.ndim(valeur) > 0 else valeur for nom, valeur in overrides.items()}
+        surcharges[parametre] = valeurs
+        return evaluate_metric(params, metrique, granularite, periode, surcharges) - cible[indices]
+
+    tous = np.arange(taille)
+    borne_basse, borne_haute = bornes if bornes is not None else (None, None)
+    borne_basse = minimum if borne_basse is None else borne_basse
+    borne_haute = maximum if borne_haute is None else borne_haute
+    bas = np.full(taille, float(borne_basse))
+    haut = np.full(taille, float(borne_haute) if borne_haute is not None else
+                   max(_FACTEUR_BORNE_HAUTE * abs(float(params[parametre])), float(borne_basse) + 1))
+    if entier:
+        bas, haut = np.ceil(bas), np.floor(haut)
+    f_bas, f_haut = ecart(bas, tous), ecart(haut, tous)
+
+    # Unbounded parameters: double the upper bound until the target is bracketed
+    if borne_haute is None:
+        for _ in range(_EXPANSIONS_MAX):
+            a_elargir = np.nonzero(np.sign(f_bas) * np.sign(f_haut) > 0)[0]
+            if not len(a_elargir):
+                break
+            bas[a_elargir], f_bas[a_elargir] = haut[a_elargir], f_haut[a_elargir]
+            haut[a_elargir] *= 2
+            f_haut[a_elargir] = ecart(haut[a_elargir], a_elargir)
+
+    with np.errstate(invalid='ignore'):
+        atteint = np.sign(f_bas) * np.sign(f_haut) <= 0
+    solution = np.where(f_bas == 0, bas, np.where(f_haut == 0, haut, np.nan))
+    echelle_metrique = tolerance * np.maximum(np.abs(cible), 1.0)
+    actifs = np.nonzero(atteint & np.isnan(solution))[0]
+    a, b, fa, fb = bas[actifs], haut[actifs], f_bas[actifs], f_haut[actifs]
+    cote = np.zeros(len(actifs))
+
+    for _ in range(iterations_max):
+        if not len(actifs):
+            break
+
+        if entier:
+            c = np.floor((a + b) / 2)
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                c = (fa * b - fb * a) / (fa - fb)
+            c = np.where(np.isfinite(c) & (c > np.minimum(a, b)) & (c < np.maximum(a, b)), c, (a + b) / 2)
+        fc = ecart(c, actifs)
+
+        meme_signe_b = np.sign(fc) == np.sign(fb)
+        # Illinois: halve the value of the end point kept twice in a row
+        fa = np.where(meme_signe_b & (cote == -1), fa / 2, fa)
+        fb = np.where(~meme_signe_b & (cote == 1), fb / 2, fb)
+        a, fa, b, fb = (np.where(meme_signe_b, a, c), np.where(meme_signe_b, fa, fc),
+                        np.where(meme_signe_b, c, b), np.where(meme_signe_b, fc, fb))
+        cote = np.where(meme_signe_b, -1, 1)
+
+        if entier:
+            resolus = (np.abs(b - a) <= 1) | (fc == 0)
+            valeurs = np.where(fc == 0, c, b)
+        else:
+            resolus = (np.abs(fc) <= echelle_metrique[actifs]) | (np.abs(b - a) <= tolerance * np.maximum(np.abs(c), 1.0))
+            valeurs = c
+        solution[actifs[resolus]] = valeurs[resolus]
+        garder = ~resolus
+        actifs, a, b, fa, fb, cote = actifs[garder], a[garder], b[garder], fa[garder], fb[garder], cote[garder]
+
+    # Problems not converged within iterations_max: best end point of their bracket
+    solution[actifs] = np.where(np.abs(fa) < np.abs(fb), a, b)
+
+    metrique_atteinte = np.full(taille, np.nan)
+    trouves = np.nonzero(~np.isnan(solution))[0]
+    if len(trouves):
+        metrique_atteinte[trouves] = ecart(solution[trouves], trouves) + cible[trouves]
+
+    def mettre_en_forme(valeur):
+        valeur = valeur.reshape(forme)
+        return valeur[()] if valeur.ndim == 0 else valeur
+
+    return {
+        'valeur': mettre_en_forme(solution),
+        'atteint': mettre_en_forme(~np.isnan(solution)),
+        'metrique': mettre_en_forme(metrique_atteinte),
+        'evaluations': evaluations,
+    }
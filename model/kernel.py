@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+
+"""
+Fused simulation kernel: the whole quarterly formula chain in one pass per scenario
+
+simulate_batch allocates one (n, nb_trimestres) array per intermediate column of
+the formula chain. When Numba is installed, simulate_fused compiles the chain into
+one loop over scenarios and quarters that keeps the intermediate values in
+registers and only writes the requested columns. The operations are those of
+simulate_batch, in the same order and without fast-math, so the results are
+identical. The compiled kernel releases the GIL, so that threads (such as the
+service's worker pool) evaluate batches in parallel. Without Numba,
+simulate_fused falls back to simulate_batch.
+"""
+
+import numpy as np
+
+from model.batch import COLONNES_TRIMESTRIELLES, batch_size, param_getter, simulate_batch
+from model.taxes import compute_tax_results, normalize_tax_regime
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+NUMBA_DISPONIBLE = numba is not None
+
+# Parameters read by the kernel, in the order of the first axis of its values
+PARAMETRES_NOYAU = [
+    'effectif_dev_initial', 'ajout_dev_par_trimestre', 'trimestre_ajout_support', 'jours_facturable_mois',
+    'tjm_dev', 'taux_occupation_dev', 'tjm_lead', 'taux_occupation_lead', 'tjm_cdp', 'taux_occupation_cdp',
+    'salaire_dev', 'salaire_lead', 'salaire_cdp', 'salaire_rh', 'taux_charges_patronales',
+    'marge_securite', 'taux_is_senegal', 'taux_is_france'
+]
+
+# Columns that annual tax rules read from the kernel's results
+COLONNES_AVANT_IMPOTS = ['CA_SAS', 'Transfert_SARL', 'Marge_Securite']
+
+
+def _chaine_trimestrielle(sortie, index_colonnes, valeurs, frais_fixes_mensuel):
+    """
+    Quarterly formula chain of every scenario
+
+    Args:
+        sortie (numpy.ndarray): Output of shape (nb_colonnes_demandees, n, nb_trimestres)
+        index_colonnes (numpy.ndarray): Row of sortie of every column of
+            COLONNES_TRIMESTRIELLES, -1 for the columns not requested
+        valeurs (numpy.ndarray): Values of PARAMETRES_NOYAU, of shape
+            (nb_parametres, 1 or n, 1 or nb_trimestres)
+        frais_fixes_mensuel (numpy.ndarray): Monthly fixed costs of shape (1 or n, nb_trimestres)
+    """
+    n, nb_trimestres = sortie.shape[1], sortie.shape[2]
+    for i in range(n):
+        ligne = min(i, valeurs.shape[1] - 1)
+        frais_scenario = frais_fixes_mensuel[min(i, frais_fixes_mensuel.shape[0] - 1)]
+        for t in range(nb_trimestres):
+            v = valeurs[:, ligne, min(t, valeurs.shape[2] - 1)]
+
+            nb_dev = v[0] + float(t) * v[1]
+            support = 1.0 if float(t) >= v[2] - 1 else 0.0
+
+            jours = v[3]
+            ca_mensuel = (nb_dev * v[4] * jours * v[5]
+                          + support * v[6] * jours * v[7]
+                          + support * v[8] * jours * v[9])
+            ca_trimestriel = ca_mensuel * 3
+
+            cout_mensuel_salaires = nb_dev * v[10] + support * v[11] + support * v[12] + support * v[13]
+            cout_mensuel_charges = cout_mensuel_salaires * v[14]
+            cout_trimestriel_salaires = (cout_mensuel_salaires + cout_mensuel_charges) * 3
+            frais_fixes_trimestriel = frais_scenario[t] * 3
+
+            sous_total = cout_trimestriel_salaires + frais_fixes_trimestriel
+            marge_securite = sous_total * v[15]
+            transfert_sarl = sous_total + marge_securite
+
+            is_senegal = marge_securite * v[16]
+            resultat_net_sarl = marge_securite - is_senegal
+
+            resultat_avant_is_sas = ca_trimestriel - transfert_sarl
+            is_france = resultat_avant_is_sas * v[17]
+            resultat_net_sas = resultat_avant_is_sas - is_france
+
+            resultat_net_consolide = resultat_net_sarl + resultat_net_sas
+            taux_marge_nette = resultat_net_consolide / ca_trimestriel if ca_trimestriel > 0 else 0.0
+            ratio_sas_sarl = resultat_net_sas / resultat_net_sarl if resultat_net_sarl > 0 else np.inf
+
+            if index_colonnes[0] >= 0:
+                sortie[index_colonnes[0], i, t] = nb_dev
+            if index_colonnes[1] >= 0:
+                sortie[index_colonnes[1], i, t] = support
+            if index_colonnes[2] >= 0:
+                sortie[index_colonnes[2], i, t] = support
+            if index_colonnes[3] >= 0:
+                sortie[index_colonnes[3], i, t] = support
+            if index_colonnes[4] >= 0:
+                sortie[index_colonnes[4], i, t] = ca_trimestriel
+            if index_colonnes[5] >= 0:
+                sortie[index_colonnes[5], i, t] = transfert_sarl
+            if index_colonnes[6] >= 0:
+                sortie[index_colonnes[6], i, t] = cout_trimestriel_salaires
+            if index_colonnes[7] >= 0:
+                sortie[index_colonnes[7], i, t] = frais_fixes_trimestriel
+            if index_colonnes[8] >= 0:
+                sortie[index_colonnes[8], i, t] = marge_securite
+            if index_colonnes[9] >= 0:
+                sortie[index_colonnes[9], i, t] = is_senegal
+            if index_colonnes[10] >= 0:
+                sortie[index_colonnes[10], i, t] = resultat_net_sarl
+            if index_colonnes[11] >= 0:
+                sortie[index_colonnes[11], i, t] = is_france
+            if index_colonnes[12] >= 0:
+                sortie[index_colonnes[12], i, t] = resultat_net_sas
+            if index_colonnes[13] >= 0:
+                sortie[index_colonnes[13], i, t] = resultat_net_consolide
+            if index_colonnes[14] >= 0:
+                sortie[index_colonnes[14], i, t] = taux_marge_nette
+            if index_colonnes[15] >= 0:
+                sortie[index_colonnes[15], i, t] = ratio_sas_sarl
+
+
+if NUMBA_DISPONIBLE:
+    _noyau = numba.njit(cache=True, nogil=True, error_model='numpy')(_chaine_trimestrielle)
+
+
+def simulate_fused(params, overrides=None, colonnes=None, fiscalite=None):
+    """
+    Calculates the quarterly results of many scenarios with the fused kernel
+
+    Same arguments and results as simulate_batch (float64 only), but only the
+    requested columns are allocated, as one contiguous block. Without Numba the
+    call is forwarded to simulate_batch. Annual tax rules are applied after the
+    kernel, to its results before tax (see model/taxes.py).
+
+    Args:
+        params (dict or SimulationParams): Base simulation parameters
+        overrides (dict or numpy.ndarray, optional): Per-scenario values, as for simulate_batch
+        colonnes (list, optional): Columns to return, all of COLONNES_TRIMESTRIELLES by default
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Returns:
+        dict: Column name -> numpy.ndarray of shape (n, nb_trimestres), plus 'Annee'
+            and 'Trimestre' of shape (nb_trimestres,)
+    """
+    if not NUMBA_DISPONIBLE:
+        return simulate_batch(params, overrides, colonnes=colonnes, fiscalite=fiscalite)
+
+    if isinstance(overrides, np.ndarray):
+        overrides = {nom: overrides[nom] for nom in overrides.dtype.names}
+    overrides = overrides if overrides is not None else {}
+    if 'nb_annees' in overrides:
+        raise ValueError("'nb_annees' définit l'horizon et ne peut pas varier au sein d'un lot")
+    colonnes = COLONNES_TRIMESTRIELLES if colonnes is None else list(colonnes)
+    inconnues = set(colonnes) - set(COLONNES_TRIMESTRIELLES)
+    if inconnues:
+        raise ValueError(f"Colonnes inconnues: {sorted(inconnues)}")
+
+    n = batch_size(overrides)
+    nb_annees = params['nb_annees']
+    nb_trimestres = nb_annees * 4
+    annees = np.arange(nb_trimestres) // 4 + 1
+
+    # One row and one quarter of parameter values unless some of them vary per
+    # scenario or per quarter: the kernel reads them as (1 or n, 1 or nb_trimestres)
+    p = param_getter(params, overrides)
+    parametres = [p(nom) for nom in PARAMETRES_NOYAU]
+    formes = [np.shape(valeur) for valeur in parametres]
+    valeurs = np.empty((len(PARAMETRES_NOYAU),
+                        n if any(forme[:1] > (1,) for forme in formes) else 1,
+                        nb_trimestres if any(forme[1:] > (1,) for forme in formes) else 1))
+    for k, valeur in enumerate(parametres):
+        valeurs[k] = valeur
+
+    # Same expression as compute_financial_results, of shape (1 or n, nb_trimestres)
+    frais_fixes_mensuel = sum(p(f'frais_fixes_annee{annee}') * (annees == annee) for annee in range(1, nb_annees + 1))
+    frais_fixes_mensuel = np.ascontiguousarray(frais_fixes_mensuel, dtype=np.float64).reshape(-1, nb_trimestres)
+
+    regime = normalize_tax_regime(fiscalite)
+    colonnes_noyau = colonnes
+    if any(regime.values()):
+        colonnes_noyau = colonnes + [colonne for colonne in COLONNES_AVANT_IMPOTS if colonne not in colonnes]
+
+    index_colonnes = np.full(len(COLONNES_TRIMESTRIELLES), -1, dtype=np.int64)
+    for rang, colonne in enumerate(colonnes_noyau):
+        index_colonnes[COLONNES_TRIMESTRIELLES.index(colonne)] = rang
+    sortie = np.empty((len(colonnes_noyau), n, nb_trimestres))
+    _noyau(sortie, index_colonnes, valeurs, frais_fixes_mensuel)
+
+    resultats = dict(zip(colonnes_noyau, sortie))
+    if colonnes_noyau is not colonnes:
+        # Annual tax rules depend on the whole years: they replace the kernel's flat taxes
+        impots = compute_tax_results(*(resultats[colonne] for colonne in COLONNES_AVANT_IMPOTS), p, regime)
+        resultats = {colonne: impots.get(colonne, resultats[colonne]) for colonne in colonnes}
+    resultats['Annee'] = annees
+    resultats['Trimestre'] = np.arange(nb_trimestres) % 4 + 1
+    return resultats
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+
+"""
+Linear decomposition of the results for near-free what-if queries on prices, salaries and rates
+
+Once the horizon and the start quarter of the support roles are fixed, every
+flow of a period is a sum of per-head amounts weighted by headcount coefficients:
+the number of quarters of the period, the sum of their ranks (developers are
+effectif_dev_initial + t * ajout_dev_par_trimestre), the number of quarters with
+the support roles and the number of quarters of every year (fixed costs). A
+LinearDecomposition computes these coefficients once per structure and
+granularity. Evaluating a what-if is then a few products of per-scenario arrays
+per period, whatever the number of quarters summed: the whole horizon costs one
+product per flow. Flat taxes are linear and follow. Ratios are computed from the
+aggregated flows, as by aggregate.
+
+Annual tax rules are not linear: with them, the pre-tax flows are evaluated per
+quarter, taxed by model/taxes.py and aggregated. Results equal the aggregated
+results of simulate_batch up to floating-point rounding.
+"""
+
+import functools
+
+import numpy as np
+
+from model.aggregation import EFFECTIFS, FLUX, GRANULARITES, aggregate, compute_ratios, required_columns
+from model.batch import batch_size, param_getter
+from model.taxes import compute_tax_results, normalize_tax_regime
+
+
+# Parameters that fix the coefficients of a decomposition: they cannot vary within a batch
+PARAMETRES_STRUCTURELS = ['nb_annees', 'trimestre_ajout_support']
+
+# Granularities of the decompositions, 'total' being the whole horizon as one period
+GRANULARITES_LINEAIRES = list(GRANULARITES) + ['total']
+
+# Metrics returned by the decompositions
+COLONNES_LINEAIRES = FLUX + EFFECTIFS + ['Taux_Marge_Nette', 'Part_SARL', 'Part_SAS', 'Ratio_SAS_SARL']
+
+
+class LinearDecomposition:
+    """
+    Headcount coefficients of every period for one structure of the simulation.
+
+    The coefficients are arrays of shape (nb_periodes,): 'trimestres' (quarters of the
+    period), 'rangs' (sum of their 0-based ranks), 'support' (quarters with the support
+    roles), 'rang_final' and 'support_final' (last quarter of the period, for the
+    headcounts), and 'frais_fixes' of shape (nb_annees, nb_periodes), the quarters of
+    every year in the period.
+    """
+
+    def __init__(self, nb_annees, trimestre_ajout_support, granularite='annuel'):
+        """
+        Compute the coefficients of a structure
+
+        Args:
+            nb_annees (int): Number of simulated years
+            trimestre_ajout_support (int): 1-based quarter of the support roles
+            granularite (str, optional): Granularity of GRANULARITES_LINEAIRES
+
+        Raises:
+            ValueError: Unknown granularity
+        """
+        if granularite not in GRANULARITES_LINEAIRES:
+            raise ValueError(f"Granularité inconnue: {granularite} (choix: {GRANULARITES_LINEAIRES})")
+        self.nb_annees = nb_annees
+        self.trimestre_ajout_support = trimestre_ajout_support
+        self.granularite = granularite
+
+        nb_trimestres = nb_annees * 4
+        taille = nb_trimestres if granularite == 'total' else GRANULARITES[granularite]
+        rangs = np.arange(nb_trimestres, dtype=float).reshape(-1, taille)
+        support = (rangs >= trimestre_ajout_support - 1).astype(float)
+        annees = rangs // 4 + 1
+
+        self.coefficients = {
+            'trimestres': np.full(len(rangs), float(taille)),
+            'rangs': rangs.sum(axis=1),
+            'support': support.sum(axis=1),
+            'rang_final': rangs[:, -1],
+            'support_final': support[:, -1],
+            'frais_fixes': np.stack([(annees == annee).sum(axis=1).astype(float)
+                                     for annee in range(1, nb_annees + 1)]),
+        }
+        self.nb_periodes = len(rangs)
+
+    def evaluate(self, params, overrides=None):
+        """
+        Flows, headcounts and ratios of every period, with flat tax rates
+
+        Args:
+            params (dict or SimulationParams): Base simulation parameters
+            overrides (dict, optional): Parameter name -> scalar or (n,) per-scenario values
+
+        Returns:
+            dict: Metric of COLONNES_LINEAIRES -> numpy.ndarray of shape (n, nb_periodes)
+
+        Raises:
+            ValueError: Structural parameter overridden, or overrides varying per quarter
+        """
+        overrides = overrides if overrides is not None else {}
+        if not decomposable(overrides):
+            raise ValueError(f"Les paramètres {PARAMETRES_STRUCTURELS} fixent la structure de la décomposition et "
+                             "ne peuvent pas varier au sein d'un lot, ni aucun paramètre par trimestre")
+
+        n = batch_size(overrides)
+        p = param_getter(params, overrides)
+        c = self.coefficients
+
+        # Developer-quarters of every period, and the per-head amounts of a quarter
+        developpeurs = p('effectif_dev_initial') * c['trimestres'] + p('ajout_dev_par_trimestre') * c['rangs']
+        jours_trimestre = p('jours_facturable_mois') * 3
+        ca_developpeur = p('tjm_dev') * p('taux_occupation_dev') * jours_trimestre
+        ca_support = (p('tjm_lead') * p('taux_occupation_lead') + p('tjm_cdp') * p('taux_occupation_cdp')) * jours_trimestre
+        facteur_charges = (1 + p('taux_charges_patronales')) * 3
+        cout_developpeur = p('salaire_dev') * facteur_charges
+        cout_support = (p('salaire_lead') + p('salaire_cdp') + p('salaire_rh')) * facteur_charges
+
+        ca = ca_developpeur * developpeurs + ca_support * c['support']
+        cout_salaires = cout_developpeur * developpeurs + cout_support * c['support']
+        frais_fixes = sum(p(f'frais_fixes_annee{annee}') * 3 * c['frais_fixes'][annee - 1]
+                          for annee in range(1, self.nb_annees + 1))
+
+        sous_total = cout_salaires + frais_fixes
+        marge_securite = sous_total * p('marge_securite')
+        transfert_sarl = sous_total + marge_securite
+        is_senegal = marge_securite * p('taux_is_senegal')
+        resultat_avant_is_sas = ca - transfert_sarl
+        is_france = resultat_avant_is_sas * p('taux_is_france')
+
+        support_final = np.broadcast_to(c['support_final'], (1, self.nb_periodes))
+        valeurs = {
+            'CA_SAS': ca, 'Transfert_SARL': transfert_sarl, 'Cout_Salaires': cout_salaires,
+            'Frais_Fixes': frais_fixes, 'Marge_Securite': marge_securite, 'IS_Senegal': is_senegal,
+            'Resultat_Net_SARL': marge_securite - is_senegal, 'IS_France': is_france,
+            'Resultat_Net_SAS': resultat_avant_is_sas - is_france,
+            'Nb_Developpeurs': p('effectif_dev_initial') + p('ajout_dev_par_trimestre') * c['rang_final'],
+            'Nb_Lead': support_final, 'Nb_CDP': support_final, 'Nb_RH': support_final,
+        }
+        valeurs['Resultat_Net_Consolide'] = valeurs['Resultat_Net_SARL'] + valeurs['Resultat_Net_SAS']
+        valeurs.update(compute_ratios(valeurs))
+        return {colonne: np.broadcast_to(valeurs[colonne], (n, self.nb_periodes)) for colonne in COLONNES_LINEAIRES}
+
+
+def decomposable(overrides):
+    """
+    True when per-scenario overrides can be evaluated by a linear decomposition: no
+    structural parameter among them and no value varying per quarter
+
+    Args:
+        overrides (dict): Parameter name -> per-scenario values, or None
+
+    Returns:
+        bool: The overrides are decomposable
+    """
+    overrides = overrides if overrides is not None else {}
+    return (set(PARAMETRES_STRUCTURELS).isdisjoint(overrides)
+            and all(np.ndim(valeur) <= 1 for valeur in overrides.values()))
+
+
+@functools.lru_cache(maxsize=256)
+def _decomposition(nb_annees, trimestre_ajout_support, granularite):
+    """Decomposition of a structure, computed once per process"""
+    return LinearDecomposition(nb_annees, trimestre_ajout_support, granularite)
+
+
+def linear_decomposition(params, granularite='annuel'):
+    """
+    Decomposition of the structure of a parameter set (cached)
+
+    Args:
+        params (dict or SimulationParams): Simulation parameters
+        granularite (str, optional): Granularity of GRANULARITES_LINEAIRES
+
+    Returns:
+        LinearDecomposition: Coefficients of the structure
+    """
+    return _decomposition(int(params['nb_annees']), int(params['trimestre_ajout_support']), granularite)
+
+
+def simulate_linear(params, overrides=None, granularite='annuel', colonnes=None, fiscalite=None):
+    """
+    Results per period of many scenarios from the linear decomposition of their structure
+
+    Args:
+        params (dict or SimulationParams): Base simulation parameters
+        overrides (dict or numpy.ndarray, optional): Per-scenario values of shape (n,), as for
+            simulate_batch, except for PARAMETRES_STRUCTURELS
+        granularite (str, optional): 'trimestriel', 'semestriel', 'annuel' or 'total'
+        colonnes (list, optional): Metrics of COLONNES_LINEAIRES to return, all by default
+        fiscalite (None, str or dict, optional): Corporate tax rules (see model.taxes.normalize_tax_regime),
+            flat quarterly rates by default
+
+    Returns:
+        dict: Metric name -> numpy.ndarray of shape (n, nb_periodes)
+
+    Raises:
+        ValueError: Unknown granularity or metric, structural parameter overridden, or
+            overrides varying per quarter
+    """
+    if isinstance(overrides, np.ndarray):
+        overrides = {nom: overrides[nom] for nom in overrides.dtype.names}
+    colonnes = COLONNES_LINEAIRES if colonnes is None else list(colonnes)
+    inconnues = set(colonnes) - set(COLONNES_LINEAIRES)
+    if inconnues:
+        raise ValueError(f"Colonnes inconnues: {sorted(inconnues)}")
+
+    regime = normalize_tax_regime(fiscalite)
+    if not any(regime.values()):
+        resultats = linear_decomposition(params, granularite).evaluate(params, overrides)
+        return {colonne: resultats[colonne] for colonne in colonnes}
+
+    # Annual tax rules depend on the whole years: quarterly pre-tax flows, then the taxes
+    trimestriel = linear_decomposition(params, 'trimestriel').evaluate(params, overrides)
+    p = param_getter(params, overrides if overrides is not None else {})
+    trimestriel.update(compute_tax_results(trimestriel['CA_SAS'], trimestriel['Transfert_SARL'],
+                                           trimestriel['Marge_Securite'], p, regime))
+    if granularite == 'total':
+        necessaires = required_columns(colonnes)
+        totaux = {colonne: trimestriel[colonne][..., -1:] if colonne in EFFECTIFS else
+                  trimestriel[colonne].sum(axis=-1, keepdims=True) for colonne in necessaires}
+        totaux.update(compute_ratios(totaux))
+        return {colonne: totaux[colonne] for colonne in colonnes}
+    agrege = aggregate(trimestriel, granularite, colonnes)
+    return {colonne: agrege[colonne] for colonne in colonnes}
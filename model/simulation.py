@@ -5,8 +5,10 @@
 Main financial simulation class for the SAS France & SARL Senegal model
 """
 
-from config.parameters import DEFAULT_PARAMS
+from config.parameters import DEFAULT_PARAMS, SimulationParams, params_hash
 from model.calculation import calculate_quarterly_results, calculate_annual_results
+from model.comparison import compare_scenarios
+from model.taxes import normalize_tax_regime
 from visualization.plots import (
     plot_evolution_ca_resultats,
     plot_repartition_benefices,
@@ -22,16 +24,30 @@ class SimulationFinanciere:
     over multiple years, by adjusting various economic parameters.
     """
 
-    def __init__(self, params=None):
+    def __init__(self, params=None, store=None, fiscalite=None):
         """
         Initialize the simulation with provided parameters or defaults
 
         Args:
-            params (dict): Dictionary of simulation parameters
+            params (dict or SimulationParams): Simulation parameters, missing ones
+                taken from DEFAULT_PARAMS when given as a dict
+            store (ResultStore, optional): Persistent store to reuse and save results
+            fiscalite (None, str or dict, optional): Corporate tax rules (see
+                model.taxes.normalize_tax_regime), flat quarterly rates by default
+
+        Raises:
+            ValueError: Unknown, missing or out-of-range parameter, or invalid tax rule
         """
-        self.params = DEFAULT_PARAMS.copy()
-        if params:
-            self.params.update(params)
+        if isinstance(params, SimulationParams):
+            self.params = params
+        else:
+            self.params = SimulationParams(**{**DEFAULT_PARAMS, **(params or {})})
+
+        self.store = store
+        self.fiscalite = normalize_tax_regime(fiscalite)
+        # Results under annual tax rules are stored apart from those of the flat rates
+        self._type_resultat = ('simulation' if not any(self.fiscalite.values())
+                               else f"simulation/{params_hash(self.fiscalite)[:16]}")
 
         self.resultats = None
         self.resultats_annuels = None
@@ -43,12 +59,20 @@ class SimulationFinanciere:
         Returns:
             pandas.DataFrame: DataFrame containing quarterly results
         """
+        if self.store is not None:
+            stocke = self.store.get(self._type_resultat, self.params)
+            if stocke is not None:
+                self.resultats, self.resultats_annuels = stocke
+                return self.resultats
 
-        self.resultats = calculate_quarterly_results(self.params)
+        self.resultats = calculate_quarterly_results(self.params, self.fiscalite)
 
 
         self.resultats_annuels = calculate_annual_results(self.resultats)
 
+        if self.store is not None:
+            self.store.put(self._type_resultat, self.params, (self.resultats, self.resultats_annuels))
+
         return self.resultats
 
     def plot_evolution_ca_resultats(self, nom_fichier=None):
@@ -80,14 +104,11 @@ class SimulationFinanciere:
         plot_evolution_effectifs_couts(self.resultats, self.params, nom_fichier)
 
     def plot_comparaison_scenarios(self, autre_simulation, nom_fichier=None):
-        """Compare with another simulation scenario"""
-        if self.resultats_annuels is None:
-            self.run_simulation()
-
-        if autre_simulation.resultats_annuels is None:
-            autre_simulation.run_simulation()
+        """Compare with another simulation scenario, or a list of scenarios, under the tax rules of this one"""
+        autres = autre_simulation if isinstance(autre_simulation, (list, tuple)) else [autre_simulation]
 
-        plot_comparaison_scenarios(self, autre_simulation, nom_fichier)
+        plot_comparaison_scenarios(compare_scenarios([self.params] + [autre.params for autre in autres],
+                                                     fiscalite=self.fiscalite), nom_fichier)
 
     def plot_point_mort_roi(self, nom_fichier=None):
         """Analyze the break-even point and ROI according to different parameters"""
@@ -101,7 +122,7 @@ class SimulationFinanciere:
         Run all available visualizations
 
         Args:
-            autre_simulation (SimulationFinanciere, optional): Another simulation for comparison
+            autre_simulation (SimulationFinanciere or list, optional): Other simulation(s) for comparison
             prefix (str, optional): Prefix for file names
         """
         self.plot_evolution_ca_resultats(f"{prefix}evolution_ca_resultats.png" if prefix else None)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+
+"""
+Cohort-based staffing engine: role catalogue, hiring plans, attrition and ramp-up
+
+Every quarter's hires of a role form a cohort. A cohort hired at quarter c still
+counts embauches * (1 - attrition) ** (t - c) people at quarter t, billed at
+rampe[t - c] times the role's occupation rate. Headcounts are the
+(role x cohort x period) products of the hiring plan with these survival and
+ramp-up kernels, summed over cohorts with one matrix product per role (or, for
+per-scenario attrition rates, the quarterly headcount recursion vectorized over
+scenarios), so a 200-person plan over a batch of scenarios needs no loop over
+people, cohorts or scenarios.
+"""
+
+import numpy as np
+
+from config.parameters import SimulationParams
+from model.batch import compute_financial_results, param_getter
+
+
+# Roles of the reference model -> headcount column of the quarterly results
+COLONNES_EFFECTIFS = {'dev': 'Nb_Developpeurs', 'lead': 'Nb_Lead', 'cdp': 'Nb_CDP', 'rh': 'Nb_RH'}
+
+# Attributes of a role and their default values
+ATTRIBUTS_ROLE = {
+    'tjm': 0.0,              # Daily rate (€), 0 for non-billable roles
+    'salaire': 0.0,          # Monthly gross salary (€)
+    'taux_occupation': 0.0,  # Share of billable days actually billed
+    'attrition': 0.0,        # Share of the role's staff leaving each quarter
+    'rampe': (),             # Occupation multipliers of the first quarters after hiring (1 afterwards)
+}
+
+
+def roles_from_params(params):
+    """
+    Role catalogue of the reference model (developers, lead, project manager, HR)
+
+    Args:
+        params (dict or SimulationParams): Simulation parameters
+
+    Returns:
+        dict: Role name -> attributes (see ATTRIBUTS_ROLE)
+    """
+    return {
+        'dev': {'tjm': params['tjm_dev'], 'salaire': params['salaire_dev'],
+                'taux_occupation': params['taux_occupation_dev']},
+        'lead': {'tjm': params['tjm_lead'], 'salaire': params['salaire_lead'],
+                 'taux_occupation': params['taux_occupation_lead']},
+        'cdp': {'tjm': params['tjm_cdp'], 'salaire': params['salaire_cdp'],
+                'taux_occupation': params['taux_occupation_cdp']},
+        'rh': {'salaire': params['salaire_rh']},
+    }
+
+
+def hiring_plan_from_params(params):
+    """
+    Hiring plan of the reference model
+
+    The initial developers are hired at the first quarter and ajout_dev_par_trimestre
+    more at each following quarter; one lead, one project manager and one HR manager
+    are hired at trimestre_ajout_support. Per-quarter developer values follow the
+    reference model, whose quarter t counts effectif_dev_initial + t * ajout_dev_par_trimestre
+    developers: the plan hires (or, when it decreases, removes) the change of this count.
+
+    Args:
+        params (dict or SimulationParams): Simulation parameters, whose staffing values
+            may be arrays of shape (n,), and effectif_dev_initial and ajout_dev_par_trimestre
+            of shape (n, nb_trimestres)
+
+    Returns:
+        numpy.ndarray: Hires of shape (..., 4, nb_trimestres), roles in the order of roles_from_params
+
+    Raises:
+        ValueError: Per-quarter developer values not covering nb_trimestres quarters
+    """
+    nb_trimestres = params['nb_annees'] * 4
+    t = np.arange(nb_trimestres)
+    valeurs = {}
+    for nom in ('effectif_dev_initial', 'ajout_dev_par_trimestre'):
+        valeur = np.asarray(params[nom], dtype=float)
+        if valeur.ndim >= 2 and valeur.shape[-1] != nb_trimestres:
+            raise ValueError(f"'{nom}' par trimestre doit être de forme (n, {nb_trimestres}), pas {valeur.shape}")
+        valeurs[nom] = valeur if valeur.ndim >= 2 else valeur[..., None]
+    trimestre_support = np.maximum(np.asarray(params['trimestre_ajout_support']) - 1, 0)[..., None]
+
+    effectif_dev = valeurs['effectif_dev_initial'] + t * valeurs['ajout_dev_par_trimestre']
+    developpeurs = np.diff(effectif_dev, axis=-1, prepend=0.0)
+    support = (t == trimestre_support).astype(float)
+    return np.stack(np.broadcast_arrays(developpeurs, support, support, support), axis=-2)
+
+
+def _attribut(roles, nom):
+    """Values of one attribute for every role, stacked on the last axis: shape (..., nb_roles)"""
+    valeurs = [np.asarray(role.get(nom, ATTRIBUTS_ROLE[nom]), dtype=float) for role in roles.values()]
+    return np.stack(np.broadcast_arrays(*valeurs), axis=-1)
+
+
+def _attribut_trimestriel(roles, nom):
+    """Values of one attribute for every role, shaped (..., nb_roles, 1) or (..., nb_roles, nb_trimestres)"""
+    valeurs = []
+    for role in roles.values():
+        valeur = np.asarray(role.get(nom, ATTRIBUTS_ROLE[nom]), dtype=float)
+        valeurs.append(valeur[..., None] if valeur.ndim < 2 else valeur)
+    return np.stack(np.broadcast_arrays(*valeurs), axis=-2)
+
+
+def _noyaux(roles, nb_trimestres):
+    """
+    Survival and ramp-up of a cohort by seniority
+
+    Returns:
+        tuple: (survie, rampes), survie of shape (..., nb_roles, nb_trimestres) the share
+            of a cohort still present k quarters after hiring, rampes of shape
+            (nb_roles, nb_trimestres) its occupation multiplier k quarters after hiring
+    """
+    attrition = _attribut(roles, 'attrition')
+    if np.any((attrition < 0) | (attrition > 1)):
+        raise ValueError("Les taux d'attrition doivent être compris entre 0 et 1")
+    survie = (1 - attrition)[..., None] ** np.arange(nb_trimestres)
+
+    rampes = np.ones((len(roles), nb_trimestres))
+    for i, role in enumerate(roles.values()):
+        rampe = np.asarray(role.get('rampe', ATTRIBUTS_ROLE['rampe']), dtype=float)[:nb_trimestres]
+        rampes[i, :len(rampe)] = rampe
+
+    return survie, rampes
+
+
+def _par_cohorte(noyau):
+    """(role x cohort x period) matrix of a seniority kernel: noyau[..., r, t - c] for t >= c, 0 before"""
+    nb_trimestres = noyau.shape[-1]
+    anciennete = np.arange(nb_trimestres)[None, :] - np.arange(nb_trimestres)[:, None]
+    return np.where(anciennete >= 0, noyau[..., np.maximum(anciennete, 0)], 0.0)
+
+
+def _sommer_cohortes(embauches, survie, rampes):
+    """
+    Headcount and billed FTE of every role, summed over the cohorts of a hiring plan
+
+    Kernels shared by all scenarios become (role x cohort x period) matrices and the
+    sums one matrix product per role. Per-scenario attrition rates would need one
+    matrix per scenario: the headcount then follows its quarterly recursion
+    (survivors of the previous quarter plus hires), vectorized over scenarios, and
+    the ramp-up is subtracted for the few quarters it lasts.
+    """
+    if survie.ndim == 2:
+        return (np.einsum('...rc,rct->...rt', embauches, _par_cohorte(survie), optimize=True),
+                np.einsum('...rc,rct->...rt', embauches, _par_cohorte(survie * rampes), optimize=True))
+
+    nb_trimestres = survie.shape[-1]
+    maintien = survie[..., 1] if nb_trimestres > 1 else 1.0
+    effectifs = np.empty(np.broadcast_shapes(embauches.shape, survie.shape))
+    presents = 0.0
+    for t in range(nb_trimestres):
+        presents = presents * maintien + embauches[..., t]
+        effectifs[..., t] = presents
+
+    etp_factures = effectifs.copy()
+    en_rampe = np.nonzero((rampes != 1).any(axis=0))[0]
+    for anciennete in range(en_rampe[-1] + 1 if len(en_rampe) else 0):
+        etp_factures[..., anciennete:] -= ((1 - rampes[:, anciennete:anciennete + 1]) * survie[..., anciennete:anciennete + 1]
+                                           * embauches[..., :nb_trimestres - anciennete])
+    return effectifs, etp_factures
+
+
+def cohort_headcount(embauches, roles):
+    """
+    Headcount of every cohort at every quarter
+
+    Args:
+        embauches (numpy.ndarray): Hires of shape (..., nb_roles, nb_trimestres)
+        roles (dict): Role catalogue (see ATTRIBUTS_ROLE)
+
+    Returns:
+        numpy.ndarray: Headcount of shape (..., nb_roles, nb_cohortes, nb_trimestres)
+    """
+    embauches = np.asarray(embauches, dtype=float)
+    survie, _ = _noyaux(roles, embauches.shape[-1])
+    return embauches[..., None] * _par_cohorte(survie)
+
+
+def simulate_staffing(params, roles=None, embauches=None, overrides=None, fiscalite=None):
+    """
+    Calculates quarterly results with cohort-based staffing
+
+    Revenue and salary costs come from the role catalogue and the hiring plan;
+    fixed costs, SARL transfer, taxes and results use the formulas of
+    calculate_quarterly_results. With the defaults (roles_from_params and
+    hiring_plan_from_params) the results are those of the reference model.
+
+    Role attributes may be scalars, arrays of shape (n,) for a batch of scenarios,
+    or (n, nb_trimestres) for tjm, salaire and taux_occupation; the hiring plan may
+    be shared, of shape (nb_roles, nb_trimestres), or per scenario, of shape
+    (n, nb_roles, nb_trimestres).
+
+    Args:
+        params (dict or SimulationParams): Simulation parameters (fixed costs, margin, taxes)
+        roles (dict, optional): Role name -> attributes (see ATTRIBUTS_ROLE)
+        embauches (numpy.ndarray, optional): Hires per role and quarter
+        overrides (dict, optional): Per-scenario simulation parameters, as for simulate_batch;
+            they also feed the default roles and hiring plan
+        fiscalite (None, str or dict, optional): Corporate tax rules, as for simulate_batch
+
+    Returns:
+        dict: Column name -> array of shape (..., nb_trimestres) for the financial
+            columns and the headcount columns of the reference roles present,
+            'Effectif_Total', 'Effectifs' and 'ETP_Factures' per role of shape
+            (..., nb_roles, nb_trimestres), 'Roles', 'Annee' and 'Trimestre'
+    """
+    params = SimulationParams.from_dict(params)
+    overrides = overrides if overrides is not None else {}
+    if 'nb_annees' in overrides:
+        raise ValueError("'nb_annees' définit l'horizon et ne peut pas varier au sein d'un lot")
+    valeurs = {**params, **overrides}
+    roles = roles_from_params(valeurs) if roles is None else roles
+    embauches = hiring_plan_from_params(valeurs) if embauches is None else np.asarray(embauches, dtype=float)
+
+    inconnus = {attribut for role in roles.values() for attribut in role} - set(ATTRIBUTS_ROLE)
+    if inconnus:
+        raise ValueError(f"Attributs de rôle inconnus: {sorted(inconnus)} (choix: {list(ATTRIBUTS_ROLE)})")
+    nb_trimestres = params.nb_annees * 4
+    if embauches.shape[-2:] != (len(roles), nb_trimestres):
+        raise ValueError(f"Le plan d'embauches doit être de forme (..., {len(roles)}, {nb_trimestres}), "
+                         f"pas {embauches.shape}")
+
+    effectifs, etp_factures = _sommer_cohortes(embauches, *_noyaux(roles, nb_trimestres))
+
+    p = param_getter(params, overrides)
+    jours = p('jours_facturable_mois')
+    jours = jours[..., None, :] if jours.ndim else jours
+    ca_mensuel = (etp_factures * _attribut_trimestriel(roles, 'tjm') * jours
+                  * _attribut_trimestriel(roles, 'taux_occupation')).sum(axis=-2)
+    ca_trimestriel = ca_mensuel * 3
+
+    cout_mensuel_salaires = (effectifs * _attribut_trimestriel(roles, 'salaire')).sum(axis=-2)
+    cout_mensuel_charges = cout_mensuel_salaires * p('taux_charges_patronales')
+    cout_trimestriel_salaires = (cout_mensuel_salaires + cout_mensuel_charges) * 3
+
+    financiers = compute_financial_results(p, params.nb_annees, ca_trimestriel, cout_trimestriel_salaires,
+                                           fiscalite=fiscalite)
+
+    n = np.broadcast_shapes(effectifs.shape[:-2], *(valeur.shape[:-1] for valeur in financiers.values()))
+    resultats = {nom: np.broadcast_to(valeur, n + (nb_trimestres,)) for nom, valeur in financiers.items()}
+    for i, role in enumerate(roles):
+        if role in COLONNES_EFFECTIFS:
+            resultats[COLONNES_EFFECTIFS[role]] = np.broadcast_to(effectifs[..., i, :], n + (nb_trimestres,))
+    resultats['Effectif_Total'] = np.broadcast_to(effectifs.sum(axis=-2), n + (nb_trimestres,))
+    resultats['Effectifs'] = np.broadcast_to(effectifs, n + effectifs.shape[-2:])
+    resultats['ETP_Factures'] = np.broadcast_to(etp_factures, n + etp_factures.shape[-2:])
+    resultats['Roles'] = list(roles)
+    t = np.arange(nb_trimestres)
+    resultats['Annee'] = t // 4 + 1
+    resultats['Trimestre'] = t % 4 + 1
+
+    return resultats
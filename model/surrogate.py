@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+
+"""
+Surrogate model of the headline indicators around a parameter set
+
+Every change of a sidebar widget reruns the simulation and renders its charts.
+A surrogate answers instantly instead: a polynomial of degree 2 of the parameters,
+fitted by least squares to one batch of exact runs (simulate_batch) drawn in a box
+around the current parameters. It predicts the quarterly consolidated net result,
+revenue and headcounts, and the headline indicators are computed from them as
+from exact results (headline_indicators).
+
+The error bound of every indicator is the largest error measured on validation
+runs of the same box. The surrogate only answers inside its box and for the same
+discrete parameters (number of years, quarter of the support roles); elsewhere a
+new one is fitted, in a few tens of milliseconds.
+"""
+
+import time
+
+import numpy as np
+
+from config.parameters import SPECIFICATIONS, SimulationParams
+from model.aggregation import EFFECTIFS, headline_indicators
+from model.batch import simulate_batch
+
+
+# Headline indicators of a simulation
+INDICATEURS_CLES = ['Resultat_Total', 'Taux_Marge_Moyen', 'Effectif_Final', 'Delai_Retour']
+
+# Quarterly columns predicted by the surrogate, enough for the headline indicators
+COLONNES_SUBSTITUT = ['Resultat_Net_Consolide', 'CA_SAS'] + EFFECTIFS
+
+# Parameters that change the shape of the results: the surrogate is fitted for one value of each
+PARAMETRES_DISCRETS = ['nb_annees', 'trimestre_ajout_support']
+
+# Half-width of the fitted box, relative to the parameter value (or to its range when it is zero)
+RAYON_RELATIF = 0.1
+
+# Training runs per polynomial term, and validation runs per training run
+ECHANTILLONS_PAR_TERME = 2
+PART_VALIDATION = 0.5
+
+
+def _ecarts(estimations, exactes):
+    """Absolute errors, 0 when both values are NaN (payback not reached) and inf when only one is"""
+    ecarts = np.abs(estimations - exactes)
+    nan_estimations, nan_exactes = np.isnan(estimations), np.isnan(exactes)
+    return np.where(nan_estimations & nan_exactes, 0.0, np.where(nan_estimations | nan_exactes, np.inf, ecarts))
+
+
+class SurrogateModel:
+    """
+    Polynomial surrogate of the quarterly results over a box of parameters.
+
+    The box spans RAYON_RELATIF of every continuous parameter around the centre,
+    within the bounds of SPECIFICATIONS. The model is fitted at construction, with
+    one batched simulation of its training and validation runs.
+    """
+
+    def __init__(self, params, rayon=RAYON_RELATIF, graine=0):
+        """
+        Fit the surrogate around a parameter set
+
+        Args:
+            params (dict or SimulationParams): Centre of the box
+            rayon (float, optional): Half-width of the box relative to the parameter values
+            graine (int, optional): Seed of the sampled runs
+
+        Raises:
+            ValueError: Invalid parameters
+        """
+        debut = time.perf_counter()
+        self.centre = SimulationParams.from_dict(params)
+        self.noms = [nom for nom in self.centre if nom not in PARAMETRES_DISCRETS]
+
+        bornes = []
+        for nom in self.noms:
+            valeur = self.centre[nom]
+            minimum, maximum, _ = SPECIFICATIONS.get(nom, (0, None, False))
+            demi_largeur = rayon * abs(valeur) if valeur else rayon * ((maximum - minimum) if maximum is not None else 1.0)
+            bornes.append((max(valeur - demi_largeur, minimum),
+                           valeur + demi_largeur if maximum is None else min(valeur + demi_largeur, maximum)))
+        self.bornes = dict(zip(self.noms, bornes))
+        self._bas, self._haut = np.array(bornes).T
+
+        nb_termes = len(self._monomes(np.zeros((1, len(self.noms))))[0])
+        nb_entrainement = ECHANTILLONS_PAR_TERME * nb_termes
+        nb_validation = int(PART_VALIDATION * nb_entrainement)
+        echantillons = np.random.default_rng(graine).uniform(
+            self._bas, self._haut, (nb_entrainement + nb_validation, len(self.noms)))
+        resultats = simulate_batch(self.centre, dict(zip(self.noms, echantillons.T)), colonnes=COLONNES_SUBSTITUT)
+        sorties = np.concatenate([resultats[colonne] for colonne in COLONNES_SUBSTITUT], axis=1)
+
+        X = self._monomes(self._normaliser(echantillons))
+        self._coefficients = np.linalg.lstsq(X[:nb_entrainement], sorties[:nb_entrainement], rcond=None)[0]
+
+        estimations = headline_indicators(self._colonnes(X[nb_entrainement:] @ self._coefficients))
+        exactes = headline_indicators({colonne: valeur[nb_entrainement:] for colonne, valeur in resultats.items()})
+        self.erreurs = {indicateur: float(np.max(_ecarts(estimations[indicateur], exactes[indicateur])))
+                        for indicateur in INDICATEURS_CLES}
+
+        self.nb_simulations = len(echantillons)
+        self.duree_ajustement = time.perf_counter() - debut
+
+    def _normaliser(self, valeurs):
+        """Coordinates of parameter values in the box, between -1 and 1"""
+        return (2 * valeurs - self._bas - self._haut) / np.maximum(self._haut - self._bas, 1e-12)
+
+    @staticmethod
+    def _monomes(z):
+        """Monomials of degree 0, 1 and 2 of normalized coordinates of shape (n, nb_parametres)"""
+        i, j = np.triu_indices(z.shape[1])
+        return np.concatenate([np.ones((len(z), 1)), z, z[:, i] * z[:, j]], axis=1)
+
+    def _colonnes(self, sorties):
+        """Predicted outputs of shape (n, nb_colonnes * nb_trimestres) split into quarterly columns"""
+        return dict(zip(COLONNES_SUBSTITUT, np.split(sorties, len(COLONNES_SUBSTITUT), axis=-1)))
+
+    def couvre(self, params):
+        """
+        True when the surrogate can answer for a parameter set: same discrete parameters
+        and every other parameter inside the box
+
+        Args:
+            params (dict or SimulationParams): Parameter set
+
+        Returns:
+            bool: The parameters are covered
+        """
+        if any(params.get(nom) != self.centre[nom] for nom in PARAMETRES_DISCRETS):
+            return False
+        if any(nom not in params for nom in self.noms):
+            return False
+        return all(bas <= params[nom] <= haut for nom, (bas, haut) in self.bornes.items())
+
+    def predire(self, params):
+        """
+        Estimated headline indicators of a parameter set
+
+        Args:
+            params (dict or SimulationParams): Parameter set covered by the surrogate (see couvre)
+
+        Returns:
+            dict: Indicator name (INDICATEURS_CLES) -> estimated value
+
+        Raises:
+            ValueError: Parameters outside the fitted box
+        """
+        if not self.couvre(params):
+            raise ValueError("Paramètres hors du domaine du modèle approché, un nouvel ajustement est nécessaire")
+        z = self._normaliser(np.array([[params[nom] for nom in self.noms]], dtype=float))
+        indicateurs = headline_indicators(self._colonnes(self._monomes(z) @ self._coefficients))
+        return {indicateur: float(valeur[0]) for indicateur, valeur in indicateurs.items()}
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+
+"""
+Annual corporate tax rules: loss carry-forward, reduced-rate brackets and minimum tax
+
+By default the model taxes every quarter at the flat rate of its country, losses
+included, so that a loss gives a negative tax. A tax rule assesses the tax on the
+annual result instead. Past losses are carried forward onto later profits, within
+a yearly cap and a number of years. Reduced rates apply to the first brackets of
+profit, and a minimum tax may be due on the turnover.
+
+Carry-forward makes the tax of a year depend on every year before it. Without cap
+or expiry, the profit taxed up to a year is the running maximum of the cumulative
+result: one np.maximum.accumulate over the years. Otherwise the losses carried
+forward are scanned year by year, each step vectorized over the scenarios of the
+batch. No state is kept per quarter or per scenario in Python, so batched and
+Monte Carlo runs keep their speed.
+
+The annual tax is booked in the quarters at the effective rate of the year, the
+tax of the year divided by its result. The part of a minimum tax above the normal
+rate is spread evenly over the four quarters.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+from config.parameters import DEFAULT_TAX_RULES
+
+
+# Country -> parameter of its normal corporate tax rate
+PAYS = {'france': 'taux_is_france', 'senegal': 'taux_is_senegal'}
+
+# Attributes of an annual tax rule and their default values
+ATTRIBUTS_REGLE = {
+    'taux': None,                  # Normal rate, the parameter of the country (PAYS) by default
+    'tranches': (),                # Reduced-rate brackets: (annual profit ceiling, rate), ascending
+    'report_deficits': True,       # Losses are carried forward onto later profits
+    'plafond_report': None,        # Annual profit fully offsettable by past losses (None: no cap)
+    'part_au_dela_plafond': 1.0,   # Share of the profit above the cap still offsettable
+    'duree_report': None,          # Years a loss can be carried forward (None: no limit)
+    'minimum_forfaitaire': 0.0,    # Minimum annual tax (€)
+    'taux_minimum': 0.0,           # Minimum annual tax as a share of the annual turnover
+    'plafond_minimum': None,       # Ceiling of the minimum tax (None: no ceiling)
+}
+
+
+def normalize_tax_rule(regle, pays):
+    """
+    Checks a tax rule and fills in its defaults
+
+    Args:
+        regle (None, str or dict): None or 'lineaire' for the flat rate of every quarter,
+            'reelle' for the rule of the country in DEFAULT_TAX_RULES, or attributes of
+            ATTRIBUTS_REGLE
+        pays (str): Country of the rule (key of PAYS)
+
+    Returns:
+        dict or None: Rule with all its attributes, None for the flat rate
+
+    Raises:
+        ValueError: Unknown rule or attribute, or values out of range
+    """
+    if regle is None or regle == 'lineaire':
+        return None
+    if regle == 'reelle':
+        regle = DEFAULT_TAX_RULES[pays]
+    if not isinstance(regle, Mapping):
+        raise ValueError(f"Règle fiscale inconnue pour {pays}: {regle!r} ('lineaire', 'reelle' ou dictionnaire)")
+    inconnus = set(regle) - set(ATTRIBUTS_REGLE)
+    if inconnus:
+        raise ValueError(f"Attributs de règle fiscale inconnus: {sorted(inconnus)} (choix: {list(ATTRIBUTS_REGLE)})")
+    regle = {**ATTRIBUTS_REGLE, **regle}
+
+    tranches = tuple((float(plafond), float(taux)) for plafond, taux in regle['tranches'])
+    plafonds = [plafond for plafond, _ in tranches]
+    if any(plafond <= 0 for plafond in plafonds) or any(a >= b for a, b in zip(plafonds, plafonds[1:])):
+        raise ValueError(f"Les plafonds des tranches de {pays} doivent être positifs et croissants: {plafonds}")
+    taux = {'taux': regle['taux'], 'part_au_dela_plafond': regle['part_au_dela_plafond'],
+            'taux_minimum': regle['taux_minimum'], **{f'tranches[{i}]': t for i, (_, t) in enumerate(tranches)}}
+    for nom, valeur in taux.items():
+        if valeur is not None and not 0 <= valeur <= 1:
+            raise ValueError(f"'{nom}' de la règle fiscale de {pays} doit être compris entre 0 et 1 ({valeur})")
+    for nom in ('plafond_report', 'minimum_forfaitaire', 'plafond_minimum'):
+        if regle[nom] is not None and regle[nom] < 0:
+            raise ValueError(f"'{nom}' de la règle fiscale de {pays} doit être positif ({regle[nom]})")
+    if regle['duree_report'] is not None and (regle['duree_report'] < 1 or regle['duree_report'] != int(regle['duree_report'])):
+        raise ValueError(f"'duree_report' de la règle fiscale de {pays} doit être un nombre entier d'années "
+                         f"({regle['duree_report']})")
+
+    def reel(valeur):
+        return None if valeur is None else float(valeur)
+
+    return {
+        'taux': reel(regle['taux']),
+        'tranches': tranches,
+        'report_deficits': bool(regle['report_deficits']),
+        'plafond_report': reel(regle['plafond_report']),
+        'part_au_dela_plafond': float(regle['part_au_dela_plafond']),
+        'duree_report': None if regle['duree_report'] is None else int(regle['duree_report']),
+        'minimum_forfaitaire': float(regle['minimum_forfaitaire']),
+        'taux_minimum': float(regle['taux_minimum']),
+        'plafond_minimum': reel(regle['plafond_minimum']),
+    }
+
+
+def normalize_tax_regime(fiscalite):
+    """
+    Tax rules of both countries
+
+    Args:
+        fiscalite (None, str or dict): None or 'lineaire' for the flat rates of every quarter
+            (the historical behaviour of the model), 'reelle' for DEFAULT_TAX_RULES, or
+            country -> rule (see normalize_tax_rule), the countries not given keeping the flat rate
+
+    Returns:
+        dict: Country -> normalized rule, None for the flat rate
+
+    Raises:
+        ValueError: Unknown country or invalid rule
+    """
+    if fiscalite is None or isinstance(fiscalite, str):
+        return {pays: normalize_tax_rule(fiscalite, pays) for pays in PAYS}
+    inconnus = set(fiscalite) - set(PAYS)
+    if inconnus:
+        raise ValueError(f"Pays inconnus: {sorted(inconnus)} (pays: {list(PAYS)})")
+    return {pays: normalize_tax_rule(fiscalite.get(pays), pays) for pays in PAYS}
+
+
+def taxable_profit(resultats, regle):
+    """
+    Annual taxable profits after the deduction of the losses carried forward
+
+    The oldest losses are deducted first. A loss is lost once its carry-forward
+    period is over.
+
+    Args:
+        resultats (numpy.ndarray): Annual results before tax of shape (..., nb_annees)
+        regle (dict): Tax rule (see normalize_tax_rule)
+
+    Returns:
+        numpy.ndarray: Taxable profits, non-negative, of the same shape
+    """
+    if not regle['report_deficits']:
+        return np.maximum(resultats, 0.0)
+    if regle['plafond_report'] is None and regle['duree_report'] is None:
+        # Without cap or expiry, the profit taxed up to a year is the running maximum of the cumulative result
+        imposes = np.maximum.accumulate(np.maximum(np.cumsum(resultats, axis=-1), 0.0), axis=-1)
+        return np.diff(imposes, axis=-1, prepend=0.0)
+
+    # Losses still to carry forward, by year of origin
+    stock = np.zeros(resultats.shape)
+    imposables = np.empty(resultats.shape)
+    duree = regle['duree_report']
+    for annee in range(resultats.shape[-1]):
+        if duree is not None and annee > duree:
+            stock[..., annee - duree - 1] = 0.0
+        benefice = np.maximum(resultats[..., annee], 0.0)
+        imputable = benefice
+        if regle['plafond_report'] is not None:
+            imputable = np.minimum(benefice, regle['plafond_report'] + regle['part_au_dela_plafond']
+                                   * np.maximum(benefice - regle['plafond_report'], 0.0))
+        imposables[..., annee] = benefice
+        if annee:
+            anciens = stock[..., :annee]
+            cumul = np.cumsum(anciens, axis=-1)
+            imputation = np.minimum(imputable, cumul[..., -1])
+            anciens -= np.clip(imputation[..., None] - (cumul - anciens), 0.0, anciens)
+            imposables[..., annee] -= imputation
+        stock[..., annee] = np.maximum(-resultats[..., annee], 0.0)
+    return imposables
+
+
+def annual_tax(benefices, chiffre_affaires, taux, regle):
+    """
+    Annual tax on taxable profits: reduced-rate brackets, normal rate and minimum tax
+
+    Args:
+        benefices (numpy.ndarray): Taxable profits of shape (..., nb_annees)
+        chiffre_affaires (numpy.ndarray): Annual turnover, base of the minimum tax
+        taux (numpy.ndarray): Normal rate of every year, used when the rule has none
+        regle (dict): Tax rule (see normalize_tax_rule)
+
+    Returns:
+        numpy.ndarray: Annual tax of shape (..., nb_annees)
+    """
+    taux = taux if regle['taux'] is None else regle['taux']
+    impot, plancher = 0.0, 0.0
+    for plafond, taux_reduit in regle['tranches']:
+        impot = impot + taux_reduit * np.clip(benefices - plancher, 0.0, plafond - plancher)
+        plancher = plafond
+    impot = impot + taux * np.maximum(benefices - plancher, 0.0)
+
+    minimum = np.maximum(regle['minimum_forfaitaire'], regle['taux_minimum'] * chiffre_affaires)
+    if regle['plafond_minimum'] is not None:
+        minimum = np.minimum(minimum, regle['plafond_minimum'])
+    return np.maximum(impot, minimum)
+
+
+def _sommer_trimestres(valeurs):
+    """Sums of shape (..., nb_annees) of values of shape (..., nb_annees, 4), in float64"""
+    valeurs = valeurs.astype(np.float64, copy=False)
+    return valeurs[..., 0] + valeurs[..., 1] + valeurs[..., 2] + valeurs[..., 3]
+
+
+def corporate_tax(resultats, chiffre_affaires, taux, regle):
+    """
+    Quarterly corporate tax of a company
+
+    Under a tax rule, the rate of a year is the mean of its quarterly rates.
+
+    Args:
+        resultats (numpy.ndarray): Quarterly results before tax of shape (..., nb_trimestres)
+        chiffre_affaires (numpy.ndarray): Quarterly turnover, base of the minimum tax
+        taux (float or numpy.ndarray): Normal rate, broadcastable to the results
+        regle (dict or None): Tax rule (see normalize_tax_rule), None for the flat rate
+            of every quarter
+
+    Returns:
+        numpy.ndarray: Quarterly tax, negative for a loss under the flat rate
+    """
+    if regle is None:
+        return resultats * taux
+
+    forme = np.broadcast_shapes(np.shape(resultats), np.shape(chiffre_affaires), np.shape(taux))
+    trimestriels = np.broadcast_to(resultats, forme).reshape(forme[:-1] + (-1, 4))
+    annuels = _sommer_trimestres(trimestriels)
+    if np.shape(taux)[-1:] in ((), (1,)):
+        taux_annuels = taux
+    else:
+        taux_annuels = _sommer_trimestres(np.broadcast_to(taux, forme).reshape(trimestriels.shape)) / 4
+    chiffre_affaires_annuel = 0.0
+    if regle['taux_minimum']:
+        chiffre_affaires_annuel = _sommer_trimestres(np.broadcast_to(chiffre_affaires, forme).reshape(trimestriels.shape))
+    impot = annual_tax(taxable_profit(annuels, regle), chiffre_affaires_annuel, taux_annuels, regle)
+
+    # Effective rate of the year, at most the highest rate of the rule, applied to the
+    # result of every quarter; what remains (a minimum tax) is spread evenly
+    taux_maximal = np.maximum(taux_annuels if regle['taux'] is None else regle['taux'],
+                              max((t for _, t in regle['tranches']), default=0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        taux_effectif = np.where(annuels > 0, np.minimum(impot / annuels, taux_maximal), 0.0)
+    reste = impot - taux_effectif * annuels
+    impots = taux_effectif[..., None] * trimestriels + reste[..., None] / 4
+    return impots.reshape(forme).astype(np.result_type(resultats), copy=False)
+
+
+def compute_tax_results(ca_trimestriel, transfert_sarl, marge_securite, p, fiscalite=None):
+    """
+    Taxes and net results of the SARL, of the SAS and consolidated
+
+    The SARL's result before tax is its safety margin and its turnover the transfer
+    it invoices; the SAS's result before tax is its revenue minus that transfer.
+
+    Args:
+        ca_trimestriel (numpy.ndarray): Quarterly revenue of the SAS of shape (..., nb_trimestres)
+        transfert_sarl (numpy.ndarray): Quarterly transfer to the SARL
+        marge_securite (numpy.ndarray): Quarterly safety margin of the SARL
+        p (callable): Parameter accessor (see model.batch.param_getter)
+        fiscalite (None, str or dict, optional): Tax rules (see normalize_tax_regime)
+
+    Returns:
+        dict: Column name -> array, for the columns from 'IS_Senegal' to 'Ratio_SAS_SARL'
+    """
+    regime = normalize_tax_regime(fiscalite)
+
+    is_senegal = corporate_tax(marge_securite, transfert_sarl, p('taux_is_senegal'), regime['senegal'])
+    resultat_net_sarl = marge_securite - is_senegal
+
+
+    resultat_avant_is_sas = ca_trimestriel - transfert_sarl
+    is_france = corporate_tax(resultat_avant_is_sas, ca_trimestriel, p('taux_is_france'), regime['france'])
+    resultat_net_sas = resultat_avant_is_sas - is_france
+
+
+    resultat_net_consolide = resultat_net_sarl + resultat_net_sas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        taux_marge_nette = np.where(ca_trimestriel > 0, resultat_net_consolide / ca_trimestriel, 0.0)
+        ratio_sas_sarl = np.where(resultat_net_sarl > 0, resultat_net_sas / resultat_net_sarl, np.inf)
+
+    return {
+        'IS_Senegal': is_senegal, 'Resultat_Net_SARL': resultat_net_sarl,
+        'IS_France': is_france, 'Resultat_Net_SAS': resultat_net_sas,
+        'Resultat_Net_Consolide': resultat_net_consolide,
+        'Taux_Marge_Nette': taux_marge_nette, 'Ratio_SAS_SARL': ratio_sas_sarl,
+    }
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+
+"""
+Monthly cash-flow and treasury simulation of the SAS and the SARL, with payment delays
+
+The layer works on quarterly results of shape (..., nb_trimestres), one scenario or
+a whole batch from simulate_batch. Payment delays may differ per scenario: flows are
+shifted by slicing, or by gathering the delayed months for per-scenario delays,
+without any Python loop over months or scenarios. Flows identical for every scenario
+of a batch are scheduled once and broadcast.
+"""
+
+import numpy as np
+
+from config.parameters import DEFAULT_TREASURY_PARAMS
+from model.aggregation import payback_period
+
+
+JOURS_PAR_MOIS = 30
+
+
+def _mensualiser(valeur):
+    """Spreads quarterly flows evenly over their three months"""
+    valeur = np.asarray(valeur, dtype=float)
+    if valeur.ndim > 1 and valeur.strides[0] == 0:
+        # Flows identical for every scenario of a batch are scheduled only once
+        valeur = valeur[:1]
+    return np.repeat(valeur / 3, 3, axis=-1)
+
+
+def _decaler_entier(flux, mois):
+    """Delays monthly flows by a whole number of months"""
+    if mois == 0:
+        return flux
+    decale = np.zeros(flux.shape)
+    if mois < flux.shape[-1]:
+        decale[..., mois:] = flux[..., :-mois]
+    return decale
+
+
+def _decaler(flux, delai_mois):
+    """
+    Delays monthly flows by a (possibly fractional, possibly per-scenario) number of months
+
+    A flow spread evenly over its month and paid delai_mois = k + f months later
+    falls for a share 1 - f in month m + k and f in month m + k + 1. Amounts falling
+    after the horizon are not paid within it.
+
+    Args:
+        flux (numpy.ndarray): Monthly flows of shape (..., nb_mois)
+        delai_mois (float or numpy.ndarray): Non-negative delay, scalar or of shape (...)
+
+    Returns:
+        numpy.ndarray: Delayed monthly flows of shape (..., nb_mois)
+    """
+    delai_mois = np.asarray(delai_mois, dtype=float)
+    if np.any(delai_mois < 0):
+        raise ValueError("Les délais de paiement doivent être positifs ou nuls")
+    entier = np.floor(delai_mois)
+    fraction = delai_mois - entier
+
+    if delai_mois.ndim == 0:
+        decale = _decaler_entier(flux, int(entier))
+        if fraction:
+            decale = (1 - fraction) * decale + fraction * _decaler_entier(flux, int(entier) + 1)
+        return decale
+
+    # Per-scenario delays: gather the delayed months, index 0 of the padded flows being zero
+    nb_mois = flux.shape[-1]
+    forme = np.broadcast_shapes(flux.shape[:-1], delai_mois.shape) + (nb_mois,)
+    complete = np.broadcast_to(np.concatenate([np.zeros(flux.shape[:-1] + (1,)), flux], axis=-1),
+                               forme[:-1] + (nb_mois + 1,))
+    source = np.arange(nb_mois) - entier[..., None].astype(int)
+
+    def flux_a(indice):
+        return np.take_along_axis(complete, np.broadcast_to(np.maximum(indice + 1, 0), forme), axis=-1)
+
+    fraction = fraction[..., None]
+    return (1 - fraction) * flux_a(source) + fraction * flux_a(source - 1)
+
+
+def _impot_annuel(impot_trimestriel):
+    """Monthly schedule of a tax due in full at the end of each fiscal year (credits are not refunded)"""
+    impot = np.asarray(impot_trimestriel, dtype=float)
+    if impot.ndim > 1 and impot.strides[0] == 0:
+        impot = impot[:1]
+    annuel = np.maximum(impot.reshape(impot.shape[:-1] + (-1, 4)).sum(axis=-1), 0.0)
+    mensuel = np.zeros(impot.shape[:-1] + (impot.shape[-1] * 3,))
+    mensuel[..., 11::12] = annuel
+    return mensuel
+
+
+def simulate_treasury(resultats, params_tresorerie=None):
+    """
+    Simulates the monthly cash position of the SAS and the SARL
+
+    The SAS cashes its revenue after the client payment delay, and pays the SARL
+    transfer and its corporate tax. The SARL cashes the transfer, and pays salaries,
+    fixed costs and its corporate tax. Corporate taxes are paid once a year, a number
+    of months after the fiscal year end. With zero delays the cumulative cash flows
+    equal the cumulative net results (when no year is loss-making).
+
+    Args:
+        resultats (pandas.DataFrame or dict): Quarterly results of one scenario, or
+            dict of arrays of shape (..., nb_trimestres) from simulate_batch
+        params_tresorerie (dict, optional): Values overriding DEFAULT_TREASURY_PARAMS,
+            scalars or arrays of shape (n,) for a batch
+
+    Returns:
+        dict: Monthly arrays of shape (..., nb_mois): 'Encaissements_SAS',
+            'Decaissements_SAS', 'Tresorerie_SAS', 'Encaissements_SARL',
+            'Decaissements_SARL', 'Tresorerie_SARL' and 'Tresorerie_Consolidee';
+            'Mois' of shape (nb_mois,); and per scenario 'Tresorerie_Min_SAS',
+            'Tresorerie_Min_SARL', 'Tresorerie_Min_Consolidee', 'Besoin_Financement'
+            (cash to bring into each entity so that it never goes negative) and
+            'Mois_Point_Mort_Tresorerie' (months until the consolidated cash position
+            is durably back above its initial level, NaN if never)
+    """
+    params = {**DEFAULT_TREASURY_PARAMS, **(params_tresorerie or {})}
+    inconnus = set(params) - set(DEFAULT_TREASURY_PARAMS)
+    if inconnus:
+        raise ValueError(f"Paramètres de trésorerie inconnus: {sorted(inconnus)}")
+
+    def delai(nom):
+        return np.asarray(params[nom], dtype=float) / JOURS_PAR_MOIS
+
+    transfert = _mensualiser(resultats['Transfert_SARL'])
+    transfert_paye = _decaler(transfert, delai('delai_paiement_sarl_jours'))
+    impots_mois = np.asarray(params['delai_paiement_impots_mois'], dtype=float)
+
+    encaissements_sas = _decaler(_mensualiser(resultats['CA_SAS']), delai('delai_paiement_clients_jours'))
+    decaissements_sas = transfert_paye + _decaler(_impot_annuel(resultats['IS_France']), impots_mois)
+
+    encaissements_sarl = transfert_paye
+    decaissements_sarl = (_decaler(_mensualiser(resultats['Cout_Salaires']), delai('delai_paiement_salaires_jours'))
+                          + _decaler(_mensualiser(resultats['Frais_Fixes']), delai('delai_paiement_fournisseurs_jours'))
+                          + _decaler(_impot_annuel(resultats['IS_Senegal']), impots_mois))
+
+    flux_sas = encaissements_sas - decaissements_sas
+    flux_sarl = encaissements_sarl - decaissements_sarl
+    initiale_sas = np.asarray(params['tresorerie_initiale_sas'], dtype=float)[..., None]
+    initiale_sarl = np.asarray(params['tresorerie_initiale_sarl'], dtype=float)[..., None]
+    tresorerie_sas = initiale_sas + np.cumsum(flux_sas, axis=-1)
+    tresorerie_sarl = initiale_sarl + np.cumsum(flux_sarl, axis=-1)
+    tresorerie_consolidee = tresorerie_sas + tresorerie_sarl
+
+    minimum_sas = np.minimum(tresorerie_sas.min(axis=-1), initiale_sas[..., 0])
+    minimum_sarl = np.minimum(tresorerie_sarl.min(axis=-1), initiale_sarl[..., 0])
+
+    return {
+        'Mois': np.arange(1, flux_sas.shape[-1] + 1),
+        'Encaissements_SAS': encaissements_sas,
+        'Decaissements_SAS': decaissements_sas,
+        'Tresorerie_SAS': tresorerie_sas,
+        'Encaissements_SARL': encaissements_sarl,
+        'Decaissements_SARL': decaissements_sarl,
+        'Tresorerie_SARL': tresorerie_sarl,
+        'Tresorerie_Consolidee': tresorerie_consolidee,
+        'Tresorerie_Min_SAS': minimum_sas,
+        'Tresorerie_Min_SARL': minimum_sarl,
+        'Tresorerie_Min_Consolidee': np.minimum(tresorerie_consolidee.min(axis=-1), (initiale_sas + initiale_sarl)[..., 0]),
+        'Besoin_Financement': np.maximum(-minimum_sas, 0.0) + np.maximum(-minimum_sarl, 0.0),
+        'Mois_Point_Mort_Tresorerie': payback_period({'Flux': flux_sas + flux_sarl}, 'Flux'),
+    }
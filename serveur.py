@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+
+"""
+Start the Streamlit application with the readiness and metrics monitoring of its process
+
+The monitoring starts before the first session, so that the status file and the
+/pret and /metriques endpoints are available as soon as the container starts. The
+warm-up (utils/warmup.py) runs alongside the start of Streamlit, and the process is
+only reported ready once it is done.
+Options are passed to 'streamlit run', for example:
+python serveur.py --server.port=8501 --server.address=0.0.0.0
+"""
+
+import os
+import sys
+
+from streamlit.web import cli as stcli
+
+from utils.monitoring import demarrer_surveillance, surveillance
+from utils.warmup import prechauffer_en_arriere_plan
+
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def main():
+    prechauffer_en_arriere_plan(surveillance)
+    demarrer_surveillance()
+    sys.argv = ['streamlit', 'run', APP] + sys.argv[1:]
+    sys.exit(stcli.main())
+
+
+if __name__ == '__main__':
+    main()
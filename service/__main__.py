@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+
+"""
+Start the local simulation service: python -m service [--port 8765]
+"""
+
+import argparse
+import asyncio
+
+from service.server import ServiceSimulation
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m service', description="Service HTTP local de simulation")
+    parser.add_argument('--hote', default='127.0.0.1', help="Adresse d'écoute (locale par défaut)")
+    parser.add_argument('--port', type=int, default=8765, help="Port d'écoute")
+    parser.add_argument('--fenetre-ms', type=float, default=2.0,
+                        help="Fenêtre de regroupement des requêtes concurrentes (ms)")
+    parser.add_argument('--lot-max', type=int, default=512, help="Requêtes par évaluation vectorisée au plus")
+    parser.add_argument('--attente-max', type=int, default=4096,
+                        help="Requêtes en attente au plus avant de répondre 503")
+    parser.add_argument('--workers', type=int, default=2, help="Threads du pool de calcul")
+    args = parser.parse_args()
+
+    service = ServiceSimulation(args.hote, args.port, args.fenetre_ms / 1000, args.lot_max, args.attente_max,
+                                args.workers)
+
+    async def servir():
+        port = await service.demarrer()
+        print(f"Service de simulation à l'écoute sur http://{args.hote}:{port}")
+        try:
+            await service.servir()
+        finally:
+            await service.arreter()
+
+    try:
+        asyncio.run(servir())
+    except KeyboardInterrupt:
+        print("Service arrêté")
+
+
+if __name__ == '__main__':
+    main()
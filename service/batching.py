@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+
+"""
+Micro-batching of concurrent requests into single vectorized evaluations
+"""
+
+import asyncio
+
+
+class Surcharge(Exception):
+    """Raised when the number of pending requests reaches the backpressure limit"""
+
+
+class MicroBatcher:
+    """
+    Groups the items submitted within a short window into one call of a batch function.
+
+    Items are grouped by key (for instance the simulation horizon, which cannot vary
+    within a batch). A group is evaluated when its window expires or as soon as it
+    holds taille_max items, in a worker pool so that the event loop keeps accepting
+    requests meanwhile. Submissions beyond attente_max pending items (queued or being
+    evaluated) are refused with Surcharge instead of queueing without bound.
+    """
+
+    def __init__(self, traiter_lot, fenetre=0.002, taille_max=512, attente_max=4096, executeur=None):
+        """
+        Args:
+            traiter_lot (callable): (key, items) -> list of results (one per item, an
+                Exception instance for a failed item), called in the worker pool
+            fenetre (float, optional): Collection window of a group (seconds)
+            taille_max (int, optional): Items per evaluation at most
+            attente_max (int, optional): Pending items at most
+            executeur (concurrent.futures.Executor, optional): Worker pool, the event
+                loop's default executor by default
+        """
+        self.traiter_lot = traiter_lot
+        self.fenetre = fenetre
+        self.taille_max = taille_max
+        self.attente_max = attente_max
+        self.executeur = executeur
+
+        self.en_attente = 0
+        self.nb_lots = 0
+        self.nb_elements = 0
+        self._groupes = {}
+        self._minuteries = {}
+
+    async def soumettre(self, cle, element):
+        """
+        Submit an item and wait for its result
+
+        Raises:
+            Surcharge: When attente_max items are already pending
+        """
+        if self.en_attente >= self.attente_max:
+            raise Surcharge(f"{self.en_attente} requêtes en attente")
+
+        boucle = asyncio.get_running_loop()
+        futur = boucle.create_future()
+        self.en_attente += 1
+        groupe = self._groupes.setdefault(cle, [])
+        groupe.append((element, futur))
+
+        if len(groupe) >= self.taille_max:
+            self._lancer(cle)
+        elif cle not in self._minuteries:
+            self._minuteries[cle] = boucle.call_later(self.fenetre, self._lancer, cle)
+
+        try:
+            return await futur
+        finally:
+            self.en_attente -= 1
+
+    def _lancer(self, cle):
+        """Detach the group of a key and evaluate it in the background"""
+        minuterie = self._minuteries.pop(cle, None)
+        if minuterie is not None:
+            minuterie.cancel()
+        groupe = self._groupes.pop(cle, None)
+        if groupe:
+            asyncio.ensure_future(self._evaluer(cle, groupe))
+
+    async def _evaluer(self, cle, groupe):
+        """Evaluate one group in the worker pool and resolve the futures of its items"""
+        self.nb_lots += 1
+        self.nb_elements += len(groupe)
+        try:
+            resultats = await asyncio.get_running_loop().run_in_executor(
+                self.executeur, self.traiter_lot, cle, [element for element, _ in groupe])
+        except Exception as e:
+            resultats = [e] * len(groupe)
+
+        for (_, futur), resultat in zip(groupe, resultats):
+            if futur.done():
+                continue
+            if isinstance(resultat, Exception):
+                futur.set_exception(resultat)
+            else:
+                futur.set_result(resultat)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+
+"""
+Minimal HTTP/1.1 layer over asyncio streams: JSON requests and responses with keep-alive
+"""
+
+import asyncio
+import json
+import math
+
+import numpy as np
+
+
+# Largest accepted request body (bytes)
+TAILLE_CORPS_MAX = 1024 ** 2
+
+MESSAGES_STATUTS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+
+class ErreurHTTP(Exception):
+    """Error answered to the client with an HTTP status and a JSON message"""
+
+    def __init__(self, statut, message, entetes=None):
+        super().__init__(message)
+        self.statut = statut
+        self.message = message
+        self.entetes = entetes or {}
+
+
+class Requete:
+    """Parsed HTTP request"""
+
+    __slots__ = ('methode', 'chemin', 'entetes', 'corps', 'garder_connexion')
+
+    def __init__(self, methode, chemin, entetes, corps, garder_connexion):
+        self.methode = methode
+        self.chemin = chemin
+        self.entetes = entetes
+        self.corps = corps
+        self.garder_connexion = garder_connexion
+
+    def json(self):
+        """Decoded JSON object of the body (an empty object when there is no body)"""
+        if not self.corps:
+            return {}
+        try:
+            corps = json.loads(self.corps)
+        except ValueError as e:
+            raise ErreurHTTP(400, f"Corps JSON invalide: {e}")
+        if not isinstance(corps, dict):
+            raise ErreurHTTP(400, f"Le corps JSON doit être un objet, pas {type(corps).__name__}")
+        return corps
+
+
+async def _lire_ligne(lecteur):
+    """Read one line of the request head, longer lines than the stream limit being a client error"""
+    try:
+        return await lecteur.readline()
+    except (asyncio.LimitOverrunError, ValueError):
+        raise ErreurHTTP(400, "Ligne de requête ou d'en-tête trop longue")
+
+
+async def lire_requete(lecteur):
+    """
+    Read one request from a connection
+
+    Returns:
+        Requete: The request, or None when the client closed the connection
+
+    Raises:
+        ErreurHTTP: Malformed request line or headers, or body too large
+    """
+    ligne = await _lire_ligne(lecteur)
+    if not ligne.strip():
+        return None
+    try:
+        methode, cible, version = ligne.decode('latin-1').split()
+    except ValueError:
+        raise ErreurHTTP(400, "Ligne de requête invalide")
+
+    entetes = {}
+    while True:
+        ligne = await _lire_ligne(lecteur)
+        if ligne in (b'\r\n', b'\n', b''):
+            break
+        nom, _, valeur = ligne.decode('latin-1').partition(':')
+        entetes[nom.strip().lower()] = valeur.strip()
+
+    longueur = entetes.get('content-length') or '0'
+    if not longueur.isdecimal():
+        raise ErreurHTTP(400, f"En-tête Content-Length invalide: {longueur!r}")
+    longueur = int(longueur)
+    if longueur > TAILLE_CORPS_MAX:
+        raise ErreurHTTP(413, f"Corps de requête limité à {TAILLE_CORPS_MAX} octets")
+    corps = await lecteur.readexactly(longueur) if longueur else b''
+
+    connexion = entetes.get('connection', '').lower()
+    garder_connexion = connexion != 'close' if version == 'HTTP/1.1' else connexion == 'keep-alive'
+    return Requete(methode.upper(), cible.split('?', 1)[0], entetes, corps, garder_connexion)
+
+
+def _json_compatible(valeur):
+    """Converts numpy values for JSON; non-finite floats become null"""
+    if isinstance(valeur, np.ndarray):
+        if valeur.dtype.kind == 'f' and not np.isfinite(valeur).all():
+            return [_json_compatible(v) for v in valeur.tolist()]
+        return valeur.tolist()
+    if isinstance(valeur, (np.floating, float)):
+        return float(valeur) if math.isfinite(valeur) else None
+    if isinstance(valeur, np.integer):
+        return int(valeur)
+    if isinstance(valeur, np.bool_):
+        return bool(valeur)
+    if isinstance(valeur, dict):
+        return {cle: _json_compatible(v) for cle, v in valeur.items()}
+    if isinstance(valeur, (list, tuple)):
+        return [_json_compatible(v) for v in valeur]
+    return valeur
+
+
+def reponse_json(statut, donnees, garder_connexion=True, entetes=None):
+    """
+    Encoded HTTP response with a JSON body
+
+    Returns:
+        bytes: Status line, headers and body
+    """
+    corps = json.dumps(_json_compatible(donnees), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    lignes = [
+        f"HTTP/1.1 {statut} {MESSAGES_STATUTS.get(statut, '')}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(corps)}",
+        f"Connection: {'keep-alive' if garder_connexion else 'close'}",
+    ]
+    lignes += [f"{nom}: {valeur}" for nom, valeur in (entetes or {}).items()]
+    return ("\r\n".join(lignes) + "\r\n\r\n").encode('latin-1') + corps
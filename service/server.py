@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+
+"""
+Local HTTP/JSON simulation service: simulate, batch, sweep and break-even endpoints
+
+Concurrent /simuler and /point_mort requests are micro-batched: the requests that
+arrive within a few milliseconds are evaluated with one vectorized call, in a
+worker pool, while the asyncio event loop keeps serving connections. Sweeps of a
+price, salary or rate are evaluated with the linear decomposition of their
+structure (model/linear.py).
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from model.aggregation import aggregate, headline_indicators
+from model.batch import stack_params
+from model.goal_seek import goal_seek
+from model.kernel import simulate_fused
+from model.linear import decomposable, simulate_linear
+from model.simulation import SimulationFinanciere
+from service.batching import MicroBatcher, Surcharge
+from service.http import ErreurHTTP, lire_requete, reponse_json
+
+
+# Annual columns returned by the service
+COLONNES_ANNUELLES = [
+    'CA_SAS', 'Transfert_SARL', 'Resultat_Net_SARL', 'Resultat_Net_SAS',
+    'Resultat_Net_Consolide', 'Taux_Marge_Nette', 'Part_SARL', 'Nb_Developpeurs'
+]
+
+# Names of the headline indicators in the responses, when they differ from headline_indicators
+INDICATEURS_REPONSE = {'Delai_Retour': 'Delai_Retour_Trimestres'}
+
+# Scenarios of one /lot or /balayage request at most
+SCENARIOS_MAX_PAR_REQUETE = 100000
+
+
+def _valider(params):
+    """Full, validated parameters of a request (defaults completed as by SimulationFinanciere)"""
+    if params is not None and not isinstance(params, dict):
+        raise ErreurHTTP(400, "'params' doit être un objet JSON")
+    return SimulationFinanciere(params).params
+
+
+def _resultats(trimestriel, avec_trimestriel):
+    """Per-scenario JSON-ready results of a simulate_fused output of shape (n, nb_trimestres)"""
+    annuel = aggregate(trimestriel, 'annuel', COLONNES_ANNUELLES)
+    indicateurs = {INDICATEURS_REPONSE.get(nom, nom): valeur for nom, valeur in headline_indicators(trimestriel).items()
+                   if nom != 'Part_SARL'}
+
+    reponses = []
+    for i in range(len(annuel['CA_SAS'])):
+        reponse = {
+            'annees': list(range(1, annuel['CA_SAS'].shape[-1] + 1)),
+            'annuel': {colonne: annuel[colonne][i] for colonne in COLONNES_ANNUELLES},
+            'indicateurs': {nom: valeur[i] for nom, valeur in indicateurs.items()},
+        }
+        if avec_trimestriel:
+            reponse['trimestriel'] = {colonne: valeur[i] for colonne, valeur in trimestriel.items()
+                                      if np.ndim(valeur) == 2}
+        reponses.append(reponse)
+    return reponses
+
+
+def _simuler_lot(cle, elements):
+    """Batch function of /simuler: one simulate_fused for all the requests of a horizon"""
+    base, overrides = stack_params([params for params, _ in elements])
+    reponses = _resultats(simulate_fused(base, overrides), avec_trimestriel=True)
+    for reponse, (_, avec_trimestriel) in zip(reponses, elements):
+        if not avec_trimestriel:
+            del reponse['trimestriel']
+    return reponses
+
+
+def _point_mort_lot(cle, elements):
+    """Batch function of /point_mort: one goal_seek for all the requests of the same problem"""
+    _, _, parametre, metrique, granularite, periode, bornes, entier = cle
+    base, overrides = stack_params([params for params, _ in elements])
+    solution = goal_seek(base, parametre, metrique, [cible for _, cible in elements], granularite, periode,
+                         bornes=bornes, overrides=overrides, entier=entier)
+    return [{'parametre': parametre, 'valeur': solution['valeur'][i], 'atteint': solution['atteint'][i],
+             'metrique': solution['metrique'][i]} for i in range(len(elements))]
+
+
+class ServiceSimulation:
+    """
+    asyncio HTTP server of the simulation model.
+
+    Endpoints (JSON bodies, parameters completed with DEFAULT_PARAMS):
+    - GET /sante: status and counters
+    - POST /simuler {"params", "trimestriel"}: results of one scenario (micro-batched)
+    - POST /lot {"params", "scenarios": [overrides...], "trimestriel"}: results of many scenarios
+    - POST /balayage {"params", "parametre", "valeurs" or "min"/"max"/"nb"}: annual results
+      along one parameter
+    - POST /point_mort {"params", "parametre", "metrique", "cible", "granularite", "periode",
+      "bornes", "entier"}: parameter value reaching the target, by default a zero
+      consolidated result in year 1 (micro-batched)
+
+    Backpressure: requests beyond attente_max pending evaluations and connections
+    beyond connexions_max are answered 503 with a Retry-After header.
+    """
+
+    def __init__(self, hote='127.0.0.1', port=8765, fenetre=0.002, taille_lot_max=512, attente_max=4096,
+                 nb_workers=2, connexions_max=1024):
+        """
+        Args:
+            hote (str, optional): Listening address (local only by default)
+            port (int, optional): Listening port, 0 for any free port
+            fenetre (float, optional): Micro-batching window (seconds)
+            taille_lot_max (int, optional): Requests per vectorized evaluation at most
+            attente_max (int, optional): Pending evaluations at most
+            nb_workers (int, optional): Threads of the worker pool
+            connexions_max (int, optional): Open connections at most
+        """
+        self.hote = hote
+        self.port = port
+        self.attente_max = attente_max
+        self.connexions_max = connexions_max
+        self.executeur = ThreadPoolExecutor(max_workers=nb_workers, thread_name_prefix='simulation')
+        self.simulations = MicroBatcher(_simuler_lot, fenetre, taille_lot_max, attente_max, self.executeur)
+        self.points_morts = MicroBatcher(_point_mort_lot, fenetre, taille_lot_max, attente_max, self.executeur)
+
+        self.nb_connexions = 0
+        self.nb_requetes = 0
+        self.travaux_en_cours = 0
+        self.debut = time.time()
+        self._serveur = None
+        self._routes = {
+            ('GET', '/sante'): self._sante,
+            ('POST', '/simuler'): self._simuler,
+            ('POST', '/lot'): self._lot,
+            ('POST', '/balayage'): self._balayage,
+            ('POST', '/point_mort'): self._point_mort,
+        }
+
+    async def demarrer(self):
+        """
+        Start listening
+
+        Returns:
+            int: Listening port (useful with port=0)
+        """
+        self._serveur = await asyncio.start_server(self._connexion, self.hote, self.port, limit=2 ** 16,
+                                                  backlog=self.connexions_max)
+        self.port = self._serveur.sockets[0].getsockname()[1]
+        return self.port
+
+    async def servir(self):
+        """Start listening and serve until cancelled"""
+        if self._serveur is None:
+            await self.demarrer()
+        async with self._serveur:
+            await self._serveur.serve_forever()
+
+    async def arreter(self):
+        """Stop listening and shut the worker pool down"""
+        if self._serveur is not None:
+            self._serveur.close()
+            await self._serveur.wait_closed()
+        self.executeur.shutdown(wait=False)
+
+    async def _connexion(self, lecteur, ecrivain):
+        """Serve the requests of one keep-alive connection"""
+        self.nb_connexions += 1
+        try:
+            if self.nb_connexions > self.connexions_max:
+                ecrivain.write(reponse_json(503, {'erreur': "Trop de connexions"}, False, {'Retry-After': '1'}))
+                await ecrivain.drain()
+                return
+
+            while True:
+                try:
+                    requete = await lire_requete(lecteur)
+                except ErreurHTTP as e:
+                    ecrivain.write(reponse_json(e.statut, {'erreur': e.message}, False))
+                    await ecrivain.drain()
+                    return
+                if requete is None:
+                    return
+
+                self.nb_requetes += 1
+                statut, donnees, entetes = await self._traiter(requete)
+                ecrivain.write(reponse_json(statut, donnees, requete.garder_connexion, entetes))
+                await ecrivain.drain()
+                if not requete.garder_connexion:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.nb_connexions -= 1
+            ecrivain.close()
+
+    async def _traiter(self, requete):
+        """Route a request and turn errors into HTTP statuses"""
+        gestionnaire = self._routes.get((requete.methode, requete.chemin))
+        try:
+            if gestionnaire is None:
+                if any(chemin == requete.chemin for _, chemin in self._routes):
+                    raise ErreurHTTP(405, f"Méthode {requete.methode} non autorisée sur {requete.chemin}")
+                raise ErreurHTTP(404, f"Chemin inconnu: {requete.chemin}")
+            return 200, await gestionnaire(requete.json() if requete.methode == 'POST' else {}), None
+        except ErreurHTTP as e:
+            return e.statut, {'erreur': e.message}, e.entetes
+        except Surcharge as e:
+            return 503, {'erreur': f"Service surchargé ({e})"}, {'Retry-After': '1'}
+        except (ValueError, TypeError, KeyError) as e:
+            return 400, {'erreur': str(e)}, None
+        except Exception as e:
+            return 500, {'erreur': f"{type(e).__name__}: {e}"}, None
+
+    async def _executer(self, fonction, *args):
+        """Run a whole-request evaluation in the worker pool, within the backpressure limit"""
+        en_attente = self.travaux_en_cours + self.simulations.en_attente + self.points_morts.en_attente
+        if en_attente >= self.attente_max:
+            raise Surcharge(f"{en_attente} requêtes en attente")
+        self.travaux_en_cours += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executeur, fonction, *args)
+        finally:
+            self.travaux_en_cours -= 1
+
+    async def _sante(self, corps):
+        return {
+            'statut': 'ok',
+            'duree_fonctionnement_s': time.time() - self.debut,
+            'connexions': self.nb_connexions,
+            'requetes': self.nb_requetes,
+            'en_attente': self.travaux_en_cours + self.simulations.en_attente + self.points_morts.en_attente,
+            'lots_evalues': self.simulations.nb_lots + self.points_morts.nb_lots,
+            'requetes_groupees': self.simulations.nb_elements + self.points_morts.nb_elements,
+        }
+
+    async def _simuler(self, corps):
+        params = _valider(corps.get('params'))
+        return await self.simulations.soumettre(('simulation', params.nb_annees),
+                                                (params, bool(corps.get('trimestriel', False))))
+
+    async def _lot(self, corps):
+        base = _valider(corps.get('params'))
+        scenarios = corps.get('scenarios')
+        if not isinstance(scenarios, list) or not scenarios:
+            raise ErreurHTTP(400, "'scenarios' doit être une liste non vide de surcharges de paramètres")
+        if len(scenarios) > SCENARIOS_MAX_PAR_REQUETE:
+            raise ErreurHTTP(413, f"{SCENARIOS_MAX_PAR_REQUETE} scénarios par requête au plus")
+
+        def evaluer():
+            # Validating up to SCENARIOS_MAX_PAR_REQUETE parameter sets is left to the worker pool
+            params_list = [base.replace(**scenario) for scenario in scenarios]
+            if len({params.nb_annees for params in params_list}) > 1:
+                raise ErreurHTTP(400, "Les scénarios d'un lot doivent avoir le même 'nb_annees'")
+            base_lot, overrides = stack_params(params_list)
+            return _resultats(simulate_fused(base_lot, overrides), bool(corps.get('trimestriel', False)))
+
+        return {'scenarios': await self._executer(evaluer)}
+
+    async def _balayage(self, corps):
+        params = _valider(corps.get('params'))
+        parametre = corps.get('parametre')
+        if parametre not in params or parametre == 'nb_annees':
+            raise ErreurHTTP(400, f"Paramètre de balayage invalide: {parametre}")
+        if 'valeurs' in corps:
+            valeurs = np.asarray(corps['valeurs'], dtype=float)
+        else:
+            valeurs = np.linspace(float(corps['min']), float(corps['max']), int(corps.get('nb', 50)))
+        if valeurs.ndim != 1 or not 0 < len(valeurs) <= SCENARIOS_MAX_PAR_REQUETE:
+            raise ErreurHTTP(400, f"Il faut entre 1 et {SCENARIOS_MAX_PAR_REQUETE} valeurs de balayage")
+
+        def evaluer():
+            if decomposable({parametre: valeurs}):
+                annuel = simulate_linear(params, {parametre: valeurs}, 'annuel', COLONNES_ANNUELLES)
+            else:
+                annuel = aggregate(simulate_fused(params, {parametre: valeurs}), 'annuel', COLONNES_ANNUELLES)
+            return {'parametre': parametre, 'valeurs': valeurs, 'annees': list(range(1, params.nb_annees + 1)),
+                    'annuel': annuel}
+
+        return await self._executer(evaluer)
+
+    async def _point_mort(self, corps):
+        params = _valider(corps.get('params'))
+        bornes = corps.get('bornes')
+        cle = ('point_mort', params.nb_annees, corps.get('parametre', 'tjm_dev'),
+               corps.get('metrique', 'Resultat_Net_Consolide'), corps.get('granularite', 'annuel'),
+               corps.get('periode', 1), tuple(bornes) if bornes is not None else None, corps.get('entier'))
+        return await self.points_morts.soumettre(cle, (params, float(corps.get('cible', 0.0))))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+
+"""
+Background execution of heavy analyses with progressive results and cancellation
+"""
+
+import copy
+import threading
+
+
+class BackgroundTask:
+    """
+    Runs an analysis generator in a daemon thread and keeps its latest partial result.
+
+    The generator must yield (partial_result, progress) tuples, as the iter_* functions
+    of model.analysis do. Cancellation is checked between two yields.
+    """
+
+    def __init__(self, generateur, params):
+        """
+        Start the analysis in a background thread
+
+        Args:
+            generateur (callable): Analysis generator taking the parameters dict
+            params (dict): Simulation parameters of the analysis
+        """
+        self.params = params
+        self.resultat = None
+        self.avancement = 0.0
+        self.termine = False
+        self.erreur = None
+
+        self._verrou = threading.Lock()
+        self._annulation = threading.Event()
+        self._thread = threading.Thread(target=self._executer, args=(generateur,), daemon=True)
+        self._thread.start()
+
+    def _executer(self, generateur):
+        """Consume the generator, publishing a snapshot of each partial result"""
+        try:
+            for resultat, avancement in generateur(self.params):
+                if self._annulation.is_set():
+                    return
+
+
+                instantane = copy.deepcopy(resultat)
+                with self._verrou:
+                    self.resultat = instantane
+                    self.avancement = avancement
+
+            with self._verrou:
+                self.termine = True
+        except Exception as e:
+            with self._verrou:
+                self.erreur = e
+
+    def annuler(self):
+        """Request the cancellation of the analysis"""
+        self._annulation.set()
+
+    @property
+    def annule(self):
+        """True if the analysis was cancelled"""
+        return self._annulation.is_set()
+
+    @property
+    def en_cours(self):
+        """True while the analysis is still producing results"""
+        with self._verrou:
+            return not (self.termine or self.erreur is not None or self._annulation.is_set())
+
+    def etat(self):
+        """
+        Snapshot of the analysis state
+
+        Returns:
+            tuple: (latest partial result or None, progress between 0 and 1, finished flag)
+        """
+        with self._verrou:
+            return self.resultat, self.avancement, self.termine
+
+
+def synchroniser_taches(taches, generateurs, params):
+    """
+    Make sure a background task runs for each analysis on the given parameters
+
+    Tasks started for other (stale) parameters are cancelled and replaced, or dropped
+    when their analysis is no longer requested.
+
+    Args:
+        taches (dict): Running tasks by analysis name, updated in place
+        generateurs (dict): Analysis generator by analysis name
+        params (dict): Current simulation parameters
+
+    Returns:
+        dict: The updated tasks
+    """
+    for nom in [nom for nom, tache in taches.items() if nom not in generateurs and tache.params != params]:
+        taches.pop(nom).annuler()
+
+    for nom, generateur in generateurs.items():
+        tache = taches.get(nom)
+        if tache is not None and tache.params == params:
+            continue
+
+        if tache is not None:
+            tache.annuler()
+        taches[nom] = BackgroundTask(generateur, params.copy())
+
+    return taches
+
+
+def annuler_taches(taches):
+    """
+    Cancel every task of a tasks dict (release callback of the resource manager)
+
+    Args:
+        taches (dict): Running tasks by analysis name
+    """
+    for tache in taches.values():
+        tache.annuler()
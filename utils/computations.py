@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+
+"""
+Computations and chart images shared by all the sessions of the server process
+
+Results are memoised in the resource registry (per process) and in the persistent
+result store (shared between processes and restarts). Matplotlib charts are kept
+as rendered PNG images, so that showing a chart again costs neither its figure
+nor its rendering. The warm-up stage of the server (utils/warmup.py) fills these
+caches before the first session.
+"""
+
+import io
+
+from model.aggregation import headline_indicators
+from model.analysis import compute_point_mort_roi, compute_point_mort_roi_adaptive, compute_sensitivity
+from model.simulation import SimulationFinanciere
+from model.surrogate import SurrogateModel
+from utils.metrics import metriques
+from utils.resources import gestionnaire_ressources
+from utils.result_store import ResultStore
+
+
+# savefig options of st.pyplot, so that the cached images look like the figures it renders
+OPTIONS_IMAGE = {'format': 'png', 'dpi': 200, 'bbox_inches': 'tight'}
+
+
+magasin_resultats = ResultStore()
+
+
+def _statistiques_magasin():
+    """Hit and miss gauges of the persistent result store"""
+    consultations = magasin_resultats.nb_succes + magasin_resultats.nb_echecs
+    return {
+        'magasin_resultats_succes_total': magasin_resultats.nb_succes,
+        'magasin_resultats_echecs_total': magasin_resultats.nb_echecs,
+        'magasin_resultats_taux_succes': magasin_resultats.nb_succes / consultations if consultations else None,
+    }
+
+
+metriques.ajouter_collecteur('magasin_resultats', _statistiques_magasin)
+
+
+@gestionnaire_ressources.memoiser('resultat')
+def simuler(params):
+    """Run (or reuse) the core simulation for a parameter set"""
+    simulation = SimulationFinanciere(params, store=magasin_resultats)
+    with metriques.chronometrer('simulation_secondes'):
+        simulation.run_simulation()
+    metriques.incrementer('simulations_total')
+    return simulation
+
+
+@gestionnaire_ressources.memoiser('resultat')
+def analyse_sensibilite(params):
+    """Compute (or reuse) the sensitivity analysis for a parameter set"""
+    return compute_sensitivity(params, store=magasin_resultats)
+
+
+@gestionnaire_ressources.memoiser('resultat')
+def analyse_point_mort_roi(params):
+    """Compute (or reuse) the break-even and ROI grid for a parameter set"""
+    return compute_point_mort_roi(params, store=magasin_resultats)
+
+
+@gestionnaire_ressources.memoiser('resultat')
+@magasin_resultats.memoiser('point_mort_adaptatif')
+def analyse_point_mort_adaptative(params):
+    """Compute (or reuse) the adaptive break-even frontier and ROI surface for a parameter set"""
+    return compute_point_mort_roi_adaptive(params)
+
+
+def indicateurs_exacts(params):
+    """Exact headline indicators of a parameter set, from its (memoised) simulation"""
+    return headline_indicators(simuler(params).resultats)
+
+
+def iter_indicateurs_exacts(params):
+    """Exact headline indicators as a one-step analysis generator, for a background task"""
+    yield indicateurs_exacts(params), 1.0
+
+
+def ajuster_substitut(params, substitut=None):
+    """
+    Surrogate of the headline indicators covering a parameter set
+
+    Args:
+        params (dict): Simulation parameters
+        substitut (SurrogateModel, optional): Current surrogate, kept when it covers the parameters
+
+    Returns:
+        SurrogateModel: The current surrogate, or a new one fitted around the parameters
+    """
+    if substitut is not None and substitut.couvre(params):
+        return substitut
+    with metriques.chronometrer('substitut_ajustement_secondes'):
+        substitut = SurrogateModel(params)
+    metriques.incrementer('substitut_ajustements_total')
+    return substitut
+
+
+def cle_params(params):
+    """Hashable key of a parameters dict"""
+    return tuple(sorted(params.items()))
+
+
+def image_figure(cle, construire):
+    """
+    PNG image of a matplotlib chart, built and rendered once per key
+
+    Args:
+        cle (hashable): Identity of the chart and of its data
+        construire (callable): Builds the figure, called without arguments on a miss
+
+    Returns:
+        bytes: PNG image
+    """
+    def rendre():
+        figure = gestionnaire_ressources.suivre_figure(construire())
+        tampon = io.BytesIO()
+        try:
+            figure.savefig(tampon, **OPTIONS_IMAGE)
+        finally:
+            gestionnaire_ressources.fermer_figure(figure)
+        return tampon.getvalue()
+
+    return gestionnaire_ressources.obtenir_ou_calculer(('image', cle), rendre, categorie='figure')
+
+
+def image_simulation(construire, simulation):
+    """PNG image of a chart of one simulation (construire takes the simulation)"""
+    return image_figure((construire.__name__, cle_params(simulation.params)), lambda: construire(simulation))
+
+
+def image_analyse(construire, simulation, analyse, **options):
+    """
+    PNG image of an analysis chart of one simulation (construire takes the simulation,
+    the analysis and the options)
+
+    The analysis and the options are computed from the parameters of the simulation:
+    the key holds these parameters and the names of the options given.
+    """
+    noms_options = tuple(sorted(nom for nom, valeur in options.items() if valeur is not None))
+    return image_figure((construire.__name__, cle_params(simulation.params), noms_options),
+                        lambda: construire(simulation, analyse, **options))
+
+
+def image_tresorerie(construire, simulation, params_tresorerie, tresorerie):
+    """PNG image of a treasury chart (construire takes the treasury of the simulation)"""
+    return image_figure((construire.__name__, cle_params(simulation.params), cle_params(params_tresorerie)),
+                        lambda: construire(tresorerie))
+
+
+def image_comparaison(construire, params_scenarios, noms_scenarios, comparaison):
+    """PNG image of a scenario comparison chart (construire takes the comparison)"""
+    return image_figure((construire.__name__, tuple(noms_scenarios), tuple(map(cle_params, params_scenarios))),
+                        lambda: construire(comparaison))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+
+"""
+In-process metrics: counters, latency histograms and gauges in the Prometheus text format
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+SEUILS_LATENCE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Event timestamps kept per counter to compute recent rates
+_EVENEMENTS_MAX = 10000
+
+# Metric name -> (Prometheus type, description)
+DESCRIPTIONS = {
+    'simulations_total': ('counter', "Simulations calculées (hors résultats en cache)"),
+    'simulation_secondes': ('histogram', "Durée d'une simulation"),
+    'rerun_secondes': ('histogram', "Durée d'une exécution du script Streamlit"),
+    'rendu_graphique_secondes': ('histogram', "Durée du rendu d'un graphique"),
+    'canari_secondes': ('gauge', "Durée de la dernière simulation canari"),
+    'pret': ('gauge', "1 quand le modèle est prêt à simuler rapidement"),
+    'prechauffage_secondes': ('gauge', "Durée du préchauffage au démarrage du serveur"),
+    'substitut_ajustements_total': ('counter', "Ajustements du modèle approché des indicateurs"),
+    'substitut_ajustement_secondes': ('histogram', "Durée d'un ajustement du modèle approché"),
+    'cache_resultats_succes_total': ('counter', "Résultats trouvés dans le cache mémoire"),
+    'cache_resultats_echecs_total': ('counter', "Résultats absents du cache mémoire"),
+    'cache_resultats_taux_succes': ('gauge', "Part des consultations du cache mémoire trouvées"),
+    'cache_resultats_octets': ('gauge', "Octets utilisés par le cache mémoire"),
+    'magasin_resultats_succes_total': ('counter', "Résultats trouvés dans le stock persistant"),
+    'magasin_resultats_echecs_total': ('counter', "Résultats absents du stock persistant"),
+    'magasin_resultats_taux_succes': ('gauge', "Part des consultations du stock persistant trouvées"),
+    'memoire_rss_octets': ('gauge', "Mémoire résidente du processus"),
+}
+
+
+class _Histogramme:
+    """Cumulative histogram with fixed buckets"""
+
+    __slots__ = ('seuils', 'comptes', 'somme', 'nombre')
+
+    def __init__(self, seuils):
+        self.seuils = seuils
+        self.comptes = [0] * (len(seuils) + 1)
+        self.somme = 0.0
+        self.nombre = 0
+
+    def observer(self, valeur):
+        self.comptes[bisect.bisect_left(self.seuils, valeur)] += 1
+        self.somme += valeur
+        self.nombre += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None without observations)"""
+        if not self.nombre:
+            return None
+        rang = q * self.nombre
+        cumul = 0
+        for seuil, compte in zip(self.seuils + (math.inf,), self.comptes):
+            cumul += compte
+            if cumul >= rang:
+                return seuil
+        return math.inf
+
+
+class Metriques:
+    """
+    Thread-safe registry of the process metrics.
+
+    Recording a value costs a lock and a few additions, so that the application can
+    be instrumented on its hot paths. Gauges that are cheap to read on demand (memory,
+    cache usage) come from collectors called only when the metrics are exported.
+    """
+
+    def __init__(self, prefixe='simulation_'):
+        """
+        Args:
+            prefixe (str, optional): Prefix of the exported metric names
+        """
+        self.prefixe = prefixe
+        self.debut = time.time()
+        self._compteurs = {}
+        self._evenements = {}
+        self._histogrammes = {}
+        self._jauges = {}
+        self._collecteurs = {}
+        self._verrou = threading.Lock()
+
+    def incrementer(self, nom, valeur=1):
+        """Add to a counter"""
+        maintenant = time.monotonic()
+        with self._verrou:
+            self._compteurs[nom] = self._compteurs.get(nom, 0) + valeur
+            self._evenements.setdefault(nom, deque(maxlen=_EVENEMENTS_MAX)).append(maintenant)
+
+    def observer(self, nom, valeur, seuils=SEUILS_LATENCE):
+        """Record a value (a duration in seconds by default) in a histogram"""
+        with self._verrou:
+            histogramme = self._histogrammes.get(nom)
+            if histogramme is None:
+                histogramme = self._histogrammes[nom] = _Histogramme(tuple(seuils))
+            histogramme.observer(valeur)
+
+    def definir(self, nom, valeur):
+        """Set a gauge"""
+        with self._verrou:
+            self._jauges[nom] = valeur
+
+    @contextmanager
+    def chronometrer(self, nom):
+        """Context manager recording the duration of its block in a histogram"""
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observer(nom, time.perf_counter() - debut)
+
+    def ajouter_collecteur(self, nom, collecteur):
+        """
+        Register (or replace) a collector
+
+        Args:
+            nom (str): Collector name, registering the same name again replaces it
+            collecteur (callable): Returns a dict metric name -> value, read at export time
+        """
+        with self._verrou:
+            self._collecteurs[nom] = collecteur
+
+    def taux(self, nom, fenetre=60.0):
+        """
+        Recent rate of a counter
+
+        Returns:
+            float: Increments per second over the last fenetre seconds (or since the start)
+        """
+        maintenant = time.monotonic()
+        with self._verrou:
+            evenements = self._evenements.get(nom, ())
+            recents = len(evenements) - bisect.bisect_left(evenements, maintenant - fenetre)
+        return recents / min(fenetre, max(time.time() - self.debut, 1e-9))
+
+    def _collecter(self):
+        """Values of the collectors (a failing collector is skipped)"""
+        with self._verrou:
+            collecteurs = list(self._collecteurs.values())
+        valeurs = {}
+        for collecteur in collecteurs:
+            try:
+                valeurs.update(collecteur())
+            except Exception:
+                continue
+        return valeurs
+
+    def instantane(self):
+        """
+        Current values, for status reports
+
+        Returns:
+            dict: Counters, gauges and collected values by name, and for every histogram
+                its count, mean, p50 and p90 (bucket upper bounds)
+        """
+        collectes = self._collecter()
+        with self._verrou:
+            etat = {**self._compteurs, **self._jauges}
+            for nom, histogramme in self._histogrammes.items():
+                etat[nom] = {
+                    'nombre': histogramme.nombre,
+                    'moyenne': histogramme.somme / histogramme.nombre if histogramme.nombre else None,
+                    'p50': histogramme.quantile(0.5),
+                    'p90': histogramme.quantile(0.9),
+                }
+        etat.update(collectes)
+        return etat
+
+    def exposition(self):
+        """
+        All the metrics in the Prometheus text exposition format
+
+        Returns:
+            str: Exposition text
+        """
+        collectes = self._collecter()
+        lignes = []
+
+        def entete(nom, type_defaut):
+            type_metrique, description = DESCRIPTIONS.get(nom, (type_defaut, nom))
+            lignes.append(f"# HELP {self.prefixe}{nom} {description}")
+            lignes.append(f"# TYPE {self.prefixe}{nom} {type_metrique}")
+
+        with self._verrou:
+            for nom, valeur in sorted(self._compteurs.items()):
+                entete(nom, 'counter')
+                lignes.append(f"{self.prefixe}{nom} {valeur}")
+            for nom, valeur in sorted({**self._jauges, **collectes}.items()):
+                if valeur is None:
+                    continue
+                entete(nom, 'gauge')
+                lignes.append(f"{self.prefixe}{nom} {float(valeur)!r}")
+            for nom, histogramme in sorted(self._histogrammes.items()):
+                entete(nom, 'histogram')
+                cumul = 0
+                for seuil, compte in zip(histogramme.seuils + (math.inf,), histogramme.comptes):
+                    cumul += compte
+                    borne = '+Inf' if seuil == math.inf else repr(float(seuil))
+                    lignes.append(f'{self.prefixe}{nom}_bucket{{le="{borne}"}} {cumul}')
+                lignes.append(f"{self.prefixe}{nom}_sum {histogramme.somme!r}")
+                lignes.append(f"{self.prefixe}{nom}_count {histogramme.nombre}")
+
+        return '\n'.join(lignes) + '\n'
+
+
+metriques = Metriques()
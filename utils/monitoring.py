@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+
+"""
+Readiness and metrics of the server process: canary simulation, status file and HTTP endpoint
+
+A daemon thread times a canary simulation and rewrites a small JSON status file, so
+that a container health check only has to read a file. The same status and the
+Prometheus metrics are served over HTTP by the process itself (/pret and /metriques),
+for orchestrators and scrapers that probe over the network.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.metrics import metriques
+from utils.resources import gestionnaire_ressources
+
+
+# Seconds between two writes of the status file
+INTERVALLE_ETAT_DEFAUT = 10
+
+# Seconds between two canary simulations
+INTERVALLE_CANARI_DEFAUT = 60
+
+# A canary slower than this (seconds) makes the process not ready
+DUREE_CANARI_MAX_DEFAUT = 2.0
+
+PORT_METRIQUES_DEFAUT = 9108
+
+
+def chemin_etat_defaut():
+    """Status file path: SIMULATION_STATUS_FILE or a file in the system temporary directory"""
+    return os.environ.get('SIMULATION_STATUS_FILE') or os.path.join(
+        tempfile.gettempdir(), 'simulation_esn', 'etat.json')
+
+
+def simulation_canari(params=None):
+    """
+    Time one reference simulation
+
+    Args:
+        params (dict, optional): Simulation parameters, DEFAULT_PARAMS by default
+
+    Returns:
+        float: Duration in seconds
+    """
+    from config.parameters import DEFAULT_PARAMS
+    from model.calculation import calculate_quarterly_results
+
+    debut = time.perf_counter()
+    calculate_quarterly_results(params or DEFAULT_PARAMS)
+    return time.perf_counter() - debut
+
+
+def _collecteur_ressources():
+    """Memory and in-memory cache gauges"""
+    rapport = gestionnaire_ressources.rapport()
+    consultations = rapport['succes'] + rapport['echecs']
+    return {
+        'memoire_rss_octets': rapport['rss'],
+        'cache_resultats_octets': rapport['utilise_octets'],
+        'cache_resultats_succes_total': rapport['succes'],
+        'cache_resultats_echecs_total': rapport['echecs'],
+        'cache_resultats_taux_succes': rapport['succes'] / consultations if consultations else None,
+    }
+
+
+metriques.ajouter_collecteur('ressources', _collecteur_ressources)
+
+
+class Surveillance:
+    """
+    Readiness of the process.
+
+    The process is ready once the last canary simulation succeeded within
+    duree_canari_max and every registered condition (for instance a warm-up
+    stage) has been reported as met.
+    """
+
+    def __init__(self, chemin_etat=None, intervalle_etat=INTERVALLE_ETAT_DEFAUT,
+                 intervalle_canari=INTERVALLE_CANARI_DEFAUT, duree_canari_max=DUREE_CANARI_MAX_DEFAUT):
+        """
+        Args:
+            chemin_etat (str, optional): Status file, chemin_etat_defaut() by default
+            intervalle_etat (float, optional): Seconds between two writes of the status file
+            intervalle_canari (float, optional): Seconds between two canary simulations
+            duree_canari_max (float, optional): Slowest canary (seconds) of a ready process
+        """
+        self.chemin_etat = chemin_etat or chemin_etat_defaut()
+        self.intervalle_etat = intervalle_etat
+        self.intervalle_canari = intervalle_canari
+        self.duree_canari_max = duree_canari_max
+
+        self.canari_secondes = None
+        self.erreur_canari = None
+        self._conditions = {}
+        self._verrou = threading.Lock()
+        self._fil = None
+        self._serveur_http = None
+
+    def exiger(self, condition):
+        """Register a condition of readiness, not met until signaler(condition) is called"""
+        with self._verrou:
+            self._conditions.setdefault(condition, False)
+
+    def signaler(self, condition, remplie=True):
+        """Report a condition of readiness as met (or no longer met)"""
+        with self._verrou:
+            self._conditions[condition] = remplie
+
+    def verifier_canari(self):
+        """Run and time the canary simulation"""
+        try:
+            self.canari_secondes = simulation_canari()
+            self.erreur_canari = None
+        except Exception as e:
+            self.canari_secondes = None
+            self.erreur_canari = f"{type(e).__name__}: {e}"
+        metriques.definir('canari_secondes', self.canari_secondes)
+        metriques.definir('pret', int(self.pret()))
+
+    def pret(self):
+        """True when the canary is fast enough and every condition is met"""
+        with self._verrou:
+            conditions = all(self._conditions.values())
+        return (conditions and self.canari_secondes is not None
+                and self.canari_secondes <= self.duree_canari_max)
+
+    def etat(self):
+        """
+        Readiness report
+
+        Returns:
+            dict: Readiness, canary, conditions, simulation rate and metric values
+        """
+        with self._verrou:
+            conditions = dict(self._conditions)
+        return {
+            'pret': self.pret(),
+            'horodatage': time.time(),
+            'pid': os.getpid(),
+            'canari_secondes': self.canari_secondes,
+            'erreur_canari': self.erreur_canari,
+            'conditions': conditions,
+            'simulations_par_seconde': metriques.taux('simulations_total'),
+            'metriques': metriques.instantane(),
+        }
+
+    def ecrire_etat(self):
+        """Write the status file atomically (replaced in one step, never read half-written)"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.chemin_etat)), exist_ok=True)
+        temporaire = f"{self.chemin_etat}.{os.getpid()}.tmp"
+        with open(temporaire, 'w') as f:
+            json.dump(self.etat(), f, indent=1, default=str)
+        os.replace(temporaire, self.chemin_etat)
+
+    def _boucle(self):
+        prochain_canari = 0.0
+        while True:
+            if time.monotonic() >= prochain_canari:
+                self.verifier_canari()
+                prochain_canari = time.monotonic() + self.intervalle_canari
+            metriques.definir('pret', int(self.pret()))
+            try:
+                self.ecrire_etat()
+            except OSError:
+                pass
+            time.sleep(self.intervalle_etat)
+
+    def demarrer(self):
+        """Start the canary and status file thread (once per process)"""
+        with self._verrou:
+            if self._fil is not None:
+                return
+            self._fil = threading.Thread(target=self._boucle, name='surveillance', daemon=True)
+        self._fil.start()
+
+    def servir_http(self, hote='127.0.0.1', port=PORT_METRIQUES_DEFAUT):
+        """
+        Serve /pret (readiness JSON, 503 when not ready) and /metriques (Prometheus text)
+        from a daemon thread (once per process)
+
+        Returns:
+            int: Listening port, None when it is already in use (by another process)
+        """
+        with self._verrou:
+            if self._serveur_http is not None:
+                return self._serveur_http.server_address[1]
+            try:
+                self._serveur_http = ThreadingHTTPServer((hote, port), _gestionnaire_http(self))
+            except OSError:
+                return None
+        self._serveur_http.daemon_threads = True
+        threading.Thread(target=self._serveur_http.serve_forever, name='metriques-http', daemon=True).start()
+        return self._serveur_http.server_address[1]
+
+
+def _gestionnaire_http(surveillance):
+    """Request handler class of the readiness and metrics endpoint"""
+
+    class Gestionnaire(BaseHTTPRequestHandler):
+        def do_GET(self):
+            chemin = self.path.split('?', 1)[0]
+            if chemin in ('/pret', '/ready'):
+                etat = surveillance.etat()
+                self._repondre(200 if etat['pret'] else 503, 'application/json',
+                               json.dumps(etat, default=str).encode())
+            elif chemin in ('/metriques', '/metrics'):
+                self._repondre(200, 'text/plain; version=0.0.4; charset=utf-8', metriques.exposition().encode())
+            else:
+                self._repondre(404, 'text/plain; charset=utf-8', "Chemins: /pret, /metriques\n".encode())
+
+        def _repondre(self, statut, type_contenu, corps):
+            self.send_response(statut)
+            self.send_header('Content-Type', type_contenu)
+            self.send_header('Content-Length', str(len(corps)))
+            self.end_headers()
+            self.wfile.write(corps)
+
+        def log_message(self, format, *args):
+            # Probes every few seconds would flood the server logs
+            pass
+
+    return Gestionnaire
+
+
+surveillance = Surveillance()
+
+
+def demarrer_surveillance():
+    """
+    Start the status file thread and, unless SIMULATION_METRICS_PORT is 0, the HTTP
+    endpoint on SIMULATION_METRICS_HOST:SIMULATION_METRICS_PORT (127.0.0.1:9108 by default)
+
+    Returns:
+        Surveillance: The process monitoring
+    """
+    surveillance.demarrer()
+    port = int(os.environ.get('SIMULATION_METRICS_PORT', PORT_METRIQUES_DEFAUT))
+    if port:
+        surveillance.servir_http(os.environ.get('SIMULATION_METRICS_HOST', '127.0.0.1'), port)
+    return surveillance
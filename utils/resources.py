@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+
+"""
+Memory budget and lifecycle management of figures, cached results and per-session state
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+
+BUDGET_MEMOIRE_DEFAUT_MO = 512
+
+
+def estimer_taille(objet, _vus=None):
+    """
+    Estimates the memory footprint of an object in bytes
+
+    DataFrames and arrays are measured exactly, containers and objects with a
+    __dict__ recursively, matplotlib figures from their rendering buffer.
+
+    Args:
+        objet: Object to measure
+
+    Returns:
+        int: Estimated size in bytes
+    """
+    _vus = set() if _vus is None else _vus
+    if id(objet) in _vus:
+        return 0
+    _vus.add(id(objet))
+
+    if isinstance(objet, (pd.DataFrame, pd.Series)):
+        taille = objet.memory_usage(deep=True)
+        return int(taille.sum() if isinstance(objet, pd.DataFrame) else taille)
+    if isinstance(objet, np.ndarray):
+        return objet.nbytes
+    if hasattr(objet, 'get_size_inches') and hasattr(objet, 'dpi'):
+        largeur, hauteur = objet.get_size_inches()
+        return int(largeur * hauteur * objet.dpi ** 2 * 4) + 200_000
+    if isinstance(objet, dict):
+        return sys.getsizeof(objet) + sum(estimer_taille(k, _vus) + estimer_taille(v, _vus) for k, v in objet.items())
+    if isinstance(objet, (list, tuple, set, frozenset)):
+        return sys.getsizeof(objet) + sum(estimer_taille(v, _vus) for v in objet)
+    if hasattr(objet, '__dict__') and not isinstance(objet, type):
+        return sys.getsizeof(objet) + estimer_taille(vars(objet), _vus)
+    return sys.getsizeof(objet)
+
+
+def memoire_processus():
+    """
+    Current and peak resident memory of the process
+
+    Returns:
+        dict: 'rss' and 'rss_pic' in bytes (None when unavailable on the platform)
+    """
+    rss, rss_pic = None, None
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        rss_pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss_pic *= 1 if sys.platform == 'darwin' else 1024
+    except ImportError:
+        pass
+
+    return {'rss': rss, 'rss_pic': rss_pic}
+
+
+class ResourceManager:
+    """
+    Least-recently-used registry of memory-heavy objects under a global byte budget.
+
+    Each entry belongs to a category ('figure', 'resultat', 'session', ...) and may
+    come with a release callback (closing a figure, cancelling background tasks)
+    called when the entry is evicted or removed.
+    """
+
+    def __init__(self, budget_octets=None):
+        """
+        Initialize the manager
+
+        Args:
+            budget_octets (int, optional): Memory budget in bytes, read from the
+                SIMULATION_MEMORY_BUDGET_MB environment variable by default
+        """
+        if budget_octets is None:
+            budget_octets = int(float(os.environ.get('SIMULATION_MEMORY_BUDGET_MB', BUDGET_MEMOIRE_DEFAUT_MO)) * 1024 ** 2)
+
+        self.budget_octets = budget_octets
+        self._entrees = OrderedDict()
+        self._utilise = 0
+        self._evictions = 0
+        self._succes = 0
+        self._echecs = 0
+        self._verrou = threading.RLock()
+
+    def ajouter(self, cle, objet, categorie='resultat', taille=None, liberer=None):
+        """
+        Register (or refresh) an object, evicting the least recently used entries if needed
+
+        Args:
+            cle (hashable): Entry key
+            objet: Tracked object
+            categorie (str, optional): Category used in the usage report
+            taille (int, optional): Size in bytes, estimated when not given
+            liberer (callable, optional): Called with the object when it leaves the registry
+
+        Returns:
+            The tracked object
+        """
+        taille = estimer_taille(objet) if taille is None else taille
+        with self._verrou:
+            ancienne = self._entrees.pop(cle, None)
+            if ancienne is not None:
+                self._utilise -= ancienne[2]
+                if ancienne[0] is not objet and ancienne[3] is not None:
+                    ancienne[3](ancienne[0])
+
+            self._entrees[cle] = (objet, categorie, taille, liberer)
+            self._utilise += taille
+            self._evicter(garder=cle)
+
+        return objet
+
+    def obtenir(self, cle, defaut=None):
+        """Return a tracked object and mark it as recently used"""
+        with self._verrou:
+            if cle not in self._entrees:
+                return defaut
+            self._entrees.move_to_end(cle)
+            return self._entrees[cle][0]
+
+    def __contains__(self, cle):
+        with self._verrou:
+            return cle in self._entrees
+
+    def retirer(self, cle):
+        """Remove an entry and release its object"""
+        with self._verrou:
+            entree = self._entrees.pop(cle, None)
+            if entree is None:
+                return
+            self._utilise -= entree[2]
+
+        if entree[3] is not None:
+            entree[3](entree[0])
+
+    def _evicter(self, garder=None):
+        """Evict least recently used entries until usage fits in the budget"""
+        while self._utilise > self.budget_octets and len(self._entrees) > 1:
+            cle = next(iter(self._entrees))
+            if cle == garder:
+                break
+            objet, _, taille, liberer = self._entrees.pop(cle)
+            self._utilise -= taille
+            self._evictions += 1
+            if liberer is not None:
+                liberer(objet)
+
+    def suivre_figure(self, figure):
+        """
+        Track a matplotlib figure so that it is closed when released
+
+        Returns:
+            matplotlib.figure.Figure: The figure
+        """
+        import matplotlib.pyplot as plt
+
+        return self.ajouter(('figure', id(figure)), figure, categorie='figure', liberer=plt.close)
+
+    def fermer_figure(self, figure):
+        """Close a tracked figure and stop tracking it"""
+        self.retirer(('figure', id(figure)))
+
+    def obtenir_ou_calculer(self, cle, calcul, categorie='resultat'):
+        """
+        Cached object of a key, computed and registered on a miss
+
+        Args:
+            cle (hashable): Entry key
+            calcul (callable): Computes the object, called without arguments on a miss
+            categorie (str, optional): Category of the entry
+
+        Returns:
+            The cached or computed object
+        """
+        resultat = self.obtenir(cle)
+        with self._verrou:
+            if resultat is None:
+                self._echecs += 1
+            else:
+                self._succes += 1
+        if resultat is None:
+            resultat = self.ajouter(cle, calcul(), categorie=categorie)
+        return resultat
+
+    def memoiser(self, categorie='resultat'):
+        """
+        Decorator caching a function of a parameters dict in the registry
+
+        The decorated function gains en_cache(params), true when its result for the
+        parameters is in the registry.
+
+        Returns:
+            callable: Decorator
+        """
+        def decorateur(fonction):
+            def cle(params):
+                return (categorie, fonction.__qualname__, tuple(sorted(params.items())))
+
+            @wraps(fonction)
+            def enveloppe(params):
+                return self.obtenir_ou_calculer(cle(params), lambda: fonction(params), categorie)
+            enveloppe.en_cache = lambda params: cle(params) in self
+            return enveloppe
+        return decorateur
+
+    def rapport(self):
+        """
+        Current usage of the registry and of the process
+
+        Returns:
+            dict: Budget, used bytes, evictions, hits and misses of the memoised functions,
+                per-category counts and sizes, process memory
+        """
+        with self._verrou:
+            categories = {}
+            for _, categorie, taille, _ in self._entrees.values():
+                nombre, total = categories.get(categorie, (0, 0))
+                categories[categorie] = (nombre + 1, total + taille)
+
+            return {
+                'budget_octets': self.budget_octets,
+                'utilise_octets': self._utilise,
+                'nb_entrees': len(self._entrees),
+                'evictions': self._evictions,
+                'succes': self._succes,
+                'echecs': self._echecs,
+                'categories': {nom: {'nombre': n, 'octets': t} for nom, (n, t) in categories.items()},
+                **memoire_processus()
+            }
+
+
+gestionnaire_ressources = ResourceManager()
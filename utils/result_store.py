@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+
+"""
+Persistent, content-addressed store of simulation results shared between processes
+"""
+
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import wraps
+
+from config.parameters import MODEL_VERSION, params_hash
+
+
+TAILLE_MAX_DEFAUT_MO = 256
+
+# Last-use timestamps are only refreshed after this delay (seconds), so that reads rarely write
+INTERVALLE_MISE_A_JOUR_UTILISATION = 60
+
+
+class ResultStore:
+    """
+    SQLite-backed store of computed results keyed by (kind, parameter hash, model version).
+
+    The database runs in WAL mode, so any number of Streamlit workers, replicas and
+    batch jobs on the same host can read and write it concurrently. Least recently
+    used entries are evicted once the stored payloads exceed the size limit, and
+    entries written by another model version are never returned.
+
+    Values are pickled: only share the store directory between trusted processes.
+    """
+
+    def __init__(self, chemin=None, taille_max_octets=None, version=MODEL_VERSION):
+        """
+        Open (or create) the store
+
+        Args:
+            chemin (str, optional): SQLite file, SIMULATION_RESULT_STORE or a file in the
+                system temporary directory by default
+            taille_max_octets (int, optional): Size limit of the payloads in bytes,
+                SIMULATION_RESULT_STORE_MB (default 256 MB) by default
+            version (str, optional): Model version of the results
+        """
+        if chemin is None:
+            chemin = os.environ.get('SIMULATION_RESULT_STORE') or os.path.join(
+                tempfile.gettempdir(), 'simulation_esn', 'resultats.sqlite')
+        if taille_max_octets is None:
+            taille_max_octets = int(float(os.environ.get('SIMULATION_RESULT_STORE_MB', TAILLE_MAX_DEFAUT_MO)) * 1024 ** 2)
+
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+        self.chemin = chemin
+        self.taille_max_octets = taille_max_octets
+        self.version = version
+        self._local = threading.local()
+        # Lookups of this process (get), found or not
+        self.nb_succes = 0
+        self.nb_echecs = 0
+
+        with self._connexion() as connexion:
+            connexion.execute("""
+                CREATE TABLE IF NOT EXISTS resultats (
+                    type TEXT NOT NULL,
+                    cle TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    valeur BLOB NOT NULL,
+                    taille INTEGER NOT NULL,
+                    utilise REAL NOT NULL,
+                    PRIMARY KEY (type, cle, version)
+                )
+            """)
+            connexion.execute("CREATE INDEX IF NOT EXISTS idx_resultats_utilise ON resultats (utilise)")
+
+    def _connexion(self):
+        """SQLite connection of the current thread"""
+        connexion = getattr(self._local, 'connexion', None)
+        if connexion is None:
+            connexion = sqlite3.connect(self.chemin, timeout=30)
+            connexion.execute("PRAGMA journal_mode=WAL")
+            connexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.connexion = connexion
+        return connexion
+
+    def get(self, type_resultat, params, defaut=None):
+        """
+        Look up a stored result
+
+        Args:
+            type_resultat (str): Kind of result ('simulation', 'sensibilite', ...)
+            params (dict): Simulation parameters of the result
+            defaut: Returned when the result is not stored
+
+        Returns:
+            The stored result or defaut
+        """
+        cle = params_hash(params)
+        with self._connexion() as connexion:
+            ligne = connexion.execute(
+                "SELECT valeur, utilise FROM resultats WHERE type = ? AND cle = ? AND version = ?",
+                (type_resultat, cle, self.version)).fetchone()
+            if ligne is None:
+                self.nb_echecs += 1
+                return defaut
+            self.nb_succes += 1
+
+
+            maintenant = time.time()
+            if maintenant - ligne[1] > INTERVALLE_MISE_A_JOUR_UTILISATION:
+                connexion.execute(
+                    "UPDATE resultats SET utilise = ? WHERE type = ? AND cle = ? AND version = ?",
+                    (maintenant, type_resultat, cle, self.version))
+
+        return pickle.loads(ligne[0])
+
+    def contient(self, type_resultat, params):
+        """True if a result of this kind is stored for the parameters"""
+        with self._connexion() as connexion:
+            return connexion.execute(
+                "SELECT 1 FROM resultats WHERE type = ? AND cle = ? AND version = ?",
+                (type_resultat, params_hash(params), self.version)).fetchone() is not None
+
+    def put(self, type_resultat, params, valeur):
+        """
+        Store a result, then evict least recently used entries beyond the size limit
+
+        Args:
+            type_resultat (str): Kind of result
+            params (dict): Simulation parameters of the result
+            valeur: Picklable result
+
+        Returns:
+            The stored value
+        """
+        donnees = pickle.dumps(valeur, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connexion() as connexion:
+            connexion.execute(
+                "INSERT OR REPLACE INTO resultats (type, cle, version, valeur, taille, utilise) VALUES (?, ?, ?, ?, ?, ?)",
+                (type_resultat, params_hash(params), self.version, donnees, len(donnees), time.time()))
+        self._evicter()
+
+        return valeur
+
+    def _evicter(self):
+        """Delete least recently used entries until the payloads fit in the size limit"""
+        with self._connexion() as connexion:
+            total = connexion.execute("SELECT COALESCE(SUM(taille), 0) FROM resultats").fetchone()[0]
+            if total <= self.taille_max_octets:
+                return
+
+            a_liberer = total - self.taille_max_octets
+            for rowid, taille in connexion.execute("SELECT rowid, taille FROM resultats ORDER BY utilise").fetchall():
+                connexion.execute("DELETE FROM resultats WHERE rowid = ?", (rowid,))
+                a_liberer -= taille
+                if a_liberer <= 0:
+                    break
+
+    def purger_versions(self):
+        """
+        Delete the results of other model versions
+
+        Returns:
+            int: Number of deleted entries
+        """
+        with self._connexion() as connexion:
+            return connexion.execute("DELETE FROM resultats WHERE version != ?", (self.version,)).rowcount
+
+    def statistiques(self):
+        """
+        Usage of the store
+
+        Returns:
+            dict: Number of entries and bytes per kind of result, for the current model version
+        """
+        with self._connexion() as connexion:
+            lignes = connexion.execute(
+                "SELECT type, COUNT(*), SUM(taille) FROM resultats WHERE version = ? GROUP BY type",
+                (self.version,)).fetchall()
+        return {type_resultat: {'nombre': nombre, 'octets': octets} for type_resultat, nombre, octets in lignes}
+
+    def memoiser(self, type_resultat):
+        """
+        Decorator storing the results of a function of a parameters dict
+
+        Returns:
+            callable: Decorator
+        """
+        def decorateur(fonction):
+            @wraps(fonction)
+            def enveloppe(params):
+                manquant = object()
+                resultat = self.get(type_resultat, params, manquant)
+                if resultat is manquant:
+                    resultat = self.put(type_resultat, params, fonction(params))
+                return resultat
+            return enveloppe
+        return decorateur
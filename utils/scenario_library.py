@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+
+"""
+Persistent library of named scenarios with indexed summary KPIs
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from config.parameters import MODEL_VERSION, params_hash
+from model.comparison import compare_scenarios
+
+
+# Summary KPIs stored with each scenario, named as the columns of compare_scenarios' ranking
+INDICATEURS = ['Resultat_Total', 'CA_Total', 'Taux_Marge_Moyen', 'Part_SARL', 'Effectif_Final']
+
+
+class ScenarioLibrary:
+    """
+    SQLite-backed library of named parameter sets and their summary KPIs.
+
+    Every KPI column is indexed, so filtering and sorting thousands of scenarios
+    is answered by the database without re-simulating anything. KPIs are computed
+    when a scenario is saved, with one batched evaluation per call, and recomputed
+    by recalculer() after a change of MODEL_VERSION.
+    """
+
+    def __init__(self, chemin=None, version=MODEL_VERSION):
+        """
+        Open (or create) the library
+
+        Args:
+            chemin (str, optional): SQLite file, SIMULATION_SCENARIO_LIBRARY or a file in
+                the system temporary directory by default
+            version (str, optional): Model version of the stored KPIs
+        """
+        if chemin is None:
+            chemin = os.environ.get('SIMULATION_SCENARIO_LIBRARY') or os.path.join(
+                tempfile.gettempdir(), 'simulation_esn', 'scenarios.sqlite')
+
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+        self.chemin = chemin
+        self.version = version
+        self._local = threading.local()
+
+        colonnes = ",\n".join(f"{indicateur} REAL" for indicateur in INDICATEURS)
+        with self._connexion() as connexion:
+            connexion.execute(f"""
+                CREATE TABLE IF NOT EXISTS scenarios (
+                    nom TEXT PRIMARY KEY,
+                    cle TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    modifie REAL NOT NULL,
+                    {colonnes}
+                )
+            """)
+            connexion.execute("CREATE INDEX IF NOT EXISTS idx_scenarios_cle ON scenarios (cle)")
+            for indicateur in INDICATEURS:
+                connexion.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_scenarios_{indicateur.lower()} ON scenarios ({indicateur})")
+
+    def _connexion(self):
+        """SQLite connection of the current thread"""
+        connexion = getattr(self._local, 'connexion', None)
+        if connexion is None:
+            connexion = sqlite3.connect(self.chemin, timeout=30)
+            connexion.execute("PRAGMA journal_mode=WAL")
+            connexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.connexion = connexion
+        return connexion
+
+    def enregistrer(self, nom, params):
+        """
+        Save (or overwrite) a named scenario with its KPIs
+
+        Args:
+            nom (str): Scenario name
+            params (dict): Simulation parameters
+
+        Returns:
+            dict: KPIs of the scenario
+        """
+        return self.enregistrer_lot([nom], [params])[nom]
+
+    def enregistrer_lot(self, noms, params_list):
+        """
+        Save many named scenarios, computing their KPIs with one batched evaluation per horizon
+
+        Args:
+            noms (list): Scenario names
+            params_list (list): Simulation parameters of the scenarios
+
+        Returns:
+            dict: Scenario name -> KPIs
+        """
+        if len(noms) != len(params_list):
+            raise ValueError("Il faut autant de noms que de scénarios")
+        if len(set(noms)) != len(noms):
+            raise ValueError("Les noms des scénarios doivent être uniques")
+
+        par_horizon = {}
+        for nom, params in zip(noms, params_list):
+            par_horizon.setdefault(params['nb_annees'], []).append((nom, params))
+
+        indicateurs = {}
+        lignes = []
+        maintenant = time.time()
+        for scenarios in par_horizon.values():
+            classement = compare_scenarios([params for _, params in scenarios],
+                                           [nom for nom, _ in scenarios])['classement'][INDICATEURS].to_dict('index')
+            for nom, params in scenarios:
+                valeurs = {indicateur: float(valeur) for indicateur, valeur in classement[nom].items()}
+                indicateurs[nom] = valeurs
+                lignes.append((nom, params_hash(params), json.dumps(dict(params), default=lambda v: v.item()),
+                               self.version, maintenant, *valeurs.values()))
+
+        with self._connexion() as connexion:
+            connexion.executemany(
+                f"INSERT OR REPLACE INTO scenarios (nom, cle, params, version, modifie, {', '.join(INDICATEURS)}) "
+                f"VALUES ({', '.join('?' * (5 + len(INDICATEURS)))})", lignes)
+
+        return indicateurs
+
+    def charger(self, nom):
+        """
+        Parameters of a saved scenario
+
+        Returns:
+            dict: Simulation parameters, or None if no scenario has this name
+        """
+        with self._connexion() as connexion:
+            ligne = connexion.execute("SELECT params FROM scenarios WHERE nom = ?", (nom,)).fetchone()
+        return None if ligne is None else json.loads(ligne[0])
+
+    def trouver(self, params):
+        """
+        Names of the saved scenarios with exactly these parameters
+
+        Returns:
+            list: Scenario names
+        """
+        with self._connexion() as connexion:
+            return [nom for nom, in connexion.execute(
+                "SELECT nom FROM scenarios WHERE cle = ? ORDER BY nom", (params_hash(params),))]
+
+    def supprimer(self, nom):
+        """
+        Delete a saved scenario
+
+        Returns:
+            bool: True if the scenario existed
+        """
+        with self._connexion() as connexion:
+            return connexion.execute("DELETE FROM scenarios WHERE nom = ?", (nom,)).rowcount > 0
+
+    def noms(self):
+        """Names of all saved scenarios, in alphabetical order"""
+        with self._connexion() as connexion:
+            return [nom for nom, in connexion.execute("SELECT nom FROM scenarios ORDER BY nom")]
+
+    def __len__(self):
+        with self._connexion() as connexion:
+            return connexion.execute("SELECT COUNT(*) FROM scenarios").fetchone()[0]
+
+    def rechercher(self, minimums=None, maximums=None, tri='Resultat_Total', decroissant=True, limite=None,
+                   avec_params=False):
+        """
+        Query the saved scenarios by KPI ranges without re-simulating them
+
+        For example, every scenario with a total result above 1 M€ and a mean margin
+        above 20 %, sorted by SARL share:
+        rechercher({'Resultat_Total': 1e6, 'Taux_Marge_Moyen': 0.2}, tri='Part_SARL')
+
+        Args:
+            minimums (dict, optional): KPI name -> inclusive lower bound
+            maximums (dict, optional): KPI name -> inclusive upper bound
+            tri (str, optional): KPI used to sort the scenarios
+            decroissant (bool, optional): Sort in descending order
+            limite (int, optional): Maximum number of scenarios returned
+            avec_params (bool, optional): Also return the parameters of each scenario
+
+        Returns:
+            pandas.DataFrame: KPIs (and 'params' dicts) indexed by scenario name
+        """
+        minimums, maximums = minimums or {}, maximums or {}
+        inconnus = (set(minimums) | set(maximums) | {tri}) - set(INDICATEURS)
+        if inconnus:
+            raise ValueError(f"Indicateurs inconnus: {sorted(inconnus)}")
+
+        conditions = [f"{indicateur} >= ?" for indicateur in minimums] + [f"{indicateur} <= ?" for indicateur in maximums]
+        valeurs = [*minimums.values(), *maximums.values()]
+        requete = (f"SELECT nom, {', '.join(INDICATEURS)}{', params' if avec_params else ''} FROM scenarios"
+                   f"{' WHERE ' + ' AND '.join(conditions) if conditions else ''}"
+                   f" ORDER BY {tri} {'DESC' if decroissant else 'ASC'}, nom")
+        if limite is not None:
+            requete += " LIMIT ?"
+            valeurs.append(int(limite))
+
+        with self._connexion() as connexion:
+            lignes = connexion.execute(requete, valeurs).fetchall()
+
+        scenarios = pd.DataFrame(lignes, columns=['Nom', *INDICATEURS, *(['params'] if avec_params else [])])
+        if avec_params:
+            scenarios['params'] = scenarios['params'].map(json.loads)
+        return scenarios.set_index('Nom')
+
+    def recalculer(self):
+        """
+        Recompute the KPIs of the scenarios saved by another model version
+
+        Returns:
+            int: Number of recomputed scenarios
+        """
+        with self._connexion() as connexion:
+            lignes = connexion.execute("SELECT nom, params FROM scenarios WHERE version != ?", (self.version,)).fetchall()
+        if lignes:
+            self.enregistrer_lot([nom for nom, _ in lignes], [json.loads(params) for _, params in lignes])
+        return len(lignes)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+
+"""
+Warm-up of the server process before its first session
+
+The first session after a start would otherwise pay for the import of the plotting
+stack, the matplotlib font cache and style, the first figure and Altair chart, and
+the first simulations and analyses. The warm-up does this work for the default
+scenarios of the application, through the caches the sessions read
+(utils/computations.py), so that the first request is served like the next ones.
+"""
+
+import threading
+import time
+
+from config.parameters import DEFAULT_PARAMS, DEFAULT_SCENARIO2_PARAMS, DEFAULT_TREASURY_PARAMS
+from utils.metrics import metriques
+
+
+# Readiness condition of utils.monitoring met once the warm-up is done
+CONDITION_PRECHAUFFAGE = 'prechauffage'
+
+
+def prechauffer_graphiques():
+    """Import the plotting stack and apply its style (fonts are loaded by the first figure)"""
+    import altair
+    import matplotlib.pyplot
+    import seaborn
+
+    from utils.formatting import setup_style
+
+    setup_style()
+
+
+def prechauffer_scenario(params, params_tresorerie=DEFAULT_TREASURY_PARAMS):
+    """
+    Fill the result and image caches of one scenario
+
+    Computes the simulation, the sensitivity analysis and the break-even grid, renders
+    the matplotlib charts of the simulation, of these analyses and of its treasury, and serializes one
+    Altair chart (which loads the Vega-Lite schema).
+
+    Args:
+        params (dict): Simulation parameters, as stored in the session
+        params_tresorerie (dict, optional): Treasury parameters of the treasury chart
+    """
+    from model.treasury import simulate_treasury
+    from utils.computations import (analyse_point_mort_roi, analyse_sensibilite, image_analyse, image_simulation,
+                                    image_tresorerie, simuler)
+    from visualization.interactive_plots import interactive_evolution_ca_resultats
+    from visualization.plots import figure_analyse_sensibilite, figure_point_mort_roi
+    from visualization.streamlit_plots import (streamlit_evolution_ca_resultats, streamlit_evolution_effectifs_couts,
+                                               streamlit_repartition_benefices, streamlit_repartition_couts,
+                                               streamlit_repartition_couts_pourcentage, streamlit_tresorerie)
+
+    simulation = simuler(params)
+    image_analyse(figure_analyse_sensibilite, simulation, analyse_sensibilite(params))
+    image_analyse(figure_point_mort_roi, simulation, analyse_point_mort_roi(params))
+
+    for construire in (streamlit_evolution_ca_resultats, streamlit_repartition_benefices,
+                       streamlit_repartition_couts, streamlit_repartition_couts_pourcentage,
+                       streamlit_evolution_effectifs_couts):
+        image_simulation(construire, simulation)
+    tresorerie = simulate_treasury(simulation.resultats, params_tresorerie)
+    image_tresorerie(streamlit_tresorerie, simulation, params_tresorerie, tresorerie)
+
+    interactive_evolution_ca_resultats(simulation).to_dict()
+
+
+def prechauffer_comparaison(params_scenarios, noms_scenarios):
+    """Fill the image cache of the comparison chart of the default scenarios"""
+    from model.comparison import compare_scenarios
+    from utils.computations import image_comparaison
+    from visualization.streamlit_plots import streamlit_comparaison_scenarios
+
+    comparaison = compare_scenarios(params_scenarios, noms_scenarios)
+    image_comparaison(streamlit_comparaison_scenarios, params_scenarios, noms_scenarios, comparaison)
+
+
+def prechauffer():
+    """
+    Run the whole warm-up for DEFAULT_PARAMS and the default scenario 2
+
+    Returns:
+        dict: Duration in seconds of every stage
+    """
+    etapes = (
+        ('graphiques', prechauffer_graphiques),
+        ('scenario1', lambda: prechauffer_scenario(DEFAULT_PARAMS)),
+        ('scenario2', lambda: prechauffer_scenario(DEFAULT_SCENARIO2_PARAMS)),
+        ('comparaison', lambda: prechauffer_comparaison([DEFAULT_PARAMS, DEFAULT_SCENARIO2_PARAMS],
+                                                        ["Scénario 1", "Scénario 2"])),
+    )
+    durees = {}
+    for nom, etape in etapes:
+        debut = time.perf_counter()
+        etape()
+        durees[nom] = time.perf_counter() - debut
+    metriques.definir('prechauffage_secondes', sum(durees.values()))
+    return durees
+
+
+def prechauffer_en_arriere_plan(surveillance):
+    """
+    Run the warm-up in a daemon thread, the process being not ready until it ends
+
+    A failing warm-up only leaves cold caches: the condition is met anyway, so that
+    the process does not stay unready, and the error is printed.
+
+    Args:
+        surveillance (Surveillance): Monitoring of the process
+
+    Returns:
+        threading.Thread: The warm-up thread
+    """
+    surveillance.exiger(CONDITION_PRECHAUFFAGE)
+
+    def executer():
+        try:
+            durees = prechauffer()
+            print(f"Préchauffage terminé en {sum(durees.values()):.1f} s")
+        except Exception as e:
+            print(f"Préchauffage interrompu: {type(e).__name__}: {e}")
+        finally:
+            surveillance.signaler(CONDITION_PRECHAUFFAGE)
+
+    fil = threading.Thread(target=executer, name='prechauffage', daemon=True)
+    fil.start()
+    return fil
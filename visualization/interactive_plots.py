@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+
+
+"""
+Interactive (client-side) visualization functions for Streamlit
+
+These charts only ship the compact result arrays and a Vega-Lite spec to the
+browser: rendering, hover and zoom happen client-side, without server round trips.
+"""
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from model.analysis import compute_sensitivity, compute_point_mort_roi, SENSITIVITY_LABELS
+
+
+POSTES_COUTS = {
+    'Cout_Salaires': 'Salaires et charges',
+    'Frais_Fixes': 'Frais fixes',
+    'Marge_Securite': 'Marge de sécurité',
+    'IS_Senegal': 'Impôts Sénégal',
+    'IS_France': 'Impôts France',
+    'Resultat_Net_Consolide': 'Résultat net'
+}
+
+
+def _donnees_trimestrielles(resultats, colonnes):
+    """Builds a compact long-format float DataFrame of quarterly columns"""
+    df = pd.DataFrame({col: resultats[col].astype(float).to_numpy() for col in colonnes})
+    df['Trimestre'] = [f"T{i+1}" for i in range(len(resultats))]
+    df['Annee'] = resultats['Annee'].astype(int).to_numpy()
+    return df
+
+
+def interactive_evolution_ca_resultats(simulation):
+    """
+    Interactive quarterly evolution of revenue and results
+
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+
+    Returns:
+        altair.LayerChart: Chart specification
+    """
+    if simulation.resultats is None:
+        simulation.run_simulation()
+
+    libelles = {
+        'CA_SAS': 'Chiffre d\'affaires',
+        'Transfert_SARL': 'Transfert vers SARL',
+        'Resultat_Net_Consolide': 'Résultat net consolidé'
+    }
+    df = _donnees_trimestrielles(simulation.resultats, list(libelles) + ['Nb_Developpeurs']).rename(columns=libelles)
+    ordre = df['Trimestre'].tolist()
+
+    base = alt.Chart(df).encode(x=alt.X('Trimestre:N', sort=ordre, title='Trimestre'))
+
+    barres = base.mark_bar(opacity=0.2, color='#7ad151').encode(
+        y=alt.Y('Nb_Developpeurs:Q', title='Nombre de développeurs'),
+        tooltip=['Trimestre', alt.Tooltip('Nb_Developpeurs:Q', title='Développeurs')]
+    )
+
+    lignes = base.transform_fold(
+        list(libelles.values()), as_=['Indicateur', 'Montant']
+    ).mark_line(point=True).encode(
+        y=alt.Y('Montant:Q', title='Montant (€)', axis=alt.Axis(format=',.0f')),
+        color=alt.Color('Indicateur:N', title=None, sort=list(libelles.values())),
+        tooltip=['Trimestre', 'Indicateur:N',
+                 alt.Tooltip('Montant:Q', format=',.0f')]
+    )
+
+    return alt.layer(barres, lignes).resolve_scale(y='independent').properties(
+        title='Évolution trimestrielle du CA, des transferts et des résultats', height=400
+    ).interactive()
+
+
+def interactive_repartition_benefices(simulation):
+    """
+    Interactive distribution of profits between SAS and SARL
+
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+
+    Returns:
+        altair.HConcatChart: Chart specification
+    """
+    if simulation.resultats_annuels is None:
+        simulation.run_simulation()
+
+    resultats_annuels = simulation.resultats_annuels
+    df = pd.DataFrame({
+        'Annee': resultats_annuels.index.astype(int),
+        'SAS': resultats_annuels['Part_SAS'].astype(float).to_numpy(),
+        'SARL': resultats_annuels['Part_SARL'].astype(float).to_numpy(),
+        'Ratio_SAS_SARL': resultats_annuels['Ratio_SAS_SARL'].astype(float).to_numpy()
+    })
+
+    parts = alt.Chart(df).transform_fold(
+        ['SAS', 'SARL'], as_=['Entite', 'Part']
+    ).mark_bar().encode(
+        x=alt.X('Annee:O', title='Année'),
+        y=alt.Y('Part:Q', stack='normalize', title='Part du résultat consolidé', axis=alt.Axis(format='%')),
+        color=alt.Color('Entite:N', title=None),
+        tooltip=['Annee', 'Entite:N', alt.Tooltip('Part:Q', format='.1%')]
+    ).properties(title='Répartition des bénéfices (en %)')
+
+    ratio = alt.Chart(df).mark_bar().encode(
+        x=alt.X('Annee:O', title='Année'),
+        y=alt.Y('Ratio_SAS_SARL:Q', title='Ratio'),
+        color=alt.condition(alt.datum.Ratio_SAS_SARL > 15, alt.value('#d62728'), alt.value('#3b528b')),
+        tooltip=['Annee', alt.Tooltip('Ratio_SAS_SARL:Q', title='Ratio SAS/SARL', format='.1f')]
+    ).properties(title='Ratio SAS/SARL (déséquilibre fiscal, rouge au-delà de 15)')
+
+    return alt.hconcat(parts, ratio)
+
+
+def interactive_repartition_couts(simulation, pourcentage=False):
+    """
+    Interactive distribution of costs and net income relative to revenue
+
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+        pourcentage (bool, optional): Show shares of revenue instead of amounts
+
+    Returns:
+        altair.Chart: Chart specification
+    """
+    if simulation.resultats is None:
+        simulation.run_simulation()
+
+    resultats = simulation.resultats
+    df = _donnees_trimestrielles(resultats, list(POSTES_COUTS) + ['CA_SAS'])
+
+
+    if pourcentage:
+        for col in POSTES_COUTS:
+            df[col] = np.where(df['CA_SAS'] > 0, df[col] / df['CA_SAS'], 0.0)
+
+    df = df.rename(columns=POSTES_COUTS)
+    ordre = df['Trimestre'].tolist()
+    format_valeur = '.1%' if pourcentage else ',.0f'
+
+    return alt.Chart(df).transform_fold(
+        list(POSTES_COUTS.values()), as_=['Poste', 'Montant']
+    ).mark_area(opacity=0.7).encode(
+        x=alt.X('Trimestre:N', sort=ordre, title='Trimestre'),
+        y=alt.Y('Montant:Q', stack='zero',
+                title='Pourcentage du chiffre d\'affaires' if pourcentage else 'Montant (€)',
+                axis=alt.Axis(format='%' if pourcentage else ',.0f')),
+        color=alt.Color('Poste:N', sort=list(POSTES_COUTS.values()), title=None,
+                        scale=alt.Scale(scheme='viridis')),
+        tooltip=['Trimestre', 'Poste:N', alt.Tooltip('Montant:Q', format=format_valeur)]
+    ).properties(
+        title='Répartition des coûts et du résultat net par rapport au chiffre d\'affaires', height=450
+    ).interactive()
+
+
+def interactive_analyse_sensibilite(simulation, sensibilite=None):
+    """
+    Interactive sensitivity analysis of the main parameters
+
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+        sensibilite (dict, optional): Precomputed output of compute_sensitivity
+
+    Returns:
+        altair.VConcatChart: Chart specification
+    """
+    sensibilite = sensibilite or compute_sensitivity(simulation.params, store=simulation.store,
+                                                     fiscalite=simulation.fiscalite)
+
+    graphiques = []
+    for param, donnees in sensibilite.items():
+        df = pd.DataFrame({
+            'Valeur': np.asarray(donnees['valeurs'], dtype=float),
+            'Resultat': np.asarray(donnees['resultats'], dtype=float)
+        })
+        base = alt.Chart(df).encode(
+            x=alt.X('Valeur:Q', title=SENSITIVITY_LABELS.get(param, param), scale=alt.Scale(zero=False)),
+            y=alt.Y('Resultat:Q', title='Résultat net consolidé (€)', axis=alt.Axis(format=',.0f'),
+                    scale=alt.Scale(zero=False)),
+            tooltip=[alt.Tooltip('Valeur:Q'), alt.Tooltip('Resultat:Q', format=',.0f')]
+        )
+        couche = base.mark_line(point=True)
+
+        if donnees['base_index'] >= 0:
+            reference = alt.Chart(pd.DataFrame({'Valeur': [float(simulation.params[param])]})).mark_rule(
+                color='gray', strokeDash=[4, 4]).encode(x='Valeur:Q')
+            couche = couche + reference
+
+        graphiques.append(couche.properties(height=220).interactive())
+
+    return alt.vconcat(*graphiques).properties(
+        title='Analyse de sensibilité - Impact sur le résultat net consolidé'
+    )
+
+
+def interactive_comparaison_scenarios(comparaison):
+    """
+    Interactive comparison of any number of scenarios: annual overlay and quarterly small multiples
+
+    Args:
+        comparaison (dict): Output of model.comparison.compare_scenarios
+
+    Returns:
+        altair.VConcatChart: Chart specification
+    """
+    noms = comparaison['noms']
+    annuel = comparaison['annuel']
+    annees = comparaison['annees']
+    n = len(noms)
+
+    df_annuel = pd.DataFrame({
+        'Scenario': np.repeat(noms, len(annees)),
+        'Annee': np.tile(annees, n),
+        'Resultat': annuel['Resultat_Net_Consolide'].astype(float).ravel(),
+        'Marge': annuel['Taux_Marge_Nette'].astype(float).ravel()
+    })
+    survol = alt.selection_point(fields=['Scenario'], on='mouseover', bind='legend') \
+        if hasattr(alt, 'selection_point') else alt.selection_single(fields=['Scenario'], on='mouseover', bind='legend')
+    opacite = alt.condition(survol, alt.value(1.0), alt.value(0.15))
+
+    base = alt.Chart(df_annuel).encode(
+        x=alt.X('Annee:O', title='Année'),
+        color=alt.Color('Scenario:N', sort=noms, title=None,
+                        scale=alt.Scale(scheme='category10' if n <= 10 else 'viridis')),
+        opacity=opacite
+    )
+    resultat = base.mark_line(point=True).encode(
+        y=alt.Y('Resultat:Q', title='Résultat net (€)', axis=alt.Axis(format=',.0f')),
+        tooltip=['Scenario', 'Annee', alt.Tooltip('Resultat:Q', format=',.0f')]
+    ).properties(title='Résultat net consolidé par année', width=320)
+    marge = base.mark_line(point=True).encode(
+        y=alt.Y('Marge:Q', title='Taux de marge', axis=alt.Axis(format='%')),
+        tooltip=['Scenario', 'Annee', alt.Tooltip('Marge:Q', format='.1%')]
+    ).properties(title='Taux de marge nette par année', width=320)
+    superposition = alt.hconcat(resultat, marge)
+    superposition = superposition.add_params(survol) if hasattr(superposition, 'add_params') else superposition.add_selection(survol)
+
+    trimestriel = comparaison['trimestriel']
+    nb_trimestres = trimestriel['Resultat_Net_Consolide'].shape[1]
+    df_trimestriel = pd.DataFrame({
+        'Scenario': np.repeat(noms, nb_trimestres),
+        'Trimestre': np.tile(np.arange(1, nb_trimestres + 1), n),
+        'Resultat': trimestriel['Resultat_Net_Consolide'].astype(float).ravel(),
+        'CA': trimestriel['CA_SAS'].astype(float).ravel()
+    })
+    petits_multiples = alt.Chart(df_trimestriel).transform_fold(
+        ['CA', 'Resultat'], as_=['Indicateur', 'Montant']
+    ).mark_line().encode(
+        x=alt.X('Trimestre:Q', title='Trimestre'),
+        y=alt.Y('Montant:Q', title='Montant (€)', axis=alt.Axis(format='~s')),
+        color=alt.Color('Indicateur:N', title=None),
+        tooltip=['Scenario', 'Trimestre', 'Indicateur:N', alt.Tooltip('Montant:Q', format=',.0f')]
+    ).properties(width=140, height=90).facet(
+        facet=alt.Facet('Scenario:N', sort=noms, title=None), columns=5
+    )
+
+    return alt.vconcat(superposition, petits_multiples).resolve_scale(color='independent')
+
+
+def interactive_point_mort_roi(simulation, grille=None):
+    """
+    Interactive break-even and ROI heatmaps over developer TJM and occupation rate
+
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+        grille (dict, optional): Precomputed output of compute_point_mort_roi
+
+    Returns:
+        altair.HConcatChart: Chart specification
+    """
+    grille = grille or compute_point_mort_roi(simulation.params, store=simulation.store,
+                                              fiscalite=simulation.fiscalite)
+
+    tjm, occupation = np.meshgrid(grille['tjm_values'], grille['occupation_values'])
+    df = pd.DataFrame({
+        'TJM': np.round(tjm.ravel(), 1),
+        'Occupation': np.round(occupation.ravel(), 3),
+        'Rentable': grille['point_mort_matrix'].ravel().astype(float),
+        'ROI': grille['roi_matrix'].ravel().astype(float)
+    }).dropna()
+
+    base = alt.Chart(df).encode(
+        x=alt.X('TJM:O', title='Tarif journalier (€)', axis=alt.Axis(format='.0f')),
+        y=alt.Y('Occupation:O', title='Taux d\'occupation', sort='descending', axis=alt.Axis(format='.0%')),
+        tooltip=[alt.Tooltip('TJM:Q', format='.0f'), alt.Tooltip('Occupation:Q', format='.0%'),
+                 alt.Tooltip('ROI:Q', format='.2f'), 'Rentable:Q']
+    )
+    point_mort = base.mark_rect().encode(
+        color=alt.Color('Rentable:Q', scale=alt.Scale(scheme='redyellowgreen', domain=[0, 1]), title='Rentabilité')
+    ).properties(title='Analyse du point mort - Année 1')
+    roi = base.mark_rect().encode(
+        color=alt.Color('ROI:Q', scale=alt.Scale(scheme='viridis'), title='ROI')
+    ).properties(title='Analyse du ROI - Année 1')
+
+    return alt.hconcat(point_mort, roi).resolve_scale(color='independent')
+
+
+def interactive_point_mort_adaptatif(simulation, adaptatif):
+    """
+    Interactive ROI surface and break-even frontier from the adaptive refinement
+
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+        adaptatif (dict): Output of compute_point_mort_roi_adaptive
+
+    Returns:
+        altair.LayerChart: Chart specification
+    """
+    cellules = adaptatif['cellules']
+    df_cellules = pd.DataFrame({
+        'TJM_min': cellules[:, 0], 'TJM_max': cellules[:, 1],
+        'Occupation_min': cellules[:, 2], 'Occupation_max': cellules[:, 3],
+        'ROI': adaptatif['roi'].astype(float)
+    })
+    surface = alt.Chart(df_cellules).mark_rect().encode(
+        x=alt.X('TJM_min:Q', title='Tarif journalier (€)', scale=alt.Scale(zero=False)),
+        x2='TJM_max:Q',
+        y=alt.Y('Occupation_min:Q', title='Taux d\'occupation', axis=alt.Axis(format='.0%'),
+                scale=alt.Scale(zero=False)),
+        y2='Occupation_max:Q',
+        color=alt.Color('ROI:Q', scale=alt.Scale(scheme='viridis'), title='ROI'),
+        tooltip=[alt.Tooltip('TJM_min:Q', format='.1f'), alt.Tooltip('Occupation_min:Q', format='.1%'),
+                 alt.Tooltip('ROI:Q', format='.2f')]
+    )
+
+    couches = [surface]
+    if len(adaptatif['frontiere']):
+        df_frontiere = pd.DataFrame(adaptatif['frontiere'], columns=['TJM', 'Occupation'])
+        df_frontiere['Ordre'] = np.arange(len(df_frontiere))
+        couches.append(alt.Chart(df_frontiere).mark_line(color='red', strokeWidth=2).encode(
+            x='TJM:Q', y='Occupation:Q', order='Ordre:Q',
+            tooltip=[alt.Tooltip('TJM:Q', format='.2f'), alt.Tooltip('Occupation:Q', format='.2%')]
+        ))
+
+    return alt.layer(*couches).properties(
+        title=f"ROI et frontière de rentabilité - {adaptatif['nb_evaluations']} évaluations", height=450
+    ).interactive()
+
+
+def interactive_tresorerie(tresorerie):
+    """
+    Interactive monthly cash position of the SAS, the SARL and the group
+
+    Args:
+        tresorerie (dict): Output of model.treasury.simulate_treasury for one scenario
+
+    Returns:
+        altair.LayerChart: Chart specification
+    """
+    libelles = {
+        'Tresorerie_SAS': 'SAS',
+        'Tresorerie_SARL': 'SARL',
+        'Tresorerie_Consolidee': 'Consolidée'
+    }
+    df = pd.DataFrame({libelle: np.asarray(tresorerie[colonne], dtype=float) for colonne, libelle in libelles.items()})
+    df['Mois'] = tresorerie['Mois']
+
+    lignes = alt.Chart(df).transform_fold(
+        list(libelles.values()), as_=['Entite', 'Tresorerie']
+    ).mark_line(point=True).encode(
+        x=alt.X('Mois:Q', title='Mois'),
+        y=alt.Y('Tresorerie:Q', title='Trésorerie (€)', axis=alt.Axis(format=',.0f')),
+        color=alt.Color('Entite:N', title=None, sort=list(libelles.values())),
+        tooltip=['Mois', 'Entite:N', alt.Tooltip('Tresorerie:Q', format=',.0f')]
+    )
+    zero = alt.Chart(pd.DataFrame({'Tresorerie': [0.0]})).mark_rule(color='gray', strokeDash=[4, 4]).encode(y='Tresorerie:Q')
+
+    return alt.layer(lignes, zero).properties(
+        title='Trésorerie mensuelle (délais de paiement inclus)', height=400
+    ).interactive()
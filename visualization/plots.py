@@ -10,17 +10,29 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
 from utils.formatting import euro_formatter, percent_formatter, setup_style
+from model.analysis import compute_sensitivity, compute_point_mort_roi, SENSITIVITY_LABELS
 
 colors = setup_style()
 
-def plot_evolution_ca_resultats(resultats, params, nom_fichier=None):
+def _afficher(fig, nom_fichier=None):
+    """Save a figure when a filename is given, display it in Streamlit and close it"""
+    if nom_fichier:
+        fig.savefig(nom_fichier, dpi=300, bbox_inches='tight')
+
+    import streamlit as st
+    st.pyplot(fig)
+    plt.close(fig)
+
+def figure_evolution_ca_resultats(resultats, params):
     """
     Visualize the quarterly evolution of revenue and results
 
     Args:
         resultats (pandas.DataFrame): DataFrame of quarterly results
         params (dict): Simulation parameters
-        nom_fichier (str, optional): Filename to save the chart
+
+    Returns:
+        matplotlib.figure.Figure: The chart
     """
     fig, ax = plt.subplots(figsize=(12, 6))
 
@@ -60,19 +72,28 @@ def plot_evolution_ca_resultats(resultats, params, nom_fichier=None):
     plt.title('Évolution trimestrielle du CA, des transferts et des résultats')
     plt.tight_layout()
 
-    if nom_fichier:
-        plt.savefig(nom_fichier, dpi=300, bbox_inches='tight')
+    return fig
 
-    import streamlit as st
-    st.pyplot(plt.gcf())
+def plot_evolution_ca_resultats(resultats, params, nom_fichier=None):
+    """
+    Visualize the quarterly evolution of revenue and results
 
-def plot_repartition_benefices(resultats_annuels, nom_fichier=None):
+    Args:
+        resultats (pandas.DataFrame): DataFrame of quarterly results
+        params (dict): Simulation parameters
+        nom_fichier (str, optional): Filename to save the chart
+    """
+    _afficher(figure_evolution_ca_resultats(resultats, params), nom_fichier)
+
+def figure_repartition_benefices(resultats_annuels):
     """
     Visualize the distribution of profits between SAS and SARL
 
     Args:
         resultats_annuels (pandas.DataFrame): DataFrame of annual results
-        nom_fichier (str, optional): Filename to save the chart
+
+    Returns:
+        matplotlib.figure.Figure: The chart
     """
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
@@ -110,69 +131,59 @@ def plot_repartition_benefices(resultats_annuels, nom_fichier=None):
     ax2.legend()
     plt.tight_layout()
 
-    if nom_fichier:
-        plt.savefig(nom_fichier, dpi=300, bbox_inches='tight')
-
-    import streamlit as st
-    st.pyplot(plt.gcf())
+    return fig
 
-def plot_analyse_sensibilite(simulation, nom_fichier=None):
+def plot_repartition_benefices(resultats_annuels, nom_fichier=None):
     """
-    Perform a sensitivity analysis of the main parameters
+    Visualize the distribution of profits between SAS and SARL
 
     Args:
-        simulation (SimulationFinanciere): Simulation instance
+        resultats_annuels (pandas.DataFrame): DataFrame of annual results
         nom_fichier (str, optional): Filename to save the chart
     """
+    _afficher(figure_repartition_benefices(resultats_annuels), nom_fichier)
 
-    params_to_analyze = {
-        'salaire_dev': [800, 900, 1000, 1100, 1200, 1300, 1400, 1500],
-        'tjm_dev': [250, 275, 300, 325, 350, 375, 400],
-        'taux_occupation_dev': [0.70, 0.75, 0.80, 0.85, 0.90, 0.95]
-    }
+def figure_analyse_sensibilite(simulation, sensibilite=None):
+    """
+    Perform a sensitivity analysis of the main parameters
 
-    param_labels = {
-        'salaire_dev': 'Salaire mensuel développeur (€)',
-        'tjm_dev': 'Tarif journalier développeur (€)',
-        'taux_occupation_dev': 'Taux d\'occupation développeur'
-    }
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+        sensibilite (dict, optional): Precomputed output of compute_sensitivity
 
+    Returns:
+        matplotlib.figure.Figure: The chart
+    """
 
-    fig, axes = plt.subplots(len(params_to_analyze), 1, figsize=(10, 12))
+    sensibilite = sensibilite or compute_sensitivity(simulation.params, store=simulation.store,
+                                                     fiscalite=simulation.fiscalite)
 
-    base_params = simulation.params.copy()
-    base_result = simulation.resultats['Resultat_Net_Consolide'].sum()
+    fig, axes = plt.subplots(len(sensibilite), 1, figsize=(10, 12))
 
-    for i, (param, values) in enumerate(params_to_analyze.items()):
-        _plot_param_sensitivity(param, values, base_params, axes[i], param_labels, i)
+    for i, (param, donnees) in enumerate(sensibilite.items()):
+        _plot_param_sensitivity(param, donnees, simulation.params[param], axes[i], SENSITIVITY_LABELS, i)
 
     plt.suptitle('Analyse de sensibilité - Impact sur le résultat net consolidé sur 3 ans', fontsize=14)
     plt.tight_layout(rect=[0, 0, 1, 0.97])
 
-    if nom_fichier:
-        plt.savefig(nom_fichier, dpi=300, bbox_inches='tight')
-
-    import streamlit as st
-    st.pyplot(plt.gcf())
-
-def _plot_param_sensitivity(param, values, base_params, ax, param_labels, color_index):
-    """Helper function to plot parameter sensitivity"""
-    from model.simulation import SimulationFinanciere
-
-    results = []
-    base_value = base_params[param]
+    return fig
 
-    for value in values:
-
-        temp_params = base_params.copy()
-        temp_params[param] = value
-        sim = SimulationFinanciere(temp_params)
-        sim.run_simulation()
-        total_result = sim.resultats['Resultat_Net_Consolide'].sum()
-        results.append(total_result)
+def plot_analyse_sensibilite(simulation, nom_fichier=None, sensibilite=None):
+    """
+    Perform a sensitivity analysis of the main parameters
 
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+        nom_fichier (str, optional): Filename to save the chart
+        sensibilite (dict, optional): Precomputed output of compute_sensitivity
+    """
+    _afficher(figure_analyse_sensibilite(simulation, sensibilite=sensibilite), nom_fichier)
 
-    base_index = values.index(base_value) if base_value in values else -1
+def _plot_param_sensitivity(param, donnees, base_value, ax, param_labels, color_index):
+    """Helper function to plot parameter sensitivity"""
+    values = donnees['valeurs']
+    results = donnees['resultats']
+    base_index = donnees['base_index']
     relative_results = [(r / results[base_index] - 1) * 100 for r in results] if base_index >= 0 else []
 
 
@@ -203,14 +214,16 @@ def _plot_param_sensitivity(param, values, base_params, ax, param_labels, color_
     if param == 'taux_occupation_dev':
         ax.xaxis.set_major_formatter(percent_formatter)
 
-def plot_evolution_effectifs_couts(resultats, params, nom_fichier=None):
+def figure_evolution_effectifs_couts(resultats, params):
     """
     Visualize the evolution of staff numbers and average costs per employee
 
     Args:
         resultats (pandas.DataFrame): DataFrame of quarterly results
         params (dict): Simulation parameters
-        nom_fichier (str, optional): Filename to save the chart
+
+    Returns:
+        matplotlib.figure.Figure: The chart
     """
 
     resultats = resultats.copy()
@@ -264,127 +277,123 @@ def plot_evolution_effectifs_couts(resultats, params, nom_fichier=None):
     plt.title('Évolution des effectifs et du coût moyen par employé')
     plt.tight_layout()
 
-    if nom_fichier:
-        plt.savefig(nom_fichier, dpi=300, bbox_inches='tight')
-
-    import streamlit as st
-    st.pyplot(plt.gcf())
+    return fig
 
-def plot_comparaison_scenarios(scenario1, scenario2, nom_fichier=None):
+def plot_evolution_effectifs_couts(resultats, params, nom_fichier=None):
     """
-    Compare two simulation scenarios
+    Visualize the evolution of staff numbers and average costs per employee
 
     Args:
-        scenario1 (SimulationFinanciere): First scenario
-        scenario2 (SimulationFinanciere): Second scenario
+        resultats (pandas.DataFrame): DataFrame of quarterly results
+        params (dict): Simulation parameters
         nom_fichier (str, optional): Filename to save the chart
     """
+    _afficher(figure_evolution_effectifs_couts(resultats, params), nom_fichier)
+
+def figure_comparaison_scenarios(comparaison):
+    """
+    Compare any number of simulation scenarios
+
+    Args:
+        comparaison (dict): Output of model.comparison.compare_scenarios
+
+    Returns:
+        matplotlib.figure.Figure: The chart
+    """
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
+    plot_barres_comparaison(ax1, ax2, comparaison, colors)
 
-    x = np.arange(len(scenario1.resultats_annuels))
-    width = 0.35
+    plt.tight_layout()
+
+    return fig
+
+def plot_comparaison_scenarios(comparaison, nom_fichier=None):
+    """
+    Compare any number of simulation scenarios
 
-    rects1 = ax1.bar(x - width/2, scenario1.resultats_annuels['Resultat_Net_Consolide'],
-                    width, label='Scénario 1', color=colors[0])
-    rects2 = ax1.bar(x + width/2, scenario2.resultats_annuels['Resultat_Net_Consolide'],
-                    width, label='Scénario 2', color=colors[4])
+    Args:
+        comparaison (dict): Output of model.comparison.compare_scenarios
+        nom_fichier (str, optional): Filename to save the chart
+    """
+    _afficher(figure_comparaison_scenarios(comparaison), nom_fichier)
+
+def plot_barres_comparaison(ax1, ax2, comparaison, palette):
+    """
+    Draw grouped annual bars (net result and margin rate) for every scenario
+
+    Args:
+        ax1 (matplotlib.axes.Axes): Axes of the net result
+        ax2 (matplotlib.axes.Axes): Axes of the margin rate
+        comparaison (dict): Output of model.comparison.compare_scenarios
+        palette (list): Colors used when there are at most three scenarios
+    """
+    noms = comparaison['noms']
+    annuel = comparaison['annuel']
+    x = np.arange(len(comparaison['annees']))
+    width = 0.7 / len(noms)
+    annoter = len(noms) <= 3
+
+    for k, nom in enumerate(noms):
+        decalage = (k - (len(noms) - 1) / 2) * width
+        couleur = palette[(4 * k) % len(palette)] if len(noms) <= 3 else plt.cm.viridis(k / max(len(noms) - 1, 1))
+
+        rects = ax1.bar(x + decalage, annuel['Resultat_Net_Consolide'][k], width, label=nom, color=couleur)
+        rects_marge = ax2.bar(x + decalage, annuel['Taux_Marge_Nette'][k] * 100, width, label=nom, color=couleur)
+
+        if annoter:
+            for rect in rects:
+                height = rect.get_height()
+                ax1.annotate(f'{height/1000:.0f}k€',
+                            xy=(rect.get_x() + rect.get_width()/2, height),
+                            xytext=(0, 3), textcoords="offset points",
+                            ha='center', va='bottom')
+            for rect in rects_marge:
+                height = rect.get_height()
+                ax2.annotate(f'{height:.1f}%',
+                            xy=(rect.get_x() + rect.get_width()/2, height),
+                            xytext=(0, 3), textcoords="offset points",
+                            ha='center', va='bottom')
 
     ax1.set_title('Résultat net consolidé par année')
     ax1.set_xlabel('Année')
     ax1.set_ylabel('Résultat net (€)')
     ax1.set_xticks(x)
+    ax1.set_xticklabels(comparaison['annees'])
     ax1.yaxis.set_major_formatter(euro_formatter)
-    ax1.legend()
-
-
-    for rect in rects1:
-        height = rect.get_height()
-        ax1.annotate(f'{height/1000:.0f}k€',
-                    xy=(rect.get_x() + rect.get_width()/2, height),
-                    xytext=(0, 3), textcoords="offset points",
-                    ha='center', va='bottom')
-
-    for rect in rects2:
-        height = rect.get_height()
-        ax1.annotate(f'{height/1000:.0f}k€',
-                    xy=(rect.get_x() + rect.get_width()/2, height),
-                    xytext=(0, 3), textcoords="offset points",
-                    ha='center', va='bottom')
-
-
-    rects3 = ax2.bar(x - width/2, scenario1.resultats_annuels['Taux_Marge_Nette'] * 100,
-                    width, label='Scénario 1', color=colors[1])
-    rects4 = ax2.bar(x + width/2, scenario2.resultats_annuels['Taux_Marge_Nette'] * 100,
-                    width, label='Scénario 2', color=colors[5])
 
     ax2.set_title('Taux de marge nette par année')
     ax2.set_xlabel('Année')
     ax2.set_ylabel('Taux de marge (%)')
     ax2.set_xticks(x)
+    ax2.set_xticklabels(comparaison['annees'])
     ax2.set_ylim(0, 60)
-    ax2.legend()
 
+    if len(noms) <= 10:
+        ax1.legend()
+        ax2.legend()
+    else:
+        ax2.legend(bbox_to_anchor=(1.02, 1), loc='upper left', fontsize='small', ncol=1 + len(noms) // 25)
 
-    for rect in rects3:
-        height = rect.get_height()
-        ax2.annotate(f'{height:.1f}%',
-                    xy=(rect.get_x() + rect.get_width()/2, height),
-                    xytext=(0, 3), textcoords="offset points",
-                    ha='center', va='bottom')
-
-    for rect in rects4:
-        height = rect.get_height()
-        ax2.annotate(f'{height:.1f}%',
-                    xy=(rect.get_x() + rect.get_width()/2, height),
-                    xytext=(0, 3), textcoords="offset points",
-                    ha='center', va='bottom')
-
-    plt.tight_layout()
-
-    if nom_fichier:
-        plt.savefig(nom_fichier, dpi=300, bbox_inches='tight')
-
-    import streamlit as st
-    st.pyplot(plt.gcf())
-
-def plot_point_mort_roi(simulation, nom_fichier=None):
+def figure_point_mort_roi(simulation, grille=None, frontiere=None):
     """
     Analyze the break-even point and ROI according to different parameters
 
     Args:
         simulation (SimulationFinanciere): Simulation instance
-        nom_fichier (str, optional): Filename to save the chart
-    """
-    from model.simulation import SimulationFinanciere
-
-
-    simulation.resultats['ROI'] = simulation.resultats['Resultat_Net_Consolide'] / simulation.resultats['Transfert_SARL']
-
-
-    tjm_values = np.linspace(200, 400, 20)  # 200€ à 400€
-    occupation_values = np.linspace(0.5, 1.0, 10)  # 50% à 100%
-
-
-    point_mort_matrix = np.zeros((len(occupation_values), len(tjm_values)))
-    roi_matrix = np.zeros((len(occupation_values), len(tjm_values)))
-
+        grille (dict, optional): Precomputed output of compute_point_mort_roi
+        frontiere (numpy.ndarray, optional): Break-even frontier points (TJM, occupation)
+            from compute_point_mort_roi_adaptive
 
-    for i, taux_occupation in enumerate(occupation_values):
-        for j, tjm in enumerate(tjm_values):
-            temp_params = simulation.params.copy()
-            temp_params['tjm_dev'] = tjm
-            temp_params['taux_occupation_dev'] = taux_occupation
-
-            sim = SimulationFinanciere(temp_params)
-            sim.run_simulation()
-
-            ca_annuel = sim.resultats_annuels.loc[1, 'CA_SAS']
-            resultat_annuel = sim.resultats_annuels.loc[1, 'Resultat_Net_Consolide']
-            transfert_annuel = sim.resultats_annuels.loc[1, 'Transfert_SARL']
-
-            point_mort_matrix[i, j] = 1 if resultat_annuel > 0 else 0
-            roi_matrix[i, j] = resultat_annuel / transfert_annuel if transfert_annuel > 0 else 0
+    Returns:
+        matplotlib.figure.Figure: The chart
+    """
+    grille = grille or compute_point_mort_roi(simulation.params, store=simulation.store,
+                                              fiscalite=simulation.fiscalite)
+    tjm_values = grille['tjm_values']
+    occupation_values = grille['occupation_values']
+    point_mort_matrix = grille['point_mort_matrix']
+    roi_matrix = grille['roi_matrix']
 
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
@@ -403,6 +412,11 @@ def plot_point_mort_roi(simulation, nom_fichier=None):
     ax1.axhline(y=simulation.params['taux_occupation_dev'], color='red', linestyle='--',
                label=f"Taux actuel: {simulation.params['taux_occupation_dev']:.0%}")
 
+    if frontiere is not None and len(frontiere):
+        for ax in (ax1, ax2):
+            ax.plot(frontiere[:, 0], frontiere[:, 1], color='black', linewidth=1.5,
+                    label='Frontière de rentabilité' if ax is ax1 else None)
+
     ax1.legend(loc='lower right')
     plt.colorbar(im1, ax=ax1, label='Rentabilité')
 
@@ -423,8 +437,17 @@ def plot_point_mort_roi(simulation, nom_fichier=None):
 
     plt.tight_layout()
 
-    if nom_fichier:
-        plt.savefig(nom_fichier, dpi=300, bbox_inches='tight')
+    return fig
 
-    import streamlit as st
-    st.pyplot(plt.gcf())
\ No newline at end of file
+def plot_point_mort_roi(simulation, nom_fichier=None, grille=None, frontiere=None):
+    """
+    Analyze the break-even point and ROI according to different parameters
+
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+        nom_fichier (str, optional): Filename to save the chart
+        grille (dict, optional): Precomputed output of compute_point_mort_roi
+        frontiere (numpy.ndarray, optional): Break-even frontier points (TJM, occupation)
+            from compute_point_mort_roi_adaptive
+    """
+    _afficher(figure_point_mort_roi(simulation, grille=grille, frontiere=frontiere), nom_fichier)
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+
+"""
+Batch export of the charts of many scenarios, rendered in parallel and incrementally
+
+Every chart is rendered in a pool of processes. The hash of its inputs (scenario
+parameters, chart, resolution, format and model version) is kept in a manifest
+next to the files, so that exporting the same report again only renders the
+charts whose inputs changed. The files can then be packaged into one zip archive
+or one multi-page PDF.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from config.parameters import DEFAULT_PARAMS, MODEL_VERSION, SimulationParams
+from model.comparison import compare_scenarios
+from model.simulation import SimulationFinanciere
+from visualization.plots import (
+    figure_analyse_sensibilite,
+    figure_comparaison_scenarios,
+    figure_evolution_ca_resultats,
+    figure_evolution_effectifs_couts,
+    figure_point_mort_roi,
+    figure_repartition_benefices
+)
+
+
+# Version of the charts themselves: change it to render every report again
+VERSION_RAPPORT = '1'
+
+# Charts of every scenario: name -> figure of a SimulationFinanciere
+GRAPHIQUES_SCENARIO = {
+    'evolution_ca_resultats': lambda simulation: figure_evolution_ca_resultats(simulation.resultats, simulation.params),
+    'repartition_benefices': lambda simulation: figure_repartition_benefices(simulation.resultats_annuels),
+    'analyse_sensibilite': figure_analyse_sensibilite,
+    'evolution_effectifs_couts': lambda simulation: figure_evolution_effectifs_couts(simulation.resultats, simulation.params),
+    'point_mort_roi': figure_point_mort_roi,
+}
+
+# Chart of the whole report, comparing all its scenarios
+GRAPHIQUE_COMPARAISON = 'comparaison_scenarios'
+
+GRAPHIQUES = list(GRAPHIQUES_SCENARIO) + [GRAPHIQUE_COMPARAISON]
+
+FORMATS = ('png', 'jpg', 'svg', 'pdf')
+
+# Formats that can be packaged as pages of a PDF report
+FORMATS_IMAGE = ('png', 'jpg')
+
+MANIFESTE = 'rapport.json'
+
+# Persistent result store of a worker process, opened by its initializer
+_magasin = None
+
+
+def _initialiser_processus():
+    """Open the persistent result store of a worker, so that analyses are shared between workers"""
+    global _magasin
+    from utils.result_store import ResultStore
+
+    _magasin = ResultStore()
+
+
+def _rendre(graphique, noms, params_scenarios, dpi, format_image, chemin):
+    """
+    Render one chart to its file (written in one step, never left half-written)
+
+    Returns:
+        str: Path of the file
+    """
+    if graphique == GRAPHIQUE_COMPARAISON:
+        fig = figure_comparaison_scenarios(compare_scenarios(params_scenarios, noms))
+    else:
+        simulation = SimulationFinanciere(params_scenarios[0], store=_magasin)
+        simulation.run_simulation()
+        fig = GRAPHIQUES_SCENARIO[graphique](simulation)
+
+    temporaire = f"{chemin}.{os.getpid()}.tmp"
+    try:
+        fig.savefig(temporaire, dpi=dpi, format=format_image, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    os.replace(temporaire, chemin)
+    return chemin
+
+
+def _hash_entrees(graphique, noms, params_scenarios, dpi, format_image):
+    """Hash of everything a chart file depends on"""
+    entrees = {
+        'graphique': graphique,
+        'noms': noms if graphique == GRAPHIQUE_COMPARAISON else [],
+        'params': [params.cle for params in params_scenarios],
+        'dpi': dpi,
+        'format': format_image,
+        'version': [MODEL_VERSION, VERSION_RAPPORT],
+    }
+    return hashlib.sha256(json.dumps(entrees, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _noms_dossiers(noms):
+    """Distinct directory names of the scenarios"""
+    dossiers, pris = [], set()
+    for nom in noms:
+        base = re.sub(r'[^\w.-]+', '_', nom).strip('._') or 'scenario'
+        dossier, suffixe = base, 2
+        while dossier.lower() in pris:
+            dossier, suffixe = f"{base}_{suffixe}", suffixe + 1
+        pris.add(dossier.lower())
+        dossiers.append(dossier)
+    return dossiers
+
+
+def _lire_manifeste(dossier):
+    try:
+        with open(os.path.join(dossier, MANIFESTE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _ecrire_manifeste(dossier, manifeste):
+    chemin = os.path.join(dossier, MANIFESTE)
+    with open(f"{chemin}.tmp", 'w') as f:
+        json.dump(manifeste, f, indent=1, sort_keys=True)
+    os.replace(f"{chemin}.tmp", chemin)
+
+
+def exporter_rapport(scenarios, dossier, cibles=None, dpi=300, format_image='png', archive=None,
+                     nb_processus=None, suivi=None):
+    """
+    Render the charts of many scenarios, skipping those already rendered with the same inputs
+
+    Args:
+        scenarios (dict): Scenario name -> simulation parameters (missing ones taken
+            from DEFAULT_PARAMS), in report order
+        dossier (str): Output directory, reused between exports of the report
+        cibles (dict, optional): Chart name (from GRAPHIQUES) -> options overriding dpi
+            and format_image, e.g. {'point_mort_roi': {'dpi': 150, 'format': 'jpg'}}.
+            Only these charts are exported, all of GRAPHIQUES by default
+        dpi (int, optional): Default resolution of the charts
+        format_image (str, optional): Default file format, one of FORMATS
+        archive (str, optional): Path of a .zip archive or of a multi-page .pdf
+            (PNG and JPEG charts only) packaging the whole report
+        nb_processus (int, optional): Rendering processes, the number of CPUs by default
+        suivi (callable, optional): Called with (charts done, charts to render) after every chart
+
+    Returns:
+        dict: 'fichiers' (paths of the report files in order), 'rendus' and 'ignores'
+            (charts rendered and skipped), 'archive' (path or None), 'duree' (seconds)
+
+    Raises:
+        ValueError: Unknown chart or format, invalid parameters, or a PDF archive of
+            non-image charts
+    """
+    debut = time.perf_counter()
+    if not scenarios:
+        raise ValueError("Le rapport doit contenir au moins un scénario")
+    cibles = {graphique: {} for graphique in GRAPHIQUES} if cibles is None else cibles
+    inconnus = set(cibles) - set(GRAPHIQUES)
+    if inconnus:
+        raise ValueError(f"Graphiques inconnus: {sorted(inconnus)} (disponibles: {GRAPHIQUES})")
+    options = {graphique: (int(opts.get('dpi', dpi)), opts.get('format', format_image).lower().replace('jpeg', 'jpg'))
+               for graphique, opts in cibles.items()}
+    for graphique, (_, format_graphique) in options.items():
+        if format_graphique not in FORMATS:
+            raise ValueError(f"Format inconnu pour {graphique}: {format_graphique} (disponibles: {FORMATS})")
+        if archive and archive.lower().endswith('.pdf') and format_graphique not in FORMATS_IMAGE:
+            raise ValueError(f"Le rapport PDF n'assemble que des images {FORMATS_IMAGE}: {graphique} est en {format_graphique}")
+
+    noms = list(scenarios)
+    params_scenarios = [SimulationParams(**{**DEFAULT_PARAMS, **scenarios[nom]}) for nom in noms]
+
+    # One task per chart file: (graphique, noms, params, dpi, format, chemin), and its title
+    taches = []
+    for nom, sous_dossier, params in zip(noms, _noms_dossiers(noms), params_scenarios):
+        for graphique in GRAPHIQUES_SCENARIO:
+            if graphique in options:
+                dpi_graphique, format_graphique = options[graphique]
+                chemin = os.path.join(dossier, sous_dossier, f"{graphique}.{format_graphique}")
+                taches.append(((graphique, [nom], [params], dpi_graphique, format_graphique, chemin), f"{nom} - {graphique}"))
+    if GRAPHIQUE_COMPARAISON in options:
+        dpi_graphique, format_graphique = options[GRAPHIQUE_COMPARAISON]
+        chemin = os.path.join(dossier, f"{GRAPHIQUE_COMPARAISON}.{format_graphique}")
+        taches.append(((GRAPHIQUE_COMPARAISON, noms, params_scenarios, dpi_graphique, format_graphique, chemin),
+                       "Comparaison des scénarios"))
+
+    manifeste = _lire_manifeste(dossier)
+    fichiers = manifeste.setdefault('fichiers', {})
+    a_rendre = []
+    for tache, _ in taches:
+        graphique, noms_tache, params_tache, dpi_graphique, format_graphique, chemin = tache
+        cle = os.path.relpath(chemin, dossier)
+        empreinte = _hash_entrees(graphique, noms_tache, params_tache, dpi_graphique, format_graphique)
+        if fichiers.get(cle) != empreinte or not os.path.exists(chemin):
+            os.makedirs(os.path.dirname(chemin), exist_ok=True)
+            fichiers.pop(cle, None)
+            a_rendre.append((tache, cle, empreinte))
+
+    nb_processus = min(nb_processus or os.cpu_count() or 1, len(a_rendre))
+    try:
+        if nb_processus <= 1:
+            # Not worth starting processes: render in this one
+            if a_rendre:
+                _initialiser_processus()
+            for fait, (tache, cle, empreinte) in enumerate(a_rendre, 1):
+                _rendre(*_parametres_tache(tache))
+                fichiers[cle] = empreinte
+                if suivi:
+                    suivi(fait, len(a_rendre))
+        else:
+            # Spawned workers do not inherit the threads and open connections of a server process
+            with ProcessPoolExecutor(nb_processus, mp_context=get_context('spawn'),
+                                     initializer=_initialiser_processus) as executeur:
+                futurs = {executeur.submit(_rendre, *_parametres_tache(tache)): (cle, empreinte)
+                          for tache, cle, empreinte in a_rendre}
+                for fait, futur in enumerate(as_completed(futurs), 1):
+                    futur.result()
+                    cle, empreinte = futurs[futur]
+                    fichiers[cle] = empreinte
+                    if suivi:
+                        suivi(fait, len(a_rendre))
+    finally:
+        # Charts rendered before a failure are kept, and skipped by the next export
+        _ecrire_manifeste(dossier, manifeste)
+
+    chemins = [tache[5] for tache, _ in taches]
+    if archive:
+        empreinte_archive = hashlib.sha256(
+            json.dumps([[os.path.relpath(chemin, dossier), fichiers[os.path.relpath(chemin, dossier)]]
+                        for chemin in chemins]).encode('utf-8')).hexdigest()
+        archives = manifeste.setdefault('archives', {})
+        if archives.get(os.path.abspath(archive)) != empreinte_archive or not os.path.exists(archive):
+            if archive.lower().endswith('.pdf'):
+                empaqueter_pdf([(chemin, titre) for (tache, titre), chemin in zip(taches, chemins)], archive)
+            else:
+                empaqueter_zip(chemins, dossier, archive)
+            archives[os.path.abspath(archive)] = empreinte_archive
+            _ecrire_manifeste(dossier, manifeste)
+
+    return {
+        'fichiers': chemins,
+        'rendus': len(a_rendre),
+        'ignores': len(taches) - len(a_rendre),
+        'archive': archive,
+        'duree': time.perf_counter() - debut,
+    }
+
+
+def _parametres_tache(tache):
+    """Arguments of _rendre, with the parameters as plain dicts for the worker processes"""
+    graphique, noms, params_scenarios, dpi_graphique, format_graphique, chemin = tache
+    return graphique, noms, [params.to_dict() for params in params_scenarios], dpi_graphique, format_graphique, chemin
+
+
+def empaqueter_zip(chemins, dossier, archive):
+    """
+    Package report files into a zip archive
+
+    Args:
+        chemins (list): Files to package
+        dossier (str): Report directory, the archive keeps the paths relative to it
+        archive (str): Path of the archive
+    """
+    temporaire = f"{archive}.tmp"
+    with zipfile.ZipFile(temporaire, 'w') as fichier_zip:
+        for chemin in chemins:
+            # PNG and JPEG images are already compressed
+            compression = zipfile.ZIP_STORED if chemin.rsplit('.', 1)[-1] in FORMATS_IMAGE else zipfile.ZIP_DEFLATED
+            fichier_zip.write(chemin, os.path.relpath(chemin, dossier), compress_type=compression)
+    os.replace(temporaire, archive)
+
+
+def empaqueter_pdf(pages, archive, titre="Rapport de simulation financière"):
+    """
+    Package chart images into a multi-page PDF, one page per chart under its title
+
+    Args:
+        pages (list): (image path, page title) pairs, PNG or JPEG images
+        archive (str): Path of the PDF
+        titre (str, optional): Title of the document
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    hauteur_titre = 0.5
+    temporaire = f"{archive}.tmp"
+    with PdfPages(temporaire, metadata={'Title': titre}) as pdf:
+        for chemin, titre_page in pages:
+            image = plt.imread(chemin)
+            hauteur, largeur = image.shape[:2]
+            # 200 pixels per inch on the page, whatever the resolution of the chart
+            dpi_page = 200
+            fig = plt.figure(figsize=(largeur / dpi_page, hauteur / dpi_page + hauteur_titre), dpi=dpi_page)
+            fig.figimage(image, xo=0, yo=0, origin='upper')
+            fig.text(0.01, 1 - 0.5 * hauteur_titre / fig.get_figheight(), titre_page, va='center', fontsize=14)
+            pdf.savefig(fig, dpi=dpi_page)
+            plt.close(fig)
+    os.replace(temporaire, archive)
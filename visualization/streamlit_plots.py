@@ -11,6 +11,7 @@ import numpy as np
 import pandas as pd
 from matplotlib.ticker import FuncFormatter
 from utils.formatting import euro_formatter, percent_formatter, setup_style
+from visualization.plots import figure_evolution_effectifs_couts, plot_barres_comparaison
 
 def streamlit_evolution_ca_resultats(simulation):
     """
@@ -119,86 +120,34 @@ def streamlit_repartition_benefices(simulation):
 
     return fig
 
-def streamlit_comparaison_scenarios(simulation1, simulation2):
+def streamlit_comparaison_scenarios(comparaison):
     """
-    Compare two simulation scenarios for Streamlit
+    Compare any number of simulation scenarios for Streamlit
 
     Args:
-        simulation1 (SimulationFinanciere): First scenario
-        simulation2 (SimulationFinanciere): Second scenario
+        comparaison (dict): Output of model.comparison.compare_scenarios
     """
-    if simulation1.resultats_annuels is None:
-        simulation1.run_simulation()
-
-    if simulation2.resultats_annuels is None:
-        simulation2.run_simulation()
-
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
     colors = setup_style()
 
+    plot_barres_comparaison(ax1, ax2, comparaison, colors)
 
-    x = np.arange(len(simulation1.resultats_annuels))
-    width = 0.35
-
-    rects1 = ax1.bar(x - width/2, simulation1.resultats_annuels['Resultat_Net_Consolide'],
-                    width, label='Scénario 1', color=colors[0])
-    rects2 = ax1.bar(x + width/2, simulation2.resultats_annuels['Resultat_Net_Consolide'],
-                    width, label='Scénario 2', color=colors[4])
-
-    ax1.set_title('Résultat net consolidé par année')
-    ax1.set_xlabel('Année')
-    ax1.set_ylabel('Résultat net (€)')
-    ax1.set_xticks(x)
-    ax1.yaxis.set_major_formatter(euro_formatter)
-    ax1.legend()
-
-
-    for rect in rects1:
-        height = rect.get_height()
-        ax1.annotate(f'{height/1000:.0f}k€',
-                    xy=(rect.get_x() + rect.get_width()/2, height),
-                    xytext=(0, 3), textcoords="offset points",
-                    ha='center', va='bottom')
-
-    for rect in rects2:
-        height = rect.get_height()
-        ax1.annotate(f'{height/1000:.0f}k€',
-                    xy=(rect.get_x() + rect.get_width()/2, height),
-                    xytext=(0, 3), textcoords="offset points",
-                    ha='center', va='bottom')
-
-
-    rects3 = ax2.bar(x - width/2, simulation1.resultats_annuels['Taux_Marge_Nette'] * 100,
-                    width, label='Scénario 1', color=colors[1])
-    rects4 = ax2.bar(x + width/2, simulation2.resultats_annuels['Taux_Marge_Nette'] * 100,
-                    width, label='Scénario 2', color=colors[5])
-
-    ax2.set_title('Taux de marge nette par année')
-    ax2.set_xlabel('Année')
-    ax2.set_ylabel('Taux de marge (%)')
-    ax2.set_xticks(x)
-    ax2.set_ylim(0, 60)
-    ax2.legend()
-
+    plt.tight_layout()
 
-    for rect in rects3:
-        height = rect.get_height()
-        ax2.annotate(f'{height:.1f}%',
-                    xy=(rect.get_x() + rect.get_width()/2, height),
-                    xytext=(0, 3), textcoords="offset points",
-                    ha='center', va='bottom')
+    return fig
 
-    for rect in rects4:
-        height = rect.get_height()
-        ax2.annotate(f'{height:.1f}%',
-                    xy=(rect.get_x() + rect.get_width()/2, height),
-                    xytext=(0, 3), textcoords="offset points",
-                    ha='center', va='bottom')
+def streamlit_evolution_effectifs_couts(simulation):
+    """
+    Visualize the evolution of staff numbers and average costs for Streamlit
 
-    plt.tight_layout()
+    Args:
+        simulation (SimulationFinanciere): Simulation instance
+    """
+    if simulation.resultats is None:
+        simulation.run_simulation()
 
-    return fig
+    return figure_evolution_effectifs_couts(simulation.resultats, simulation.params)
 
 def streamlit_repartition_couts(simulation):
     """
@@ -326,4 +275,37 @@ def streamlit_repartition_couts_pourcentage(simulation):
     plt.title('Répartition des coûts et du résultat net en pourcentage du chiffre d\'affaires')
     plt.tight_layout()
 
-    return fig
\ No newline at end of file
+    return fig
+def streamlit_tresorerie(tresorerie):
+    """
+    Visualize the monthly cash position of the SAS, the SARL and the group for Streamlit
+
+    Args:
+        tresorerie (dict): Output of model.treasury.simulate_treasury for one scenario
+    """
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    colors = setup_style()
+
+    mois = tresorerie['Mois']
+    ax.plot(mois, tresorerie['Tresorerie_SAS'], label='SAS', color=colors[0], linewidth=2)
+    ax.plot(mois, tresorerie['Tresorerie_SARL'], label='SARL', color=colors[2], linewidth=2)
+    ax.plot(mois, tresorerie['Tresorerie_Consolidee'], label='Consolidée', color=colors[4], linewidth=2)
+    ax.axhline(y=0, color='gray', linestyle='--', alpha=0.7)
+
+
+    for year in range(1, len(mois) // 12):
+        ax.axvline(x=year*12 + 0.5, color='gray', linestyle='--', alpha=0.5)
+        ax.text(year*12 + 0.5, ax.get_ylim()[1]*0.95, f'Année {year+1}',
+               rotation=90, verticalalignment='top', alpha=0.7)
+
+
+    ax.set_xlabel('Mois')
+    ax.set_ylabel('Trésorerie (€)')
+    ax.yaxis.set_major_formatter(euro_formatter)
+    ax.legend(loc='upper left')
+
+    plt.title('Trésorerie mensuelle (délais de paiement inclus)')
+    plt.tight_layout()
+
+    return fig